@@ -0,0 +1,98 @@
+"""
+Prueba de concurrencia del contador de generaciones.
+
+Lanza cientos de TierManager.record_generation en paralelo (una sesión por
+"request", como en producción) para el mismo usuario y el mismo día, y verifica
+que el contador del día coincide con el número de generaciones registradas:
+ningún incremento perdido.
+
+Uso:
+    python benchmarks/generation_counter_concurrency.py --writers 300
+    DATABASE_URL=postgresql://... python benchmarks/generation_counter_concurrency.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'concurrency.db')}")
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from backend import database
+from backend.database import Base, Generation, User, UserGenerationStats
+from backend.services.tiers.tier_manager import TierManager
+
+
+async def run(writers: int) -> bool:
+    user_id = "concurrency_user"
+    run_id = datetime.now().strftime("%H%M%S%f")
+
+    async with database.AsyncSessionLocal() as db:
+        if not await db.get(User, user_id):
+            db.add(User(id=user_id, email=f"{user_id}@son1k.test", username=user_id, tier="STUDIO"))
+            await db.commit()
+        before = await db.scalar(select(UserGenerationStats.count).where(
+            UserGenerationStats.user_id == user_id,
+            UserGenerationStats.day == datetime.now().date()
+        )) or 0
+
+    errors = 0
+
+    async def writer(i: int):
+        nonlocal errors
+        async with database.AsyncSessionLocal() as db:
+            try:
+                await TierManager(db).record_generation(user_id, f"conc_{run_id}_{i}")
+            except OperationalError:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(i) for i in range(writers)))
+    elapsed = time.perf_counter() - started
+    if database.write_queue is not None:
+        await database.write_queue.stop()
+
+    async with database.AsyncSessionLocal() as db:
+        recorded = await db.scalar(select(func.count(Generation.id)).where(
+            Generation.id.like(f"conc_{run_id}_%")
+        ))
+        counter = await db.scalar(select(UserGenerationStats.count).where(
+            UserGenerationStats.user_id == user_id,
+            UserGenerationStats.day == datetime.now().date()
+        )) or 0
+    await database.async_engine.dispose()
+    if database.writer_engine is not None:
+        await database.writer_engine.dispose()
+
+    lost = recorded - (counter - before)
+    print(f"📊 {writers} escritores en {elapsed:.2f}s ({database.async_engine.dialect.name})")
+    print(f"   generaciones registradas: {recorded}")
+    print(f"   incremento del contador:  {counter - before}")
+    print(f"   errores de lock:          {errors}")
+    print(f"   incrementos perdidos:     {lost}")
+    return lost == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=300)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=database.engine)
+    ok = asyncio.run(run(args.writers))
+    print("\n✅ Sin incrementos perdidos" if ok else "\n❌ Se perdieron incrementos")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark del recálculo vectorizado de pixel_profiles.
+
+Inserta N generaciones sintéticas repartidas entre U usuarios, ejecuta
+recompute_profiles (1 proceso y, opcionalmente, varios) y verifica contra
+apply_generations (el camino incremental) que una muestra de perfiles sea
+idéntica.
+
+Requiere numpy.
+
+Uso:
+    python benchmarks/pixel_recompute.py                          # 1M generaciones
+    python benchmarks/pixel_recompute.py --generations 10000000 --users 500000 --workers 4
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pixel_recompute.db')}")
+
+from sqlalchemy import delete, insert, select
+
+from backend import database
+from backend.database import Base, Generation, PixelProfile, User
+from backend.services.pixel import recompute
+from backend.services.pixel.pixel_companion import apply_generations
+
+INSERT_CHUNK = 50000
+GENRES = ["rock", "jazz", "pop", "lofi", "techno", "reggaeton", "ambient", None]
+QUALITIES = ["standard", "high", "ultra"]
+
+
+def populate(generations: int, users: int):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    with database.engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": f"bench_user_{i:07d}", "email": f"u{i}@son1k.test", "username": f"u{i}"}
+            for i in range(users)
+        ])
+        for offset in range(0, generations, INSERT_CHUNK):
+            conn.execute(insert(Generation), [
+                {
+                    "id": f"bench_gen_{i}",
+                    "user_id": f"bench_user_{rng.randrange(users):07d}",
+                    "genre": rng.choice(GENRES),
+                    "quality": rng.choice(QUALITIES),
+                    "prompt": f"prompt {rng.randrange(40)} de prueba" if rng.random() < 0.9 else None,
+                    "status": "completed",
+                    "created_at": start + timedelta(seconds=rng.randrange(365 * 86400))
+                }
+                for i in range(offset, min(offset + INSERT_CHUNK, generations))
+            ])
+
+
+def verify(sample: int) -> int:
+    """Comparar perfiles recalculados con apply_generations sobre el mismo historial"""
+    mismatches = 0
+    with database.engine.connect() as conn:
+        profiles = conn.execute(select(PixelProfile).limit(sample)).all()
+        for profile in profiles:
+            rows = conn.execute(select(
+                Generation.genre, Generation.quality, Generation.prompt, Generation.created_at
+            ).where(Generation.user_id == profile.user_id)).all()
+            expected = SimpleNamespace(
+                total_generations=0, genre_counts=None, hour_histogram=None, prompt_sketch=None,
+                recent_qualities=None, recent_prompts=None, first_generation_at=None, last_generation_at=None
+            )
+            apply_generations(expected, [row._asdict() for row in rows])
+            for column in ("total_generations", "genre_counts", "hour_histogram", "prompt_sketch",
+                           "first_generation_at", "last_generation_at", "last_genre"):
+                if getattr(expected, column) != getattr(profile, column):
+                    mismatches += 1
+                    print(f"   ⚠️  {profile.user_id}.{column} difiere")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del recálculo de pixel_profiles")
+    parser.add_argument("--generations", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para la segunda pasada")
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--verify", type=int, default=200, help="Perfiles a verificar")
+    args = parser.parse_args()
+
+    if recompute.np is None:
+        print("❌ numpy no está instalado (pip install numpy)")
+        sys.exit(1)
+
+    Base.metadata.create_all(bind=database.engine)
+    print(f"🚀 Insertando {args.generations:,} generaciones de {args.users:,} usuarios...")
+    started = time.perf_counter()
+    populate(args.generations, args.users)
+    print(f"   listo en {time.perf_counter() - started:.1f} s")
+
+    for workers in sorted({1, args.workers}):
+        with database.engine.begin() as conn:
+            conn.execute(delete(PixelProfile))
+        stats = recompute.recompute_profiles(args.chunk_size, workers)
+        print(f"✅ workers={workers}: {stats['users']:,} perfiles, {stats['elapsed_seconds']} s "
+              f"({stats['generations_per_second']:,} generaciones/s)")
+
+    mismatches = verify(args.verify)
+    print("\n🎉 Perfiles idénticos al camino incremental" if not mismatches
+          else f"\n❌ {mismatches} diferencias")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark de latencia de claims del pool comunitario según su tamaño.
+
+Para cada tamaño de pool inserta N contribuciones disponibles y mide:
+- claim_from_pool completo (PoolSampler: muestreo O(1) + lectura por PK)
+- la selección anterior con ORDER BY random() sobre el join, como referencia
+
+La latencia del claim debe mantenerse plana al crecer el pool; la de
+ORDER BY random() crece linealmente.
+
+Uso:
+    python benchmarks/pool_claim_latency.py                       # 10k, 100k, 1M
+    python benchmarks/pool_claim_latency.py --sizes 1000000 --claims 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool_claims.db')}")
+
+from sqlalchemy import delete, func, insert, select
+
+from backend import database
+from backend.database import Base, Generation, PoolClaim, PoolContribution, User
+from backend.services.community.pool_manager import CommunityPoolManager
+
+INSERT_CHUNK = 50000
+
+
+def populate(size: int):
+    """Llevar el pool a `size` contribuciones disponibles (inserts masivos)"""
+    with database.engine.begin() as conn:
+        current = conn.scalar(select(func.count(PoolContribution.id)))
+        if not conn.scalar(select(func.count(User.id)).where(User.id == "bench_contributor")):
+            conn.execute(insert(User), [{"id": "bench_contributor", "email": "c@son1k.test", "username": "c", "tier": "PRO"}])
+
+        now = datetime.now()
+        for start in range(current, size, INSERT_CHUNK):
+            stop = min(start + INSERT_CHUNK, size)
+            conn.execute(insert(Generation), [
+                {"id": f"bench_gen_{i}", "user_id": "bench_contributor", "prompt": "bench",
+                 "genre": "bench", "status": "completed", "created_at": now}
+                for i in range(start, stop)
+            ])
+            conn.execute(insert(PoolContribution), [
+                {"user_id": "bench_contributor", "generation_id": f"bench_gen_{i}", "quality": "standard",
+                 "contributed_at": now, "points": 1, "plays": 0, "likes": 0, "is_available": True}
+                for i in range(start, stop)
+            ])
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"p50={statistics.median(samples):7.3f} ms  p99={p99:7.3f} ms"
+
+
+async def measure(size: int, claims: int, legacy_claims: int):
+    # Usuarios FREE distintos: cada uno puede reclamar 3 veces por día
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(delete(PoolClaim))
+        await db.execute(delete(User).where(User.id.like("bench_free_%")))
+        await db.execute(insert(User), [
+            {"id": f"bench_free_{i}", "email": f"f{i}@son1k.test", "username": f"f{i}", "tier": "FREE"}
+            for i in range(claims)
+        ])
+        await db.commit()
+
+    CommunityPoolManager.sampler.invalidate()
+    load_started = time.perf_counter()
+    async with database.AsyncSessionLocal() as db:
+        await CommunityPoolManager.sampler.ensure_loaded(db)
+    load_ms = (time.perf_counter() - load_started) * 1000
+
+    sampler_ms = []
+    for i in range(claims):
+        async with database.AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await CommunityPoolManager(db).claim_from_pool(f"bench_free_{i}")
+            sampler_ms.append((time.perf_counter() - started) * 1000)
+
+    legacy_ms = []
+    for _ in range(legacy_claims):
+        async with database.AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            (await db.execute(select(PoolContribution, Generation).join(
+                Generation, PoolContribution.generation_id == Generation.id
+            ).where(
+                PoolContribution.is_available == True
+            ).order_by(func.random()).limit(1))).first()
+            legacy_ms.append((time.perf_counter() - started) * 1000)
+
+    print(f"📊 pool={size:>9,}  carga inicial del sampler {load_ms:8.1f} ms")
+    print(f"   claim (sampler)      {percentiles(sampler_ms)}")
+    print(f"   ORDER BY random()    {percentiles(legacy_ms)}")
+    return statistics.median(sampler_ms)
+
+
+async def run(sizes: list, claims: int, legacy_claims: int) -> list:
+    medians = []
+    try:
+        for size in sizes:
+            populate(size)
+            medians.append(await measure(size, claims, legacy_claims))
+    finally:
+        if database.write_queue is not None:
+            await database.write_queue.stop()
+        await database.async_engine.dispose()
+        if database.writer_engine is not None:
+            await database.writer_engine.dispose()
+    return medians
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--claims", type=int, default=300)
+    parser.add_argument("--legacy-claims", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=database.engine)
+    medians = asyncio.run(run(sorted(args.sizes), args.claims, args.legacy_claims))
+
+    # Plano = la mediana del tamaño mayor no supera 3x la del menor
+    flat = medians[-1] <= medians[0] * 3
+    print("\n✅ Latencia de claim plana" if flat else "\n❌ La latencia de claim crece con el pool")
+    sys.exit(0 if flat else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark de throughput de escritura en SQLite: modo por defecto vs modo
+concurrente (WAL + pragmas + cola de escritura única).
+
+Simula generaciones terminando a la vez: N escritores concurrentes registran
+generaciones (la misma unidad de trabajo que TierManager.record_generation:
+insert en generations, contadores del día y del mes, perfil de Pixel) mientras M
+lectores consultan generations. Reporta escrituras/s, errores "database is
+locked" y la latencia de lectura.
+
+Uso:
+    python benchmarks/sqlite_write_throughput.py
+    python benchmarks/sqlite_write_throughput.py --writers 50 --writes 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+# El engine global de la app no se usa: cada modo crea su propia base temporal
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'unused.db')}")
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from backend.database import Base, Generation, SQLiteWriteQueue, configure_sqlite_concurrency
+from backend.services.pixel.prompt_index import sign_prompts
+from backend.services.tiers.generation_cache import generation_cache_key
+from backend.services.tiers.tier_manager import TierManager
+
+def _generation(user_id: str, generation_id: str) -> dict:
+    """Fila de generations como la arma TierManager.record_generation"""
+    prompt = f"benchmark prompt {generation_id}"
+    return {
+        "id": generation_id,
+        "user_id": user_id,
+        "prompt": prompt,
+        "genre": "rock",
+        "quality": "standard",
+        "audio_url": None,
+        "created_at": datetime.now(),
+        "status": "completed",
+        "cache_key": generation_cache_key(prompt, "rock", "standard")
+    }
+
+async def run_mode(concurrent: bool, writers: int, writes: int, readers: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=writers + readers,
+        max_overflow=0,
+    )
+    if concurrent:
+        configure_sqlite_concurrency(engine)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    queue = SQLiteWriteQueue(session_factory) if concurrent else None
+
+    errors = 0
+    read_latencies = []
+    done = asyncio.Event()
+
+    async def writer(w: int):
+        nonlocal errors
+        for i in range(writes):
+            generation = _generation(f"user_{w % 10}", f"gen_{w}_{i}")
+            # Igual que record_generation: MinHash antes de abrir la transacción
+            signed = sign_prompts([generation])
+            try:
+                if queue is not None:
+                    await queue.submit(lambda db: TierManager(db)._write_generation(db, generation, signed))
+                else:
+                    async with session_factory() as db:
+                        await TierManager(db)._write_generation(db, generation, signed)
+                        await db.commit()
+            except OperationalError:
+                errors += 1
+
+    async def reader():
+        while not done.is_set():
+            started = time.perf_counter()
+            async with session_factory() as db:
+                await db.scalar(select(func.count(Generation.id)))
+            read_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)  # ~200 lecturas/s por lector
+
+    reader_tasks = [asyncio.create_task(reader()) for _ in range(readers)]
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(writers)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*reader_tasks)
+
+    if queue is not None:
+        await queue.stop()
+    async with session_factory() as db:
+        committed = await db.scalar(select(func.count(Generation.id)))
+    await engine.dispose()
+
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95)] if read_latencies else 0.0
+    return {
+        "committed": committed,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "writes_per_s": committed / elapsed if elapsed else 0.0,
+        "reads": len(read_latencies),
+        "read_p95_ms": p95 * 1000,
+        "batches": queue.batches if queue else committed,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Defaults que terminan en segundos (con 20x10 y 1 CPU: ~90 vs ~110
+    # writes/s); con más escritores el modo por defecto además empieza a
+    # perder escrituras por "database is locked"
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"🚀 {args.writers} escritores x {args.writes} escrituras, {args.readers} lectores\n")
+    for label, concurrent in (("default", False), ("concurrent (WAL + writer queue)", True)):
+        result = asyncio.run(run_mode(concurrent, args.writers, args.writes, args.readers))
+        print(f"📊 {label}")
+        print(f"   commits OK:      {result['committed']}/{args.writers * args.writes}")
+        print(f"   'locked' errors: {result['errors']}")
+        print(f"   writes/s:        {result['writes_per_s']:.0f}")
+        print(f"   transactions:    {result['batches']}")
+        print(f"   reads:           {result['reads']} (p95 {result['read_p95_ms']:.1f} ms)\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from database import engine, async_engine, writer_engine, write_queue, Base, get_pool_status
 from services.tiers import tier_manager
 from services.community import pool_manager
 from services.stealth import stealth_manager
 from services.alvae import alvae_system
 from services.pixel import pixel_companion
+from services.analytics import analytics_events, rollups, export
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Son1kVers3 API", version="2.3.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if write_queue is not None:
+        await write_queue.start()
+    await analytics_events.analytics_buffer.start()
+    await rollups.retention_job.start()
+    await pool_manager.trending_job.start()
+    await pool_manager.pool_counters.start()
+    await pool_manager.leaderboard_job.start()
+    yield
+    await pool_manager.leaderboard_job.stop()
+    await pool_manager.pool_counters.stop()
+    await pool_manager.trending_job.stop()
+    await rollups.retention_job.stop()
+    # Vaciar analytics antes de detener la cola de escritura
+    await analytics_events.analytics_buffer.stop()
+    if write_queue is not None:
+        await write_queue.stop()
+    # Cerrar conexiones del pool async (aiosqlite mantiene un hilo por conexión)
+    await async_engine.dispose()
+    if writer_engine is not None:
+        await writer_engine.dispose()
+
+app = FastAPI(title="Son1kVers3 API", version="2.3.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -27,6 +52,9 @@ app.include_router(pool_manager.router)
 app.include_router(stealth_manager.router)
 app.include_router(alvae_system.router)
 app.include_router(pixel_companion.router)
+app.include_router(analytics_events.router)
+app.include_router(rollups.router)
+app.include_router(export.router)
 
 @app.get("/")
 def read_root():
@@ -34,12 +62,14 @@ def read_root():
         "status": "online", 
         "version": "2.3.0",
         "ecosystem": "Son1kVers3",
-        "services": ["tiers", "community-pool", "stealth", "alvae", "pixel", "ai-local"]
+        "services": ["tiers", "community-pool", "stealth", "alvae", "pixel", "analytics", "ai-local"]
     }
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "timestamp": "2026-01-07"}
 
-
-
+@app.get("/health/db")
+def database_health():
+    """Métricas del pool de conexiones (espera en checkout y saturación)"""
+    return get_pool_status()
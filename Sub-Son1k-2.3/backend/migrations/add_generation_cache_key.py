@@ -0,0 +1,93 @@
+"""
+Migración: columna `cache_key` + índice (cache_key, created_at) en generations.
+
+record_generation guarda la clave de contenido (prompt normalizado, género y
+calidad) que usa la cache de resultados. Este script:
+1. Agrega la columna `cache_key` si no existe
+2. La rellena para las generaciones con prompt, por chunks de id
+3. Crea el índice ix_generations_cache_key_created
+
+Es idempotente: solo rellena filas con cache_key NULL.
+
+Uso:
+    python migrations/add_generation_cache_key.py
+    python migrations/add_generation_cache_key.py --chunk-size 20000
+"""
+
+import argparse
+import os
+import sys
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from backend.database import engine, Generation
+from backend.services.tiers.generation_cache import generation_cache_key
+
+def add_cache_key_column():
+    """Agregar la columna `cache_key` si la tabla es anterior a ella"""
+    columns = {c["name"] for c in inspect(engine).get_columns("generations")}
+    if "cache_key" in columns:
+        print("✅ Columna `cache_key` ya existe")
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE generations ADD COLUMN cache_key VARCHAR"))
+    print("✅ Columna `cache_key` agregada")
+
+def backfill_cache_keys(chunk_size: int) -> int:
+    """Calcular la clave de las generaciones con prompt (una transacción por chunk)"""
+    generations = Generation.__table__
+    filled, last_id = 0, ""
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Generation.id, Generation.prompt, Generation.genre, Generation.quality).where(
+                    Generation.id > last_id,
+                    Generation.cache_key.is_(None),
+                    Generation.prompt.is_not(None)
+                ).order_by(Generation.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                return filled
+            last_id = rows[-1].id
+
+            keys = []
+            for row in rows:
+                key = generation_cache_key(row.prompt, row.genre, row.quality or "standard")
+                if key:
+                    keys.append({"gid": row.id, "key": key})
+            if keys:
+                conn.execute(
+                    update(generations).where(generations.c.id == bindparam("gid"))
+                    .values(cache_key=bindparam("key")),
+                    keys
+                )
+            filled += len(keys)
+
+def create_index():
+    for index in Generation.__table__.indexes:
+        if index.name == "ix_generations_cache_key_created":
+            index.create(engine, checkfirst=True)
+    print("✅ Índice ix_generations_cache_key_created listo")
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregar y rellenar generations.cache_key")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Generaciones por transacción")
+    args = parser.parse_args()
+
+    print("🚀 Migrando generations → cache_key...")
+
+    if not inspect(engine).has_table("generations"):
+        print("ℹ️  La tabla no existe todavía; create_all la creará con el esquema nuevo")
+        return
+
+    add_cache_key_column()
+    print(f"✅ Claves calculadas: {backfill_cache_keys(args.chunk_size)}")
+    create_index()
+
+    print("\n🎉 Migración completada")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Migración: columna `day` + índice único (user_id, day) en user_generation_stats.
+
+Las consultas de cuota filtraban con func.date(date) == hoy, lo que impide usar
+índices. Este script:
+1. Agrega la columna `day` si no existe
+2. La rellena a partir de `date`
+3. Fusiona filas duplicadas del mismo usuario y día (suma los counts)
+4. Crea el índice único (user_id, day)
+
+Es idempotente: se puede ejecutar varias veces.
+"""
+
+import sys
+import os
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import delete, func, inspect, select, text, update
+from backend.database import engine, UserGenerationStats
+
+def add_day_column(conn):
+    """Agregar la columna `day` si la tabla es anterior a ella"""
+    columns = {c["name"] for c in inspect(conn).get_columns("user_generation_stats")}
+    if "day" in columns:
+        print("✅ Columna `day` ya existe")
+        return
+    conn.execute(text("ALTER TABLE user_generation_stats ADD COLUMN day DATE"))
+    print("✅ Columna `day` agregada")
+
+def backfill_day(conn):
+    """Rellenar `day` desde el timestamp `date`"""
+    result = conn.execute(
+        update(UserGenerationStats)
+        .where(UserGenerationStats.day.is_(None))
+        .values(day=func.date(UserGenerationStats.date))
+    )
+    print(f"✅ Filas rellenadas: {result.rowcount}")
+
+def merge_duplicates(conn):
+    """Fusionar filas del mismo (user_id, day) en la de menor id"""
+    duplicates = conn.execute(
+        select(
+            UserGenerationStats.user_id,
+            UserGenerationStats.day,
+            func.min(UserGenerationStats.id),
+            func.sum(UserGenerationStats.count)
+        )
+        .group_by(UserGenerationStats.user_id, UserGenerationStats.day)
+        .having(func.count(UserGenerationStats.id) > 1)
+    ).all()
+
+    for user_id, day, keep_id, total in duplicates:
+        conn.execute(
+            update(UserGenerationStats)
+            .where(UserGenerationStats.id == keep_id)
+            .values(count=total)
+        )
+        conn.execute(
+            delete(UserGenerationStats).where(
+                UserGenerationStats.user_id == user_id,
+                UserGenerationStats.day == day,
+                UserGenerationStats.id != keep_id
+            )
+        )
+
+    print(f"✅ Grupos duplicados fusionados: {len(duplicates)}")
+
+def create_unique_index(conn):
+    """Crear el índice único (user_id, day)"""
+    for index in UserGenerationStats.__table__.indexes:
+        if index.name == "ix_user_generation_stats_user_day":
+            index.create(conn, checkfirst=True)
+    print("✅ Índice único ix_user_generation_stats_user_day listo")
+
+def migrate():
+    print("🚀 Migrando user_generation_stats → (user_id, day)...")
+
+    if not inspect(engine).has_table("user_generation_stats"):
+        print("ℹ️  La tabla no existe todavía; create_all la creará con el esquema nuevo")
+        return
+
+    with engine.begin() as conn:
+        add_day_column(conn)
+        backfill_day(conn)
+        merge_duplicates(conn)
+        create_unique_index(conn)
+
+    print("\n🎉 Migración completada")
+
+if __name__ == "__main__":
+    migrate()
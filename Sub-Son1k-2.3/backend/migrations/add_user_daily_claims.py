@@ -0,0 +1,63 @@
+"""
+Migración: tabla user_daily_claims (contador diario de claims por usuario).
+
+El límite de 3 claims/día ahora se aplica con un upsert condicional sobre esta
+tabla en lugar de contar pool_claims. Este script crea la tabla y la rellena
+con los conteos por (user_id, día) de pool_claims, para que los claims ya hechos
+hoy sigan contando.
+
+Es idempotente: se puede ejecutar varias veces.
+"""
+
+import sys
+import os
+from datetime import date, datetime
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import func, inspect, select
+from backend.database import Base, engine, SessionLocal, PoolClaim, UserDailyClaims
+
+def backfill():
+    """Recalcular los contadores desde pool_claims"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(
+                PoolClaim.user_id,
+                func.date(PoolClaim.claimed_at),
+                func.count(PoolClaim.id)
+            )
+            .where(PoolClaim.claimed_at.is_not(None))
+            .group_by(PoolClaim.user_id, func.date(PoolClaim.claimed_at))
+        ).all()
+
+        for user_id, day, count in rows:
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            db.merge(UserDailyClaims(
+                user_id=user_id,
+                day=day,
+                count=count,
+                updated_at=datetime.utcnow()
+            ))
+        db.commit()
+        print(f"✅ Contadores rellenados: {len(rows)}")
+    finally:
+        db.close()
+
+def migrate():
+    print("🚀 Migrando límite diario de claims → user_daily_claims...")
+    Base.metadata.create_all(bind=engine, tables=[UserDailyClaims.__table__])
+    print("✅ Tabla user_daily_claims lista")
+
+    if not inspect(engine).has_table("pool_claims"):
+        print("ℹ️  pool_claims no existe todavía; no hay claims que rellenar")
+    else:
+        backfill()
+    print("\n🎉 Migración completada")
+
+if __name__ == "__main__":
+    migrate()
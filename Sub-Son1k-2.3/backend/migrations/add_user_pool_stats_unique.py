@@ -0,0 +1,66 @@
+"""
+Migración: índice único user_id en user_pool_stats.
+
+Las contribuciones actualizan las stats con un upsert (ON CONFLICT (user_id)),
+que necesita una fila por usuario. Este script:
+1. Fusiona filas duplicadas del mismo usuario (suma totales, último timestamp)
+2. Crea el índice único ix_user_pool_stats_user_unique
+
+Es idempotente: se puede ejecutar varias veces.
+"""
+
+import sys
+import os
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import delete, func, inspect, select, update
+from backend.database import engine, UserPoolStats
+
+def merge_duplicates(conn):
+    """Fusionar filas del mismo user_id en la de menor id"""
+    duplicates = conn.execute(
+        select(
+            UserPoolStats.user_id,
+            func.min(UserPoolStats.id),
+            func.sum(UserPoolStats.total_contributions),
+            func.sum(UserPoolStats.total_points),
+            func.max(UserPoolStats.last_contribution)
+        )
+        .group_by(UserPoolStats.user_id)
+        .having(func.count(UserPoolStats.id) > 1)
+    ).all()
+
+    for user_id, keep_id, contributions, points, last in duplicates:
+        conn.execute(
+            update(UserPoolStats)
+            .where(UserPoolStats.id == keep_id)
+            .values(total_contributions=contributions, total_points=points, last_contribution=last)
+        )
+        conn.execute(
+            delete(UserPoolStats)
+            .where(UserPoolStats.user_id == user_id, UserPoolStats.id != keep_id)
+        )
+
+    print(f"✅ Usuarios con filas duplicadas fusionadas: {len(duplicates)}")
+
+def migrate():
+    print("🚀 Migrando user_pool_stats → una fila por usuario...")
+
+    if not inspect(engine).has_table("user_pool_stats"):
+        print("ℹ️  La tabla no existe todavía; create_all la creará con el índice")
+        return
+
+    with engine.begin() as conn:
+        merge_duplicates(conn)
+        for index in UserPoolStats.__table__.indexes:
+            if index.unique:
+                index.create(conn, checkfirst=True)
+                print(f"✅ {index.name}")
+
+    print("\n🎉 Migración completada")
+
+if __name__ == "__main__":
+    migrate()
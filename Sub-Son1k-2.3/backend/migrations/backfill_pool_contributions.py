@@ -0,0 +1,122 @@
+"""
+Pasar generaciones históricas por la selección del pool comunitario.
+
+Usa la misma decisión que contribute_to_pool (hash del generation_id contra la
+tasa del tier del dueño), así que el resultado coincide con lo que se habría
+contribuido en vivo y se puede repetir sin duplicar: una generación que ya
+está en el pool se salta.
+
+Recorre generations por id en chunks; cada chunk seleccionado se inserta en
+una transacción con INSERT ... SELECT (contribuciones y pool_feed) y un upsert
+de user_pool_stats por usuario. Las contribuciones conservan la fecha de la
+generación.
+
+Requiere el índice único de add_user_pool_stats_unique.py.
+
+Uso:
+    python migrations/backfill_pool_contributions.py
+    python migrations/backfill_pool_contributions.py --dry-run
+    python migrations/backfill_pool_contributions.py --chunk-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import bindparam, select, update
+from backend import database
+from backend.database import AsyncSessionLocal, run_write, Generation, PoolFeedItem, TRENDING_WEIGHTS, trending_factor
+from backend.services.community.pool_manager import (
+    CommunityPoolManager, contribution_insert, feed_insert, pool_stats_upsert, selected_tiers, trending_epoch
+)
+
+async def insert_chunk(db, generation_ids: list, tiers: list) -> int:
+    contributions = (await db.execute(contribution_insert(generation_ids, tiers))).all()
+    if not contributions:
+        return 0
+
+    (await db.execute(feed_insert([row.id for row in contributions]))).all()
+
+    # hot_score según la fecha real de cada contribución (casi 0 si es vieja)
+    epoch = await trending_epoch(db)
+    feed = PoolFeedItem.__table__
+    await db.execute(
+        update(feed).where(feed.c.contribution_id == bindparam("cid")).values(hot_score=bindparam("hot")),
+        [
+            {"cid": row.id, "hot": TRENDING_WEIGHTS["contribution"] * trending_factor(row.contributed_at, epoch)}
+            for row in contributions
+        ]
+    )
+
+    await db.execute(pool_stats_upsert(db, contributions))
+    return len(contributions)
+
+async def backfill(chunk_size: int, dry_run: bool) -> dict:
+    rates = CommunityPoolManager.CONTRIBUTION_RATES
+    totals = {"scanned": 0, "selected": 0, "inserted": 0}
+    last_id = ""
+
+    if database.write_queue is not None:
+        await database.write_queue.start()
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                generation_ids = (await db.scalars(
+                    select(Generation.id).where(
+                        Generation.id > last_id,
+                        Generation.status == "completed",
+                        Generation.created_at.is_not(None)
+                    ).order_by(Generation.id).limit(chunk_size)
+                )).all()
+                if not generation_ids:
+                    break
+                last_id = generation_ids[-1]
+                totals["scanned"] += len(generation_ids)
+
+                # Agrupar por conjunto de tiers seleccionados (un INSERT por grupo)
+                groups = {}
+                for generation_id in generation_ids:
+                    tiers = selected_tiers(generation_id, rates)
+                    if tiers:
+                        groups.setdefault(tuple(tiers), []).append(generation_id)
+                totals["selected"] += sum(len(ids) for ids in groups.values())
+
+                if dry_run:
+                    continue
+                for tiers, ids in groups.items():
+                    totals["inserted"] += await run_write(
+                        db, lambda session, ids=ids, tiers=tiers: insert_chunk(session, ids, list(tiers))
+                    )
+    finally:
+        if database.write_queue is not None:
+            await database.write_queue.stop()
+        await database.async_engine.dispose()
+        if database.writer_engine is not None:
+            await database.writer_engine.dispose()
+
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de contribuciones al pool")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Generaciones por chunk")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar las seleccionadas")
+    args = parser.parse_args()
+
+    print("🚀 Seleccionando generaciones históricas para el pool...")
+    started = time.perf_counter()
+    totals = asyncio.run(backfill(args.chunk_size, args.dry_run))
+    elapsed = time.perf_counter() - started
+
+    rate = totals["scanned"] / elapsed if elapsed else 0
+    print(f"📊 revisadas={totals['scanned']} seleccionadas={totals['selected']} "
+          f"insertadas={totals['inserted']} ({rate:,.0f} generaciones/s)")
+    print("\n✅ Dry-run, sin cambios" if args.dry_run else "\n🎉 Backfill completado")
+
+if __name__ == "__main__":
+    main()
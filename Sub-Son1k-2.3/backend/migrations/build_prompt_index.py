@@ -0,0 +1,120 @@
+"""
+Construir el índice MinHash/LSH de prompts desde el historial de generations.
+
+record_generation mantiene el índice (prompt_signatures, prompt_lsh_buckets,
+user_prompts) y pixel_profiles.prompt_clusters al registrar cada generación;
+este script los reconstruye desde cero: vacía las tablas y reproduce las
+generaciones en orden cronológico por el mismo camino (index_prompts), así que
+el resultado coincide con lo que se habría calculado en vivo y se puede repetir.
+
+Correr después de rebuild_pixel_profiles.py (los perfiles tienen que existir)
+y, si es posible, con poco tráfico: las generaciones registradas durante la
+reconstrucción se cuentan dos veces en `uses`.
+
+Uso:
+    python migrations/build_prompt_index.py
+    python migrations/build_prompt_index.py --chunk-size 5000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import and_, bindparam, delete, func, inspect, or_, select, text, update
+from backend import database
+from backend.database import (
+    AsyncSessionLocal, Base, engine, run_write, Generation, PixelProfile, PromptBucket, PromptSignature, UserPrompt
+)
+from backend.services.pixel.prompt_index import index_prompts
+
+def prepare_tables():
+    """Crear las tablas del índice, agregar prompt_clusters y vaciar todo"""
+    Base.metadata.create_all(bind=engine, tables=[
+        PixelProfile.__table__, PromptSignature.__table__, PromptBucket.__table__, UserPrompt.__table__
+    ])
+    columns = {c["name"] for c in inspect(engine).get_columns("pixel_profiles")}
+    with engine.begin() as conn:
+        if "prompt_clusters" not in columns:
+            conn.execute(text("ALTER TABLE pixel_profiles ADD COLUMN prompt_clusters INTEGER NOT NULL DEFAULT 0"))
+            print("✅ Columna prompt_clusters agregada")
+        for table in (PromptBucket, UserPrompt, PromptSignature):
+            conn.execute(delete(table))
+        conn.execute(update(PixelProfile).values(prompt_clusters=0))
+
+async def index_chunk(db, generations: list) -> int:
+    new_clusters = await index_prompts(db, generations)
+    if new_clusters:
+        profiles = PixelProfile.__table__
+        await db.execute(
+            update(profiles).where(profiles.c.user_id == bindparam("uid"))
+            .values(prompt_clusters=profiles.c.prompt_clusters + bindparam("clusters")),
+            [{"uid": user_id, "clusters": clusters} for user_id, clusters in new_clusters.items()]
+        )
+    return sum(new_clusters.values())
+
+async def build(chunk_size: int) -> dict:
+    totals = {"generations": 0, "clusters": 0}
+    last = None
+
+    if database.write_queue is not None:
+        await database.write_queue.start()
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                # Keyset por (created_at, id): orden cronológico estable
+                query = select(
+                    Generation.id, Generation.user_id, Generation.prompt, Generation.created_at
+                ).where(
+                    Generation.prompt.is_not(None),
+                    Generation.user_id.is_not(None),
+                    Generation.created_at.is_not(None)
+                ).order_by(Generation.created_at, Generation.id).limit(chunk_size)
+                if last is not None:
+                    query = query.where(or_(
+                        Generation.created_at > last[0],
+                        and_(Generation.created_at == last[0], Generation.id > last[1])
+                    ))
+                rows = (await db.execute(query)).all()
+                if not rows:
+                    break
+                last = (rows[-1].created_at, rows[-1].id)
+                totals["generations"] += len(rows)
+
+                generations = [row._asdict() for row in rows]
+                totals["clusters"] += await run_write(
+                    db, lambda session, generations=generations: index_chunk(session, generations)
+                )
+    finally:
+        if database.write_queue is not None:
+            await database.write_queue.stop()
+        await database.async_engine.dispose()
+        if database.writer_engine is not None:
+            await database.writer_engine.dispose()
+
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Construir el índice de prompts casi duplicados")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Generaciones por transacción")
+    args = parser.parse_args()
+
+    print("🚀 Reconstruyendo el índice MinHash/LSH de prompts...")
+    prepare_tables()
+    started = time.perf_counter()
+    totals = asyncio.run(build(args.chunk_size))
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        prompts = conn.scalar(select(func.count()).select_from(PromptSignature))
+    rate = totals["generations"] / elapsed if elapsed else 0
+    print(f"📊 generaciones={totals['generations']} prompts distintos={prompts} grupos={totals['clusters']} ({rate:,.0f} generaciones/s)")
+    print("\n🎉 Índice de prompts reconstruido")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Migración: eliminar los índices del feed en pool_contributions.
+
+El feed se sirve desde el read model pool_feed (ver rebuild_pool_feed.py),
+que tiene sus propios índices de keyset. Los índices compuestos
+(is_available, columna de orden, id) de pool_contributions ya no los usa
+ninguna consulta, y plays/likes se reescriben en cada flush de contadores:
+solo agregaban escrituras.
+
+Es idempotente: se puede ejecutar varias veces.
+"""
+
+import sys
+import os
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import inspect, text
+from backend.database import engine
+
+OBSOLETE_INDEXES = [
+    "ix_pool_contributions_feed_recent",
+    "ix_pool_contributions_feed_popular",
+    "ix_pool_contributions_feed_quality",
+]
+
+def migrate():
+    print("🚀 Eliminando índices del feed en pool_contributions...")
+
+    if not inspect(engine).has_table("pool_contributions"):
+        print("ℹ️  La tabla no existe todavía; no hay nada que eliminar")
+        return
+
+    existing = {index["name"] for index in inspect(engine).get_indexes("pool_contributions")}
+    with engine.begin() as conn:
+        for name in OBSOLETE_INDEXES:
+            if name in existing:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                print(f"✅ {name} eliminado")
+
+    print("\n🎉 Migración completada")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,56 @@
+"""
+Exportar analytics_events y generations a Parquet / Arrow IPC.
+
+Lee con un cursor del lado del servidor en chunks (memoria constante) y escribe
+archivos particionados por día en <out>/<tabla>/day=YYYY-MM-DD/. Es incremental:
+cada ejecución continúa desde el último timestamp exportado, así que se puede
+programar en cron.
+
+Requiere pyarrow (pip install pyarrow).
+
+Uso:
+    python migrations/export_columnar.py                       # todas las tablas
+    python migrations/export_columnar.py --table generations --format arrow
+    python migrations/export_columnar.py --out /data/exports --chunk-size 100000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from backend import database
+from backend.services.analytics import export
+
+async def run(args) -> list:
+    try:
+        return await export.export_tables(args.table, args.out, args.format, args.chunk_size)
+    finally:
+        await database.async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export columnar incremental")
+    parser.add_argument("--table", action="append", choices=list(export.EXPORT_TABLES),
+                        help="Tabla a exportar (repetible); por defecto todas")
+    parser.add_argument("--format", default="parquet", choices=list(export.FORMATS))
+    parser.add_argument("--out", default=export.EXPORT_DIR, help="Directorio de salida")
+    parser.add_argument("--chunk-size", type=int, default=export.EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if export.pa is None:
+        print("❌ pyarrow no está instalado (pip install pyarrow)")
+        sys.exit(1)
+
+    print(f"🚀 Exportando a {args.out} ({args.format})...")
+    for result in asyncio.run(run(args)):
+        print(f"✅ {result['table']}: {result['rows']} filas en {len(result['files'])} archivos "
+              f"({result['elapsed_ms']} ms), watermark={result['watermark']}")
+
+    print("\n🎉 Export completado")
+
+if __name__ == "__main__":
+    main()
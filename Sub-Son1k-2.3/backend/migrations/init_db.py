@@ -6,10 +6,11 @@ del ecosistema Son1kVers3.
 import sys
 import os
 
-# Agregar el directorio padre al path
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
 
-from database import Base, engine, SessionLocal, User
+from backend.database import Base, engine, SessionLocal, User
 
 def init_db():
     """Crear todas las tablas en la base de datos"""
@@ -0,0 +1,70 @@
+"""
+Recalcular el read model pixel_profiles desde el historial completo de generations.
+
+record_generation mantiene los perfiles incrementalmente; este script los
+recalcula para todos los usuarios (perfiles anteriores al read model o
+pensado como job nocturno en cron). Lee generations por rangos de usuarios
+contiguos, agrega cada rango con operaciones vectorizadas de NumPy y escribe
+los perfiles con upserts por lote. Con --workers reparte los rangos entre
+procesos. También reconstruye la matriz de géneros (genre_pairs); prompt_clusters
+se conserva (lo reconstruye build_prompt_index.py).
+
+Requiere numpy (pip install numpy). Es idempotente.
+
+Uso:
+    python migrations/rebuild_pixel_profiles.py
+    python migrations/rebuild_pixel_profiles.py --workers 4 --chunk-size 500000
+"""
+
+import argparse
+import os
+import sys
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import inspect, text
+from backend.database import Base, engine, GenrePair, PixelProfile
+from backend.services.pixel import recompute
+
+# Columnas agregadas después de crear pixel_profiles
+NEW_COLUMNS = {
+    "last_genre": "VARCHAR",
+    "prompt_clusters": "INTEGER NOT NULL DEFAULT 0"
+}
+
+def add_missing_columns():
+    """Agregar a tablas pixel_profiles anteriores las columnas que les falten"""
+    columns = {c["name"] for c in inspect(engine).get_columns("pixel_profiles")}
+    for name, ddl in NEW_COLUMNS.items():
+        if name not in columns:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE pixel_profiles ADD COLUMN {name} {ddl}"))
+            print(f"✅ Columna {name} agregada")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcular pixel_profiles")
+    parser.add_argument("--chunk-size", type=int, default=200_000,
+                        help="Generaciones por rango de usuarios")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos (shards de usuarios)")
+    args = parser.parse_args()
+
+    if recompute.np is None:
+        print("❌ numpy no está instalado (pip install numpy)")
+        sys.exit(1)
+
+    print("🚀 Recalculando pixel_profiles desde generations...")
+    Base.metadata.create_all(bind=engine, tables=[PixelProfile.__table__, GenrePair.__table__])
+    add_missing_columns()
+    stats = recompute.recompute_profiles(args.chunk_size, args.workers)
+
+    print(f"📊 usuarios={stats['users']} generaciones={stats['generations']} rangos={stats['ranges']} "
+          f"pares de géneros={stats['genre_pairs']} "
+          f"({stats['elapsed_seconds']} s, {stats['generations_per_second']:,} generaciones/s)")
+    for name in ("skill_level", "goals"):
+        print(f"   {name}: {stats.get(name, {})}")
+    print("\n🎉 Perfiles recalculados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Regenerar el read model pool_feed desde pool_contributions, generations y users.
+
+Reconstruye la tabla completa en una sola transacción (DELETE + INSERT ... SELECT),
+así que los lectores ven el feed anterior o el nuevo, nunca uno a medias. Antes
+reporta cuántas filas difieren (drift) del estado esperado.
+
+hot_score no se puede derivar de las tablas fuente (no guardan cuándo ocurrió
+cada play/like): se conserva el de las filas existentes y las filas nuevas se
+siembran como si toda su actividad hubiera ocurrido al contribuir.
+
+Uso:
+    python migrations/rebuild_pool_feed.py             # reconstruir
+    python migrations/rebuild_pool_feed.py --dry-run   # solo reportar drift
+"""
+
+import argparse
+import sys
+import os
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from datetime import datetime
+from sqlalchemy import bindparam, delete, insert, inspect, select, text, update
+from backend.database import (
+    Base, engine, Generation, PoolContribution, PoolFeedItem, PoolTrendingState, User,
+    TRENDING_WEIGHTS, trending_factor
+)
+
+FEED_COLUMNS = [
+    "contribution_id", "generation_id", "user_id", "genre", "quality", "audio_url",
+    "username", "avatar_url", "contributed_at", "points", "plays", "likes", "is_available"
+]
+
+def source_query():
+    """Filas esperadas del feed (mismo join que servía el feed antes del read model)"""
+    return select(
+        PoolContribution.id,
+        Generation.id,
+        User.id,
+        Generation.genre,
+        PoolContribution.quality,
+        Generation.audio_url,
+        User.username,
+        User.avatar_url,
+        PoolContribution.contributed_at,
+        PoolContribution.points,
+        PoolContribution.plays,
+        PoolContribution.likes,
+        PoolContribution.is_available
+    ).join(
+        Generation, PoolContribution.generation_id == Generation.id
+    ).join(
+        User, PoolContribution.user_id == User.id
+    )
+
+def count_drift(conn) -> dict:
+    """Comparar el feed actual con las tablas fuente"""
+    expected = {row[0]: tuple(row) for row in conn.execute(source_query())}
+    current = {
+        row[0]: tuple(row)
+        for row in conn.execute(select(*[PoolFeedItem.__table__.c[name] for name in FEED_COLUMNS]))
+    }
+    return {
+        "missing": len(expected.keys() - current.keys()),
+        "orphaned": len(current.keys() - expected.keys()),
+        "stale": sum(1 for key in expected.keys() & current.keys() if expected[key] != current[key]),
+        "expected": len(expected)
+    }
+
+def add_hot_score_column():
+    """Agregar hot_score (y sus índices) a tablas pool_feed anteriores"""
+    columns = {c["name"] for c in inspect(engine).get_columns("pool_feed")}
+    with engine.begin() as conn:
+        if "hot_score" not in columns:
+            conn.execute(text("ALTER TABLE pool_feed ADD COLUMN hot_score FLOAT NOT NULL DEFAULT 0"))
+            print("✅ Columna hot_score agregada")
+        for index in PoolFeedItem.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+def seed_hot_scores(conn, previous: dict):
+    """Conservar los scores previos y sembrar los de filas nuevas"""
+    epoch = conn.scalar(select(PoolTrendingState.epoch).where(PoolTrendingState.id == 1))
+    if epoch is None:
+        epoch = datetime.now()
+        conn.execute(insert(PoolTrendingState).values(id=1, epoch=epoch))
+
+    rows = conn.execute(select(
+        PoolFeedItem.contribution_id, PoolFeedItem.contributed_at, PoolFeedItem.plays, PoolFeedItem.likes
+    )).all()
+    scores = []
+    for contribution_id, contributed_at, plays, likes in rows:
+        score = previous.get(contribution_id)
+        if score is None:
+            weight = (
+                TRENDING_WEIGHTS["contribution"]
+                + TRENDING_WEIGHTS["play"] * (plays or 0)
+                + TRENDING_WEIGHTS["like"] * (likes or 0)
+            )
+            score = weight * trending_factor(contributed_at or epoch, epoch)
+        scores.append({"cid": contribution_id, "score": score})
+
+    if scores:
+        feed = PoolFeedItem.__table__
+        conn.execute(
+            update(feed).where(feed.c.contribution_id == bindparam("cid")).values(hot_score=bindparam("score")),
+            scores
+        )
+
+def rebuild(dry_run: bool = False) -> dict:
+    with engine.begin() as conn:
+        drift = count_drift(conn)
+        print(f"📊 esperadas={drift['expected']} faltantes={drift['missing']} "
+              f"huérfanas={drift['orphaned']} desactualizadas={drift['stale']}")
+
+        if not dry_run:
+            previous = dict(conn.execute(select(PoolFeedItem.contribution_id, PoolFeedItem.hot_score)).all())
+            conn.execute(delete(PoolFeedItem))
+            conn.execute(insert(PoolFeedItem).from_select(FEED_COLUMNS, source_query()))
+            seed_hot_scores(conn, previous)
+
+    return drift
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruir pool_feed")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reportar el drift")
+    args = parser.parse_args()
+
+    print("🚀 Reconstruyendo pool_feed desde las tablas fuente...")
+    Base.metadata.create_all(bind=engine, tables=[PoolFeedItem.__table__, PoolTrendingState.__table__])
+    if not args.dry_run:
+        add_hot_score_column()
+
+    drift = rebuild(args.dry_run)
+    has_drift = drift["missing"] or drift["orphaned"] or drift["stale"]
+
+    if args.dry_run:
+        print("\n✅ Sin drift" if not has_drift else "\n⚠️  Hay drift (dry-run, sin cambios)")
+    else:
+        print(f"\n🎉 pool_feed reconstruido ({drift['expected']} filas)")
+
+    # Código de salida != 0 si hubo drift, útil para cron/alertas
+    sys.exit(1 if has_drift else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Reconciliar el rollup mensual user_month_usage con las filas diarias.
+
+Recalcula SUM(count) por (user_id, month_year) desde user_generation_stats,
+reporta cada diferencia (drift) con el rollup y lo reescribe.
+También sirve para poblar el rollup por primera vez en bases existentes.
+
+Uso:
+    python migrations/reconcile_month_usage.py             # reconciliar todo
+    python migrations/reconcile_month_usage.py --month 2026-01
+    python migrations/reconcile_month_usage.py --dry-run   # solo reportar
+"""
+
+import argparse
+import sys
+import os
+from datetime import datetime
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import delete, func, select
+from backend.database import Base, engine, SessionLocal, UserGenerationStats, UserMonthUsage
+
+def reconcile(month_year: str = None, dry_run: bool = False) -> list:
+    """Reconstruir el rollup y devolver la lista de drifts encontrados"""
+    db = SessionLocal()
+    try:
+        daily = select(
+            UserGenerationStats.user_id,
+            UserGenerationStats.month_year,
+            func.sum(UserGenerationStats.count)
+        ).group_by(UserGenerationStats.user_id, UserGenerationStats.month_year)
+        rollup = select(UserMonthUsage)
+        if month_year:
+            daily = daily.where(UserGenerationStats.month_year == month_year)
+            rollup = rollup.where(UserMonthUsage.month_year == month_year)
+
+        expected = {(user_id, month): total or 0 for user_id, month, total in db.execute(daily)}
+        current = {(row.user_id, row.month_year): row.count for row in db.scalars(rollup)}
+
+        drifts = [
+            (key, current.get(key), expected.get(key, 0))
+            for key in sorted(expected.keys() | current.keys())
+            if current.get(key) != expected.get(key, 0)
+        ]
+
+        for (user_id, month), actual, correct in drifts:
+            print(f"⚠️  {user_id} {month}: rollup={actual} diario={correct}")
+
+        if not dry_run and drifts:
+            for (user_id, month), actual, correct in drifts:
+                if correct == 0:
+                    db.execute(delete(UserMonthUsage).where(
+                        UserMonthUsage.user_id == user_id,
+                        UserMonthUsage.month_year == month
+                    ))
+                    continue
+                db.merge(UserMonthUsage(
+                    user_id=user_id,
+                    month_year=month,
+                    count=correct,
+                    updated_at=datetime.utcnow()
+                ))
+            db.commit()
+
+        return drifts
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconciliar user_month_usage")
+    parser.add_argument("--month", help="Mes a reconciliar (YYYY-MM); por defecto todos")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reportar el drift")
+    args = parser.parse_args()
+
+    print("🚀 Reconciliando user_month_usage con user_generation_stats...")
+    Base.metadata.create_all(bind=engine, tables=[UserMonthUsage.__table__])
+
+    drifts = reconcile(args.month, args.dry_run)
+
+    if not drifts:
+        print("✅ Sin drift: el rollup coincide con las filas diarias")
+    elif args.dry_run:
+        print(f"\n📊 {len(drifts)} filas con drift (dry-run, sin cambios)")
+    else:
+        print(f"\n🎉 {len(drifts)} filas corregidas")
+
+    # Código de salida != 0 si hubo drift, útil para cron/alertas
+    sys.exit(1 if drifts else 0)
+
+if __name__ == "__main__":
+    main()
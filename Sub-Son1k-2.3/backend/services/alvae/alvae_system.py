@@ -4,10 +4,11 @@ Sistema de badges exclusivos para founding team y early adopters
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Optional
 from datetime import datetime
-from ...database import get_db, User, ALVAEMember
+from ...database import get_db, run_write, User, ALVAEMember
 
 router = APIRouter(prefix="/api/alvae", tags=["alvae"])
 
@@ -73,23 +74,23 @@ class ALVAESystem:
         }
     }
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     async def is_alvae_holder(self, user_id: str) -> bool:
         """Verificar si un usuario es ALVAE holder"""
-        member = self.db.query(ALVAEMember).filter(
+        member = await self.db.scalar(select(ALVAEMember).where(
             ALVAEMember.user_id == user_id,
             ALVAEMember.is_active == True
-        ).first()
+        ))
         return member is not None
     
     async def get_alvae_member(self, user_id: str) -> Optional[ALVAEMember]:
         """Obtener datos de ALVAE member"""
-        return self.db.query(ALVAEMember).filter(
+        return await self.db.scalar(select(ALVAEMember).where(
             ALVAEMember.user_id == user_id,
             ALVAEMember.is_active == True
-        ).first()
+        ))
     
     async def grant_alvae(
         self,
@@ -113,7 +114,7 @@ class ALVAESystem:
             raise HTTPException(400, "Invalid tier. Use TESTER or EARLY_ADOPTER")
         
         # Verificar que el usuario objetivo existe
-        target_user = self.db.query(User).filter(User.id == target_user_id).first()
+        target_user = await self.db.scalar(select(User).where(User.id == target_user_id))
         if not target_user:
             raise HTTPException(404, "Target user not found")
         
@@ -122,27 +123,28 @@ class ALVAESystem:
         if existing:
             raise HTTPException(400, f"User is already ALVAE ({existing.alvae_id})")
         
-        # Generar ALVAE ID único
-        count = self.db.query(ALVAEMember).count()
-        alvae_id = f"ALVAE-{str(count + 1).zfill(3)}"
+        async def _write(db: AsyncSession) -> ALVAEMember:
+            # Generar ALVAE ID único
+            count = await db.scalar(select(func.count(ALVAEMember.id)))
+            alvae_id = f"ALVAE-{str(count + 1).zfill(3)}"
+            
+            # Crear member
+            member = ALVAEMember(
+                user_id=target_user_id,
+                alvae_id=alvae_id,
+                tier=tier,
+                granted_at=datetime.now(),
+                granted_by=granted_by_user_id,
+                privileges=self.TIER_PRIVILEGES[tier],
+                notes=notes,
+                is_active=True
+            )
+            
+            db.add(member)
+            await db.flush()
+            return member
         
-        # Crear member
-        member = ALVAEMember(
-            user_id=target_user_id,
-            alvae_id=alvae_id,
-            tier=tier,
-            granted_at=datetime.now(),
-            granted_by=granted_by_user_id,
-            privileges=self.TIER_PRIVILEGES[tier],
-            notes=notes,
-            is_active=True
-        )
-        
-        self.db.add(member)
-        self.db.commit()
-        self.db.refresh(member)
-        
-        return member
+        return await run_write(self.db, _write)
     
     async def revoke_alvae(
         self,
@@ -169,20 +171,24 @@ class ALVAESystem:
             raise HTTPException(403, "Cannot revoke FOUNDER status")
         
         # Desactivar
-        member.is_active = False
-        self.db.commit()
+        async def _write(db: AsyncSession):
+            await db.execute(update(ALVAEMember).where(
+                ALVAEMember.id == member.id
+            ).values(is_active=False))
+        
+        await run_write(self.db, _write)
         
         return {"revoked": True, "alvae_id": member.alvae_id}
     
     async def get_all_alvae_members(self) -> list:
         """Obtener todos los ALVAE members activos"""
-        members = self.db.query(ALVAEMember, User).join(
+        members = (await self.db.execute(select(ALVAEMember, User).join(
             User, ALVAEMember.user_id == User.id
-        ).filter(
+        ).where(
             ALVAEMember.is_active == True
         ).order_by(
             ALVAEMember.granted_at
-        ).all()
+        ))).all()
         
         return [
             {
@@ -211,7 +217,7 @@ class ALVAESystem:
 # ==================== ENDPOINTS ====================
 
 @router.get("/status/{user_id}")
-async def check_alvae_status(user_id: str, db: Session = Depends(get_db)):
+async def check_alvae_status(user_id: str, db: AsyncSession = Depends(get_db)):
     """Verificar si un usuario es ALVAE holder"""
     system = ALVAESystem(db)
     
@@ -237,7 +243,7 @@ async def check_alvae_status(user_id: str, db: Session = Depends(get_db)):
 @router.post("/grant")
 async def grant_alvae_status(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Otorgar ALVAE status a un usuario.
@@ -266,7 +272,7 @@ async def grant_alvae_status(
 @router.post("/revoke")
 async def revoke_alvae_status(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Revocar ALVAE status.
@@ -286,7 +292,7 @@ async def revoke_alvae_status(
     return result
 
 @router.get("/members")
-async def get_alvae_members(db: Session = Depends(get_db)):
+async def get_alvae_members(db: AsyncSession = Depends(get_db)):
     """Obtener lista de todos los ALVAE members"""
     system = ALVAESystem(db)
     members = await system.get_all_alvae_members()
@@ -300,7 +306,7 @@ async def get_alvae_members(db: Session = Depends(get_db)):
 async def check_privilege(
     user_id: str,
     privilege_name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Verificar si un usuario tiene un privilegio específico"""
     system = ALVAESystem(db)
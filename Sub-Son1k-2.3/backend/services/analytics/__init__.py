@@ -0,0 +1 @@
+from . import analytics_events, rollups, export
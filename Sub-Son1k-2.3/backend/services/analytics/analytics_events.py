@@ -0,0 +1,310 @@
+"""
+Analytics Events - Ingesta bufferizada hacia analytics_events
+"""
+
+from fastapi import APIRouter
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from collections import deque
+from datetime import datetime
+import asyncio
+import json
+import logging
+import os
+import time
+from ...database import AsyncSessionLocal, run_write, AnalyticsEvent
+from .rollups import apply_events
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+logger = logging.getLogger(__name__)
+
+class AnalyticsBuffer:
+    """
+    Buffer en proceso para eventos de analytics.
+
+    track() solo encola en memoria (no toca la base de datos), así que registrar
+    un evento no agrega latencia al request. Un task de fondo vacía el buffer con
+    inserts masivos cuando se llena un lote o pasa el intervalo de flush.
+
+    Backpressure: si el buffer alcanza max_pending, los eventos nuevos se
+    escriben a un archivo JSONL (spill) que se reinyecta cuando hay capacidad;
+    sin spill_path configurado se descartan y se cuentan como dropped. La
+    escritura y la lectura del spill corren en un thread, fuera del event loop.
+
+    Un lote que falla max_attempts veces seguidas se aparta a <spill_path>.failed
+    (que no se reinyecta) para que no bloquee a los siguientes.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 2.0,
+        max_pending: int = 50000,
+        spill_path: Optional[str] = None,
+        max_attempts: int = 10
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.max_attempts = max_attempts
+
+        self._events: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # Fallos seguidos del lote al frente del buffer
+        self._attempts = 0
+
+        # Eventos que esperan ser escritos al spill por el task de fondo
+        self._to_spill: List[Dict] = []
+        self._spill_task: Optional[asyncio.Task] = None
+        # Serializa escrituras y lecturas del spill (el replay renombra el archivo)
+        self._spill_lock: Optional[asyncio.Lock] = None
+
+        # Métricas
+        self.tracked = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.flushes = 0
+        self.errors = 0
+        self.quarantined = 0
+        self.last_flush_ms = 0.0
+
+    def track(self, event_type: str, user_id: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
+        """
+        Encolar un evento. No bloquea ni hace I/O: en backpressure el evento
+        se deriva a un task de fondo que lo escribe a disco.
+
+        Returns:
+            True si quedó en el buffer, False si se derivó a disco o se descartó
+        """
+        event = {
+            "event_type": event_type,
+            "user_id": user_id,
+            "timestamp": datetime.utcnow(),
+            "meta": metadata
+        }
+        self.tracked += 1
+
+        if len(self._events) >= self.max_pending:
+            self._schedule_spill([event])
+            return False
+
+        self._events.append(event)
+        if len(self._events) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        """Arrancar el task de flush y reinyectar eventos derivados a disco"""
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._spill_lock = asyncio.Lock()
+        await self._replay_spill()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detener el task y vaciar todo lo pendiente (graceful shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._events:
+            if not await self.flush():
+                # La base no acepta escrituras: conservar lo pendiente en disco
+                self._schedule_spill(list(self._events))
+                self._events.clear()
+                break
+
+        if self._spill_task is not None:
+            await self._spill_task
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._events:
+                if not await self.flush():
+                    break
+                if len(self._events) < self.batch_size:
+                    break
+
+            if len(self._events) < self.max_pending // 2:
+                await self._replay_spill()
+
+    async def flush(self) -> bool:
+        """Insertar un lote en analytics_events. Devuelve False si falló."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            batch = [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+            if not batch:
+                return True
+
+            started = time.perf_counter()
+            try:
+                await self._write_batch(batch)
+            except Exception:
+                logger.exception("Analytics flush failed (%d events)", len(batch))
+                self.errors += 1
+                self._attempts += 1
+                if self._attempts < self.max_attempts:
+                    # Devolver el lote al frente del buffer para reintentar
+                    self._events.extendleft(reversed(batch))
+                else:
+                    # Lote envenenado: apartarlo para no reintentarlo para siempre
+                    logger.error("Analytics batch quarantined after %d attempts (%d events)", self._attempts, len(batch))
+                    self._attempts = 0
+                    self.quarantined += len(batch)
+                    await self._write_spill(batch, quarantine=True)
+                return False
+
+            self._attempts = 0
+            self.flushes += 1
+            self.flushed += len(batch)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+            return True
+
+    async def _write_batch(self, batch: List[Dict]):
+        async def _write(db: AsyncSession):
+            await db.execute(insert(AnalyticsEvent), batch)
+            # Rollups en la misma transacción: nunca divergen de los eventos crudos
+            await apply_events(db, batch)
+
+        async with AsyncSessionLocal() as db:
+            await run_write(db, _write)
+
+    def _schedule_spill(self, events: List[Dict]):
+        """Derivar eventos a disco desde código síncrono sin bloquear el event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Fuera de un event loop (scripts): no hay nada que bloquear
+            self._spill(events)
+            return
+
+        self._to_spill.extend(events)
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._drain_spill())
+
+    async def _drain_spill(self):
+        while self._to_spill:
+            events, self._to_spill = self._to_spill, []
+            await self._write_spill(events)
+
+    async def _write_spill(self, events: List[Dict], quarantine: bool = False):
+        if self._spill_lock is None:
+            self._spill_lock = asyncio.Lock()
+        async with self._spill_lock:
+            await asyncio.to_thread(self._spill, events, quarantine)
+
+    def _spill(self, events: List[Dict], quarantine: bool = False):
+        """Derivar eventos a disco (o descartarlos si no hay spill_path)"""
+        if not self.spill_path:
+            self.dropped += len(events)
+            return
+        path = f"{self.spill_path}.failed" if quarantine else self.spill_path
+        try:
+            with open(path, "a", encoding="utf-8") as spill:
+                for event in events:
+                    spill.write(json.dumps({**event, "timestamp": event["timestamp"].isoformat()}) + "\n")
+            if not quarantine:
+                self.spilled += len(events)
+        except OSError:
+            logger.exception("Analytics spill failed")
+            self.dropped += len(events)
+
+    async def _replay_spill(self):
+        """Reinyectar en el buffer los eventos derivados a disco"""
+        if not self.spill_path:
+            return
+        if self._spill_lock is None:
+            self._spill_lock = asyncio.Lock()
+
+        async with self._spill_lock:
+            capacity = self.max_pending - len(self._events)
+            events = await asyncio.to_thread(self._read_spill, capacity)
+        self._events.extend(events)
+
+    def _read_spill(self, limit: int) -> List[Dict]:
+        """
+        Leer hasta `limit` eventos del spill. Las líneas que no entran vuelven
+        al spill sin parsearse.
+        """
+        if not os.path.exists(self.spill_path):
+            return []
+
+        replay_path = f"{self.spill_path}.replay"
+        os.replace(self.spill_path, replay_path)
+
+        events = []
+        with open(replay_path, encoding="utf-8") as spill, \
+                open(self.spill_path, "a", encoding="utf-8") as rest:
+            for line in spill:
+                if not line.strip():
+                    continue
+                if len(events) < limit:
+                    event = json.loads(line)
+                    event["timestamp"] = datetime.fromisoformat(event["timestamp"])
+                    events.append(event)
+                else:
+                    rest.write(line)
+
+        os.remove(replay_path)
+        if not os.path.getsize(self.spill_path):
+            os.remove(self.spill_path)
+        return events
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._events),
+            "tracked": self.tracked,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "quarantined": self.quarantined,
+            "last_flush_ms": self.last_flush_ms,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "max_pending": self.max_pending,
+            "max_attempts": self.max_attempts
+        }
+
+analytics_buffer = AnalyticsBuffer(
+    batch_size=int(os.getenv("ANALYTICS_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "2")),
+    max_pending=int(os.getenv("ANALYTICS_MAX_PENDING", "50000")),
+    spill_path=os.getenv("ANALYTICS_SPILL_PATH", "./analytics_spill.jsonl") or None,
+    max_attempts=int(os.getenv("ANALYTICS_MAX_ATTEMPTS", "10"))
+)
+
+def track(event_type: str, user_id: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
+    """
+    Registrar un evento de analytics (generation, claim, like, upgrade, ...).
+    No bloqueante: el insert ocurre en lote en segundo plano.
+    """
+    return analytics_buffer.track(event_type, user_id, metadata)
+
+# ==================== ENDPOINTS ====================
+
+@router.get("/buffer")
+async def get_buffer_stats():
+    """Estado del buffer de ingesta (pendientes, flushes, spill, descartes)"""
+    return analytics_buffer.stats()
@@ -0,0 +1,313 @@
+"""
+Columnar Export - analytics_events y generations a Parquet / Arrow IPC
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+from sqlalchemy import and_, or_, select
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+import time
+from ...database import async_engine, AnalyticsEvent, Generation
+
+# pyarrow es opcional: solo hace falta para exportar
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+EXPORT_DIR = os.getenv("ANALYTICS_EXPORT_DIR", "./exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("ANALYTICS_EXPORT_CHUNK_SIZE", "50000"))
+# Margen para no exportar filas que todavía pueden aparecer con un timestamp
+# anterior al watermark: debe cubrir el flush del buffer de analytics y la
+# transacción de escritura más larga (el timestamp se asigna antes del commit)
+EXPORT_LAG_SECONDS = int(os.getenv("ANALYTICS_EXPORT_LAG", "900"))
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# tabla -> (modelo, columna de tiempo usada para particionar y como watermark,
+# reloj con el que se escribe esa columna: el corte se calcula con el mismo)
+EXPORT_TABLES = {
+    "analytics_events": (AnalyticsEvent, AnalyticsEvent.timestamp, datetime.utcnow),
+    "generations": (Generation, Generation.created_at, datetime.now)
+}
+
+def load_export_state(table: str, out_dir: str = EXPORT_DIR) -> Dict:
+    """Estado guardado de la última exportación de una tabla (no requiere pyarrow)"""
+    state_path = os.path.join(out_dir, table, "_export_state.json")
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, encoding="utf-8") as state:
+        return json.load(state)
+
+def _arrow_schema(model):
+    """Schema Arrow a partir de las columnas de la tabla (JSON se exporta como texto)"""
+    types = {
+        "Integer": pa.int64(),
+        "Float": pa.float64(),
+        "Boolean": pa.bool_(),
+        "DateTime": pa.timestamp("us"),
+        "Date": pa.date32()
+    }
+    return pa.schema([
+        pa.field(column.name, types.get(type(column.type).__name__, pa.string()))
+        for column in model.__table__.columns
+    ])
+
+class ColumnarExporter:
+    """
+    Exporta una tabla en orden (timestamp, id) con un cursor del lado del
+    servidor, chunk a chunk, a archivos particionados por día:
+
+        <out_dir>/<tabla>/day=YYYY-MM-DD/part-<run>.parquet
+
+    Cada ejecución solo lee filas posteriores al watermark guardado en
+    <out_dir>/<tabla>/_export_state.json y agrega archivos nuevos, sin
+    reescribir particiones ya exportadas.
+
+    Los archivos se escriben con nombre oculto (.part-<run>...), que los
+    lectores de datasets ignoran, y se renombran después de guardar el
+    watermark: una ejecución que falla no deja filas que la siguiente vuelva
+    a exportar.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        out_dir: str = EXPORT_DIR,
+        file_format: str = "parquet",
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+        lag_seconds: int = EXPORT_LAG_SECONDS
+    ):
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+        if table not in EXPORT_TABLES:
+            raise ValueError(f"Unknown table {table}. Use one of {list(EXPORT_TABLES)}")
+        if file_format not in FORMATS:
+            raise ValueError(f"Unknown format {file_format}. Use one of {list(FORMATS)}")
+
+        self.table = table
+        self.model, self.time_column, self.clock = EXPORT_TABLES[table]
+        self.out_dir = out_dir
+        self.table_dir = os.path.join(out_dir, table)
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.lag_seconds = lag_seconds
+        self.schema = _arrow_schema(self.model)
+        self.json_columns = {
+            column.name for column in self.model.__table__.columns
+            if type(column.type).__name__ == "JSON"
+        }
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.table_dir, "_export_state.json")
+
+    def load_state(self) -> Dict:
+        return load_export_state(self.table, self.out_dir)
+
+    def _save_state(self, state: Dict):
+        os.makedirs(self.table_dir, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            json.dump(state, tmp, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _query(self, state: Dict, until: datetime):
+        table = self.model.__table__
+        query = select(*table.columns).where(self.time_column <= until)
+
+        if state.get("last_timestamp"):
+            last_ts = datetime.fromisoformat(state["last_timestamp"])
+            # Desempate por id para filas con el mismo timestamp
+            query = query.where(or_(
+                self.time_column > last_ts,
+                and_(self.time_column == last_ts, table.c.id > state["last_id"])
+            ))
+
+        return query.order_by(self.time_column, table.c.id)
+
+    def _to_batch(self, rows) -> "pa.RecordBatch":
+        columns = {name: [] for name in self.schema.names}
+        for row in rows:
+            for name, value in zip(self.schema.names, row):
+                if name in self.json_columns and value is not None:
+                    value = json.dumps(value)
+                columns[name].append(value)
+        return pa.RecordBatch.from_pydict(columns, schema=self.schema)
+
+    def _open_writer(self, day: str, run_id: str):
+        day_dir = os.path.join(self.table_dir, f"day={day}")
+        os.makedirs(day_dir, exist_ok=True)
+        path = os.path.join(day_dir, f".part-{run_id}{FORMATS[self.file_format]}")
+        if self.file_format == "parquet":
+            return path, pq.ParquetWriter(path, self.schema, compression="zstd")
+        return path, pa.ipc.new_file(path, self.schema)
+
+    @staticmethod
+    def _publish(path: str) -> str:
+        """Renombrar un archivo temporal (.part-...) a su nombre definitivo"""
+        directory, name = os.path.split(path)
+        final = os.path.join(directory, name[1:])
+        os.replace(path, final)
+        return final
+
+    def _recover(self, state: Dict):
+        """
+        Temporales de ejecuciones anteriores: los de la ejecución cuyo watermark
+        se guardó se publican (se cortó antes de renombrar); el resto se borra.
+        """
+        if not os.path.isdir(self.table_dir):
+            return
+        for day_dir in os.listdir(self.table_dir):
+            day_path = os.path.join(self.table_dir, day_dir)
+            if not day_dir.startswith("day=") or not os.path.isdir(day_path):
+                continue
+            for name in os.listdir(day_path):
+                if not name.startswith(".part-"):
+                    continue
+                path = os.path.join(day_path, name)
+                if state.get("last_run") and name.startswith(f".part-{state['last_run']}."):
+                    self._publish(path)
+                else:
+                    os.remove(path)
+
+    async def run(self) -> Dict:
+        """Exportar las filas nuevas. Devuelve un resumen de la ejecución."""
+        started = time.perf_counter()
+        state = self.load_state()
+        self._recover(state)
+        until = self.clock() - timedelta(seconds=self.lag_seconds)
+        run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        time_index = self.schema.names.index(self.time_column.name)
+        id_index = self.schema.names.index("id")
+
+        files: List[str] = []
+        current_day, writer = None, None
+        rows_exported = 0
+        last_row = None
+
+        completed = False
+        try:
+            async with async_engine.connect() as conn:
+                # stream() = cursor del lado del servidor; memoria acotada a un chunk
+                result = await conn.stream(
+                    self._query(state, until).execution_options(yield_per=self.chunk_size)
+                )
+                try:
+                    async for rows in result.partitions(self.chunk_size):
+                        # Las filas vienen ordenadas por tiempo: cada día es contiguo
+                        by_day: Dict[str, list] = {}
+                        for row in rows:
+                            by_day.setdefault(row[time_index].date().isoformat(), []).append(row)
+
+                        for day, day_rows in by_day.items():
+                            if day != current_day:
+                                if writer is not None:
+                                    writer.close()
+                                path, writer = self._open_writer(day, run_id)
+                                files.append(path)
+                                current_day = day
+                            # Armar el batch y escribirlo fuera del event loop
+                            batch = await asyncio.to_thread(self._to_batch, day_rows)
+                            await asyncio.to_thread(writer.write_batch, batch)
+
+                        rows_exported += len(rows)
+                        last_row = rows[-1]
+                finally:
+                    # Si la ejecución falla a mitad del stream el cursor sigue abierto
+                    # (y con él el lock de lectura de SQLite) hasta que se cierre
+                    await result.close()
+            completed = True
+        finally:
+            if writer is not None:
+                writer.close()
+            if not completed:
+                # Nada de esta ejecución queda en el dataset: el watermark no avanzó
+                for path in files:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        if last_row is not None:
+            state = {
+                "last_timestamp": last_row[time_index].isoformat(),
+                "last_id": last_row[id_index],
+                "last_run": run_id,
+                "format": self.file_format,
+                "rows_total": state.get("rows_total", 0) + rows_exported
+            }
+            self._save_state(state)
+        files = [self._publish(path) for path in files]
+
+        return {
+            "table": self.table,
+            "format": self.file_format,
+            "rows": rows_exported,
+            "files": files,
+            "watermark": state.get("last_timestamp"),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+async def export_tables(
+    tables: Optional[List[str]] = None,
+    out_dir: str = EXPORT_DIR,
+    file_format: str = "parquet",
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> List[Dict]:
+    """Exportar incrementalmente cada tabla (por defecto todas)"""
+    results = []
+    for table in tables or list(EXPORT_TABLES):
+        exporter = ColumnarExporter(table, out_dir, file_format, chunk_size)
+        results.append(await exporter.run())
+    return results
+
+# Una sola exportación a la vez por proceso (comparten el watermark)
+_export_lock = asyncio.Lock()
+
+# ==================== ENDPOINTS ====================
+
+@router.post("/export")
+async def export_columnar(request: Request):
+    """
+    Exportar filas nuevas de analytics_events / generations.
+
+    Body opcional: {"tables": ["analytics_events"], "format": "parquet" | "arrow"}
+    """
+    if pa is None:
+        raise HTTPException(503, "Columnar export requires pyarrow")
+
+    data = await request.json() if await request.body() else {}
+    tables = data.get("tables") or list(EXPORT_TABLES)
+    file_format = data.get("format", "parquet")
+
+    unknown = [table for table in tables if table not in EXPORT_TABLES]
+    if unknown:
+        raise HTTPException(400, f"Unknown tables: {unknown}")
+    if file_format not in FORMATS:
+        raise HTTPException(400, f"Invalid format. Use one of {list(FORMATS)}")
+
+    if _export_lock.locked():
+        raise HTTPException(409, "An export is already running")
+
+    async with _export_lock:
+        results = await export_tables(tables, file_format=file_format)
+
+    return {"success": True, "exports": results}
+
+@router.get("/export/status")
+async def get_export_status():
+    """Watermark de la última exportación de cada tabla"""
+    if pa is None:
+        return {"available": False, "tables": {}}
+
+    return {
+        "available": True,
+        "export_dir": EXPORT_DIR,
+        "tables": {table: ColumnarExporter(table).load_state() for table in EXPORT_TABLES}
+    }
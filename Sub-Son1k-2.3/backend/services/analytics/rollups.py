@@ -0,0 +1,262 @@
+"""
+Analytics Rollups - Conteos por minuto/hora/día mantenidos incrementalmente
+"""
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import os
+from .export import EXPORT_DIR, load_export_state
+from ...database import AsyncSessionLocal, get_db, run_write, upsert, AnalyticsEvent, AnalyticsRollup
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1)
+}
+
+# Retención (0 = conservar para siempre)
+RETENTION = {
+    "raw_events": timedelta(days=int(os.getenv("ANALYTICS_RAW_RETENTION_DAYS", "30"))),
+    "minute": timedelta(hours=int(os.getenv("ANALYTICS_MINUTE_RETENTION_HOURS", "48"))),
+    "hour": timedelta(days=int(os.getenv("ANALYTICS_HOUR_RETENTION_DAYS", "90"))),
+    "day": timedelta(0)
+}
+# Los eventos crudos solo se borran una vez exportados (watermark de export.py)
+PURGE_REQUIRES_EXPORT = os.getenv("ANALYTICS_PURGE_REQUIRES_EXPORT", "true").lower() in ("1", "true", "yes")
+
+MAX_SERIES_POINTS = 5000
+
+def to_naive_utc(timestamp: datetime) -> datetime:
+    """Los buckets se guardan en UTC naive; los parámetros pueden venir con zona horaria"""
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+def truncate(timestamp: datetime, resolution: str) -> datetime:
+    """Inicio del bucket que contiene `timestamp`"""
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def apply_events(db: AsyncSession, events: List[Dict]):
+    """
+    Sumar un lote de eventos a los buckets de todas las resoluciones.
+    Se llama en la misma transacción que el insert de los eventos crudos.
+    """
+    counts: Dict[tuple, int] = {}
+    for event in events:
+        for resolution in RESOLUTIONS:
+            key = (resolution, event["event_type"], truncate(event["timestamp"], resolution))
+            counts[key] = counts.get(key, 0) + 1
+
+    if not counts:
+        return
+
+    stmt = upsert(db, AnalyticsRollup).values([
+        {"resolution": resolution, "event_type": event_type, "bucket_start": bucket, "count": count}
+        for (resolution, event_type, bucket), count in counts.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[AnalyticsRollup.resolution, AnalyticsRollup.event_type, AnalyticsRollup.bucket_start],
+        set_={"count": AnalyticsRollup.count + stmt.excluded.count}
+    ))
+
+class AnalyticsRollupManager:
+    """
+    Consultas de series temporales sobre analytics_rollups.
+    Nunca lee analytics_events: cada punto es una fila del rollup.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_series(
+        self,
+        resolution: str,
+        start: datetime,
+        end: datetime,
+        event_type: Optional[str] = None,
+        fill: bool = True
+    ) -> Dict[str, List[Dict]]:
+        """Conteos por bucket en [start, end) agrupados por event_type"""
+        if resolution not in RESOLUTIONS:
+            raise HTTPException(400, f"Invalid resolution. Use one of {list(RESOLUTIONS)}")
+        start, end = to_naive_utc(start), to_naive_utc(end)
+        if end <= start:
+            raise HTTPException(400, "end must be after start")
+
+        first_bucket = truncate(start, resolution)
+        points = int((end - first_bucket) / RESOLUTIONS[resolution]) + 1
+        if points > MAX_SERIES_POINTS:
+            raise HTTPException(400, f"Range too large for {resolution} resolution (max {MAX_SERIES_POINTS} points)")
+
+        query = select(AnalyticsRollup).where(
+            AnalyticsRollup.resolution == resolution,
+            AnalyticsRollup.bucket_start >= first_bucket,
+            AnalyticsRollup.bucket_start < end
+        )
+        if event_type:
+            query = query.where(AnalyticsRollup.event_type == event_type)
+
+        rows = (await self.db.scalars(
+            query.order_by(AnalyticsRollup.event_type, AnalyticsRollup.bucket_start)
+        )).all()
+
+        counts: Dict[str, Dict[datetime, int]] = {}
+        for row in rows:
+            counts.setdefault(row.event_type, {})[row.bucket_start] = row.count
+        if event_type and event_type not in counts:
+            counts[event_type] = {}
+
+        series = {}
+        for name, buckets in counts.items():
+            if fill:
+                bucket_starts = [first_bucket + RESOLUTIONS[resolution] * i for i in range(points)]
+                bucket_starts = [b for b in bucket_starts if b < end]
+            else:
+                bucket_starts = sorted(buckets)
+            series[name] = [
+                {"bucket": bucket.isoformat(), "count": buckets.get(bucket, 0)}
+                for bucket in bucket_starts
+            ]
+
+        return series
+
+def raw_events_cutoff(now: datetime) -> Optional[datetime]:
+    """
+    Límite de borrado de eventos crudos: la retención, acotada al watermark
+    de la exportación columnar para no perder eventos que aún no se exportaron.
+    """
+    if not RETENTION["raw_events"]:
+        return None
+    cutoff = now - RETENTION["raw_events"]
+    if not PURGE_REQUIRES_EXPORT:
+        return cutoff
+
+    watermark = load_export_state("analytics_events", EXPORT_DIR).get("last_timestamp")
+    if not watermark:
+        logger.warning("Raw analytics events kept: analytics_events was never exported")
+        return None
+    # Filas con el mismo timestamp que el watermark pueden faltar exportarse
+    return min(cutoff, datetime.fromisoformat(watermark))
+
+async def purge_expired(now: Optional[datetime] = None, chunk_size: int = 5000) -> Dict[str, int]:
+    """Aplicar la política de retención a eventos crudos y buckets finos"""
+    now = now or datetime.utcnow()
+    purged = {}
+
+    async with AsyncSessionLocal() as db:
+        cutoff = raw_events_cutoff(now)
+        if cutoff is not None:
+            purged["raw_events"] = 0
+            # Por lotes para no retener el lock de escritura mucho tiempo
+            while True:
+                async def _delete_chunk(session: AsyncSession) -> int:
+                    ids = select(AnalyticsEvent.id).where(
+                        AnalyticsEvent.timestamp < cutoff
+                    ).limit(chunk_size).scalar_subquery()
+                    result = await session.execute(delete(AnalyticsEvent).where(AnalyticsEvent.id.in_(ids)))
+                    return result.rowcount
+
+                deleted = await run_write(db, _delete_chunk)
+                purged["raw_events"] += deleted
+                if deleted < chunk_size:
+                    break
+
+        for resolution in ("minute", "hour", "day"):
+            if not RETENTION[resolution]:
+                continue
+            cutoff = now - RETENTION[resolution]
+
+            async def _delete_buckets(session: AsyncSession) -> int:
+                result = await session.execute(delete(AnalyticsRollup).where(
+                    AnalyticsRollup.resolution == resolution,
+                    AnalyticsRollup.bucket_start < cutoff
+                ))
+                return result.rowcount
+
+            purged[resolution] = await run_write(db, _delete_buckets)
+
+    return purged
+
+class RetentionJob:
+    """Task periódico que aplica purge_expired"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_purged: Dict[str, int] = {}
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.last_purged = await purge_expired()
+                self.last_run = datetime.utcnow()
+            except Exception:
+                logger.exception("Analytics retention failed")
+            await asyncio.sleep(self.interval_seconds)
+
+retention_job = RetentionJob(float(os.getenv("ANALYTICS_RETENTION_INTERVAL", "3600")))
+
+# ==================== ENDPOINTS ====================
+
+@router.get("/series")
+async def get_series(
+    resolution: str = "hour",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    fill: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Serie temporal de eventos desde los rollups.
+    start/end en UTC; por defecto las últimas 24 horas.
+    """
+    end = to_naive_utc(end) if end else datetime.utcnow()
+    start = to_naive_utc(start) if start else end - timedelta(days=1)
+
+    manager = AnalyticsRollupManager(db)
+    series = await manager.get_series(resolution, start, end, event_type, fill)
+
+    return {
+        "resolution": resolution,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "series": series
+    }
+
+@router.get("/retention")
+async def get_retention_status():
+    """Política de retención y resultado de la última purga"""
+    return {
+        "policy": {name: period.total_seconds() for name, period in RETENTION.items()},
+        "purge_requires_export": PURGE_REQUIRES_EXPORT,
+        "last_run": retention_job.last_run.isoformat() if retention_job.last_run else None,
+        "last_purged": retention_job.last_purged
+    }
@@ -0,0 +1,336 @@
+"""
+Pool Counters - Likes y plays coalescidos en memoria + dedupe de likes por usuario
+"""
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from datetime import datetime
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from ...database import (
+    AsyncSessionLocal, run_write, upsert, PoolContribution, PoolFeedItem, PoolLike, User,
+    TRENDING_WEIGHTS, trending_factor
+)
+
+logger = logging.getLogger(__name__)
+
+# Filas por INSERT de likes: 3 parámetros por fila, por debajo del límite de
+# variables de SQLite incluso en versiones viejas (999)
+LIKE_INSERT_CHUNK = 300
+
+def _chunks(values: Iterable, size: int):
+    values = list(values)
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+class BloomFilter:
+    """
+    Bloom filter de (contribution_id, user_id) ya likeados.
+
+    Sin falsos negativos: si dice que un par no está, seguro no está y el like
+    se acepta sin consultar la base. Un "quizás" (error ~error_rate) se confirma
+    contra pool_likes.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def saturated(self) -> bool:
+        return self.count > self.capacity
+
+def like_key(contribution_id: int, user_id: str) -> str:
+    return f"{contribution_id}:{user_id}"
+
+class PoolCounterBuffer:
+    """
+    Buffer de incrementos de likes/plays del pool.
+
+    Cada click solo suma en memoria; un task de fondo aplica los deltas
+    agregados cada flush_interval con un UPDATE por contribución (en
+    pool_contributions y pool_feed, incluido hot_score), así que un item viral
+    cuesta una escritura por intervalo y no una por click.
+
+    Los likes nuevos se insertan en pool_likes en el mismo flush con
+    ON CONFLICT DO NOTHING: solo cuentan los pares que realmente se insertaron,
+    lo que deduplica también likes que llegaron a otro worker. Si el proceso
+    muere, se pierden como mucho los incrementos de un intervalo.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 1.0,
+        bloom_capacity: int = 1_000_000,
+        on_flush: Optional[Callable[[Set[Optional[str]]], None]] = None,
+        max_attempts: int = 5
+    ):
+        self.flush_interval = flush_interval
+        self.bloom_capacity = bloom_capacity
+        self.on_flush = on_flush
+        # Flushes fallidos que un like puede atravesar antes de descartarse
+        self.max_attempts = max_attempts
+
+        self._plays: Dict[int, int] = {}
+        self._likes: Set[Tuple[int, str]] = set()
+        self._like_counts: Dict[int, int] = {}
+        # Likes del flush en curso (todavía no visibles en pool_likes)
+        self._inflight_likes: Set[Tuple[int, str]] = set()
+        self._genres: Dict[int, Optional[str]] = {}
+        # Flushes fallidos por like reencolado
+        self._like_attempts: Dict[Tuple[int, str], int] = {}
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_lock: Optional[asyncio.Lock] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Métricas
+        self.likes_accepted = 0
+        self.likes_rejected = 0
+        self.bloom_checks = 0
+        self.plays_buffered = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.likes_orphaned = 0
+        self.likes_quarantined = 0
+        self.last_flush_ms = 0.0
+
+    async def ensure_bloom(self, db: AsyncSession):
+        """Cargar el bloom filter desde pool_likes (o recrearlo si se saturó)"""
+        if self._bloom is not None and not self._bloom.saturated:
+            return
+        if self._bloom_lock is None:
+            self._bloom_lock = asyncio.Lock()
+
+        async with self._bloom_lock:
+            if self._bloom is not None and not self._bloom.saturated:
+                return
+            rows = (await db.execute(select(PoolLike.contribution_id, PoolLike.user_id))).all()
+            bloom = BloomFilter(max(self.bloom_capacity, len(rows) * 2))
+            for contribution_id, user_id in rows:
+                bloom.add(like_key(contribution_id, user_id))
+            for contribution_id, user_id in self._likes:
+                bloom.add(like_key(contribution_id, user_id))
+            self._bloom = bloom
+
+    async def add_like(self, db: AsyncSession, contribution_id: int, user_id: str, genre: Optional[str]) -> bool:
+        """Registrar un like. Devuelve False si el usuario ya lo había dado."""
+        await self.ensure_bloom(db)
+        key = like_key(contribution_id, user_id)
+
+        if (contribution_id, user_id) in self._likes or (contribution_id, user_id) in self._inflight_likes:
+            self.likes_rejected += 1
+            return False
+
+        if key in self._bloom:
+            # Quizás ya existe (o falso positivo): confirmar en la base
+            self.bloom_checks += 1
+            exists = await db.scalar(select(PoolLike.user_id).where(
+                PoolLike.contribution_id == contribution_id,
+                PoolLike.user_id == user_id
+            ))
+            if exists:
+                self.likes_rejected += 1
+                return False
+
+        self._bloom.add(key)
+        self._likes.add((contribution_id, user_id))
+        self._like_counts[contribution_id] = self._like_counts.get(contribution_id, 0) + 1
+        self._genres[contribution_id] = genre
+        self.likes_accepted += 1
+        return True
+
+    def add_play(self, contribution_id: int, genre: Optional[str]):
+        self._plays[contribution_id] = self._plays.get(contribution_id, 0) + 1
+        self._genres[contribution_id] = genre
+        self.plays_buffered += 1
+
+    def pending_likes(self, contribution_id: int) -> int:
+        return self._like_counts.get(contribution_id, 0)
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detener el task y aplicar lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> bool:
+        """Aplicar los deltas acumulados. Devuelve False si falló (se reintenta)."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._plays and not self._likes:
+                return True
+
+            plays, likes, genres = self._plays, self._likes, self._genres
+            self._plays, self._likes, self._like_counts, self._genres = {}, set(), {}, {}
+            self._inflight_likes = likes
+
+            started = time.perf_counter()
+            try:
+                async with AsyncSessionLocal() as db:
+                    written, orphaned = await run_write(db, lambda session: self._apply(session, plays, likes))
+            except Exception:
+                logger.exception("Pool counter flush failed")
+                self.errors += 1
+                # Devolver los deltas al buffer para el próximo intento; un like
+                # que falla max_attempts veces seguidas se descarta para no
+                # bloquear el resto del buffer indefinidamente
+                for contribution_id, count in plays.items():
+                    self._plays[contribution_id] = self._plays.get(contribution_id, 0) + count
+                quarantined = []
+                for like in likes:
+                    attempts = self._like_attempts.get(like, 0) + 1
+                    if attempts >= self.max_attempts:
+                        self._like_attempts.pop(like, None)
+                        quarantined.append(like)
+                        continue
+                    self._like_attempts[like] = attempts
+                    self._likes.add(like)
+                    self._like_counts[like[0]] = self._like_counts.get(like[0], 0) + 1
+                if quarantined:
+                    self.likes_quarantined += len(quarantined)
+                    logger.error("Dropping %d pool likes after %d failed flushes: %s",
+                                 len(quarantined), self.max_attempts, quarantined[:10])
+                self._genres = {**genres, **self._genres}
+                return False
+            finally:
+                self._inflight_likes = set()
+
+            for like in likes:
+                self._like_attempts.pop(like, None)
+            self.flushes += 1
+            self.rows_written += written
+            self.likes_orphaned += orphaned
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+        if self.on_flush:
+            self.on_flush(set(genres.values()))
+        return True
+
+    async def _apply(
+        self,
+        db: AsyncSession,
+        plays: Dict[int, int],
+        likes: Set[Tuple[int, str]]
+    ) -> Tuple[int, int]:
+        """Aplicar los deltas. Devuelve (filas de contador escritas, likes huérfanos descartados)"""
+        # Import diferido: pool_manager importa este módulo
+        from .pool_manager import trending_epoch
+
+        new_likes: Dict[int, int] = {}
+        orphaned = 0
+        now = datetime.now()
+        for chunk in _chunks(likes, LIKE_INSERT_CHUNK):
+            # pool_likes tiene FK a users y pool_contributions: un like de un
+            # usuario (o contribución) que ya no existe haría fallar el lote
+            users = set((await db.scalars(
+                select(User.id).where(User.id.in_({user_id for _, user_id in chunk}))
+            )).all())
+            contributions = set((await db.scalars(
+                select(PoolContribution.id).where(PoolContribution.id.in_({cid for cid, _ in chunk}))
+            )).all())
+            valid = [(cid, user_id) for cid, user_id in chunk if user_id in users and cid in contributions]
+            orphaned += len(chunk) - len(valid)
+            if not valid:
+                continue
+            stmt = upsert(db, PoolLike).values([
+                {"contribution_id": contribution_id, "user_id": user_id, "liked_at": now}
+                for contribution_id, user_id in valid
+            ]).on_conflict_do_nothing(
+                index_elements=[PoolLike.contribution_id, PoolLike.user_id]
+            ).returning(PoolLike.contribution_id)
+            for contribution_id in (await db.scalars(stmt)).all():
+                new_likes[contribution_id] = new_likes.get(contribution_id, 0) + 1
+
+        factor = trending_factor(datetime.now(), await trending_epoch(db))
+        deltas = [
+            {
+                "cid": contribution_id,
+                "d_plays": plays.get(contribution_id, 0),
+                "d_likes": new_likes.get(contribution_id, 0),
+                "hot": factor * (
+                    TRENDING_WEIGHTS["play"] * plays.get(contribution_id, 0)
+                    + TRENDING_WEIGHTS["like"] * new_likes.get(contribution_id, 0)
+                )
+            }
+            for contribution_id in plays.keys() | new_likes.keys()
+        ]
+        if not deltas:
+            return 0, orphaned
+
+        contributions = PoolContribution.__table__
+        feed = PoolFeedItem.__table__
+        await db.execute(
+            update(contributions).where(contributions.c.id == bindparam("cid")).values(
+                plays=contributions.c.plays + bindparam("d_plays"),
+                likes=contributions.c.likes + bindparam("d_likes")
+            ),
+            [{k: delta[k] for k in ("cid", "d_plays", "d_likes")} for delta in deltas]
+        )
+        await db.execute(
+            update(feed).where(feed.c.contribution_id == bindparam("cid")).values(
+                plays=feed.c.plays + bindparam("d_plays"),
+                likes=feed.c.likes + bindparam("d_likes"),
+                hot_score=feed.c.hot_score + bindparam("hot")
+            ),
+            deltas
+        )
+        return len(deltas), orphaned
+
+    def stats(self) -> Dict:
+        return {
+            "pending_plays": sum(self._plays.values()),
+            "pending_likes": len(self._likes),
+            "likes_accepted": self.likes_accepted,
+            "likes_rejected": self.likes_rejected,
+            "bloom_checks": self.bloom_checks,
+            "bloom_entries": self._bloom.count if self._bloom else 0,
+            "plays_buffered": self.plays_buffered,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "likes_orphaned": self.likes_orphaned,
+            "likes_quarantined": self.likes_quarantined,
+            "last_flush_ms": self.last_flush_ms,
+            "flush_interval": self.flush_interval
+        }
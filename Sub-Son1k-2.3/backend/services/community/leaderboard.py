@@ -0,0 +1,413 @@
+"""
+Leaderboard - Ranking de contribuidores en memoria (all-time, semana y mes móviles)
+"""
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta
+import asyncio
+import logging
+import math
+import random
+from ...database import (
+    AsyncSessionLocal, run_write, upsert, LeaderboardSnapshot, PoolContribution
+)
+
+logger = logging.getLogger(__name__)
+
+class RankedSet:
+    """
+    Skip list indexable: insert, remove, rank (posición de una clave) y at
+    (clave en una posición) en O(log n) esperado.
+
+    Cada enlace guarda cuántos nodos del nivel 0 salta (width), así que la
+    posición se obtiene sumando widths durante la búsqueda.
+    """
+
+    MAX_LEVELS = 24
+
+    class _Node:
+        __slots__ = ("key", "next", "width")
+
+        def __init__(self, key, levels: int):
+            self.key = key
+            self.next = [None] * levels
+            self.width = [1] * levels
+
+    def __init__(self):
+        self._nil = self._Node(None, 0)
+        self._head = self._Node(None, self.MAX_LEVELS)
+        self._head.next = [self._nil] * self.MAX_LEVELS
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _path(self, key) -> Tuple[list, list]:
+        """Último nodo < key en cada nivel y pasos recorridos en ese nivel"""
+        chain = [None] * self.MAX_LEVELS
+        steps = [0] * self.MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.next[level] is not self._nil and node.next[level].key < key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps
+
+    def insert(self, key):
+        chain, steps_at_level = self._path(key)
+        levels = min(self.MAX_LEVELS, 1 - int(math.log(1 - random.random(), 2.0)))
+        new = self._Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new.next[level] = prev.next[level]
+            prev.next[level] = new
+            new.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._path(key)
+        target = chain[0].next[0]
+        if target is self._nil or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key) -> Optional[int]:
+        """Posición (0-based) de key, o None si no está"""
+        chain, steps = self._path(key)
+        node = chain[0].next[0]
+        if node is self._nil or node.key != key:
+            return None
+        return sum(steps)
+
+    def slice(self, start: int, count: int) -> list:
+        """Hasta `count` claves desde la posición `start`"""
+        if start >= self._size or count <= 0:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in reversed(range(self.MAX_LEVELS)):
+            while node.width[level] <= remaining and node.next[level] is not self._nil:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not self._nil and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+class Leaderboard:
+    """Puntos por usuario ordenados de mayor a menor (desempate por user_id)"""
+
+    def __init__(self):
+        self._points: Dict[str, int] = {}
+        self._ranked = RankedSet()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def add(self, user_id: str, delta: int):
+        if not delta:
+            return
+        old = self._points.get(user_id, 0)
+        new = old + delta
+        if old > 0:
+            self._ranked.remove((-old, user_id))
+        if new > 0:
+            self._ranked.insert((-new, user_id))
+            self._points[user_id] = new
+        else:
+            self._points.pop(user_id, None)
+
+    def points(self, user_id: str) -> int:
+        return self._points.get(user_id, 0)
+
+    def users(self) -> Set[str]:
+        return set(self._points)
+
+    def top(self, limit: int) -> List[Tuple[int, str, int]]:
+        """[(rank 1-based, user_id, points)]"""
+        return [(i + 1, user_id, -neg) for i, (neg, user_id) in enumerate(self._ranked.slice(0, limit))]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        points = self._points.get(user_id)
+        if points is None:
+            return None
+        return self._ranked.rank((-points, user_id)) + 1
+
+    def around(self, user_id: str, neighbours: int) -> List[Tuple[int, str, int]]:
+        """El usuario y hasta `neighbours` posiciones por encima y por debajo"""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(0, rank - 1 - neighbours)
+        keys = self._ranked.slice(start, rank - 1 - start + neighbours + 1)
+        return [(start + i + 1, key_user, -neg) for i, (neg, key_user) in enumerate(keys)]
+
+class ContributorLeaderboards:
+    """
+    Rankings de contribuidores por timeframe, mantenidos incrementalmente.
+
+    - all_time: total de puntos
+    - week / month: puntos de los últimos 7 / 30 días, con buckets diarios por
+      usuario; al cambiar el día se restan los buckets que salen de la ventana
+
+    Cada contribución se aplica al instante en este proceso; sync() incorpora las
+    de otros workers leyendo pool_contributions por id (watermark). snapshot()
+    persiste el all-time de los usuarios modificados en leaderboard_snapshots,
+    desde donde se hace el arranque en caliente; las ventanas no se persisten,
+    se reconstruyen con las contribuciones de los últimos 30 días.
+    """
+
+    WINDOWS = {"week": 7, "month": 30}
+    TIMEFRAMES = ("all_time", "week", "month")
+
+    def __init__(self):
+        self.boards = {timeframe: Leaderboard() for timeframe in self.TIMEFRAMES}
+        self._daily: Dict[date, Dict[str, int]] = {}
+        self._today: Optional[date] = None
+        self._watermark = 0
+        # Contribuciones de este proceso con id > watermark: {id: (user_id, puntos)}
+        self._applied: Dict[int, Tuple[str, int]] = {}
+        self._dirty: Set[str] = set()
+        # Filas week/month que escribían versiones anteriores: se borran en el
+        # primer snapshot
+        self._purge_windows = False
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+        self.last_sync: Optional[datetime] = None
+        self.last_snapshot: Optional[datetime] = None
+
+    def _window_start(self, timeframe: str, today: date) -> date:
+        return today - timedelta(days=self.WINDOWS[timeframe] - 1)
+
+    def _apply(self, user_id: str, points: int, day: date):
+        self.boards["all_time"].add(user_id, points)
+        today = self._today or date.today()
+        if day >= self._window_start("month", today):
+            bucket = self._daily.setdefault(day, {})
+            bucket[user_id] = bucket.get(user_id, 0) + points
+            for timeframe in self.WINDOWS:
+                if day >= self._window_start(timeframe, today):
+                    self.boards[timeframe].add(user_id, points)
+        self._dirty.add(user_id)
+
+    def record(self, contribution_id: int, user_id: str, points: int, contributed_at: datetime):
+        """Aplicar una contribución recién escrita por este proceso"""
+        if not self._loaded or contribution_id <= self._watermark or contribution_id in self._applied:
+            return
+        self._applied[contribution_id] = (user_id, points)
+        self._apply(user_id, points, contributed_at.date())
+
+    def advance_day(self, today: Optional[date] = None):
+        """Restar de las ventanas los días que quedaron fuera"""
+        today = today or date.today()
+        previous = self._today or today
+        if today <= previous:
+            self._today = previous
+            return
+        for day in sorted(self._daily):
+            for timeframe in self.WINDOWS:
+                if self._window_start(timeframe, previous) <= day < self._window_start(timeframe, today):
+                    for user_id, points in self._daily[day].items():
+                        self.boards[timeframe].add(user_id, -points)
+                        self._dirty.add(user_id)
+            if day < self._window_start("month", today):
+                del self._daily[day]
+        self._today = today
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if not self._loaded:
+                await self._load(db)
+
+    async def _load(self, db: AsyncSession):
+        """
+        All-time: snapshot + contribuciones posteriores al as_of_id de cada fila.
+        Ventanas: contribuciones de los últimos 30 días.
+        """
+        self._today = date.today()
+        month_start = self._window_start("month", self._today)
+        # Todo lo que sigue se lee hasta este id: lo posterior lo trae sync()
+        watermark = await db.scalar(select(func.max(PoolContribution.id))) or 0
+
+        snapshot = (await db.execute(select(
+            LeaderboardSnapshot.user_id, LeaderboardSnapshot.points, LeaderboardSnapshot.as_of_id
+        ).where(LeaderboardSnapshot.timeframe == "all_time"))).all()
+        as_of = {user_id: as_of_id for user_id, _, as_of_id in snapshot}
+        for user_id, points, _ in snapshot:
+            self.boards["all_time"].add(user_id, points)
+
+        oldest = min(as_of.values(), default=0)
+        delta = await db.execute(select(
+            PoolContribution.id, PoolContribution.user_id, PoolContribution.points
+        ).where(PoolContribution.id > oldest, PoolContribution.id <= watermark))
+        for contribution_id, user_id, points in delta:
+            if contribution_id > as_of.get(user_id, 0):
+                self.boards["all_time"].add(user_id, points or 0)
+
+        recent = await db.execute(select(
+            PoolContribution.user_id, PoolContribution.contributed_at, PoolContribution.points
+        ).where(
+            PoolContribution.contributed_at >= datetime.combine(month_start, datetime.min.time()),
+            PoolContribution.id <= watermark
+        ))
+        for user_id, contributed_at, points in recent:
+            day = contributed_at.date()
+            bucket = self._daily.setdefault(day, {})
+            bucket[user_id] = bucket.get(user_id, 0) + (points or 0)
+            for timeframe in self.WINDOWS:
+                if day >= self._window_start(timeframe, self._today):
+                    self.boards[timeframe].add(user_id, points or 0)
+
+        self._watermark = watermark
+        # Reescribir todo en el primer snapshot: adelanta los as_of_id viejos y
+        # acota el delta del próximo arranque
+        self._dirty = set(as_of)
+        for board in self.boards.values():
+            self._dirty.update(board.users())
+        self._purge_windows = True
+        self._loaded = True
+
+    async def sync(self, db: AsyncSession) -> int:
+        """Incorporar contribuciones de otros workers (id > watermark)"""
+        await self.ensure_loaded(db)
+        self.advance_day()
+
+        rows = (await db.execute(select(
+            PoolContribution.id, PoolContribution.user_id, PoolContribution.points, PoolContribution.contributed_at
+        ).where(PoolContribution.id > self._watermark).order_by(PoolContribution.id))).all()
+
+        applied = 0
+        for contribution_id, user_id, points, contributed_at in rows:
+            if contribution_id not in self._applied:
+                self._apply(user_id, points or 0, (contributed_at or datetime.now()).date())
+                applied += 1
+            self._watermark = contribution_id
+
+        self._applied = {cid: applied for cid, applied in self._applied.items() if cid > self._watermark}
+        self.last_sync = datetime.now()
+        return applied
+
+    async def snapshot(self, db: AsyncSession) -> int:
+        """Persistir los puntos all-time de los usuarios modificados desde el último snapshot"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        now = datetime.now()
+
+        # Filas y watermark juntos, antes de encolar la escritura (sin await de
+        # por medio): los puntos corresponden exactamente a ids <= as_of_id.
+        # Las contribuciones que record() aplicó por encima del watermark se
+        # restan; el próximo arranque las vuelve a leer del delta.
+        as_of_id = self._watermark
+        ahead: Dict[str, int] = {}
+        for user_id, points in self._applied.values():
+            ahead[user_id] = ahead.get(user_id, 0) + points
+        rows, gone = [], []
+        for user_id in dirty:
+            points = self.boards["all_time"].points(user_id) - ahead.get(user_id, 0)
+            if points > 0:
+                rows.append({"timeframe": "all_time", "user_id": user_id, "points": points,
+                             "as_of_id": as_of_id, "updated_at": now})
+            else:
+                gone.append(user_id)
+        purge_windows, self._purge_windows = self._purge_windows, False
+
+        async def _write(session: AsyncSession):
+            # Cada fila vale "a partir de su as_of_id"; nunca pisar una fila que
+            # otro worker escribió con un watermark más nuevo
+            if rows:
+                stmt = upsert(session, LeaderboardSnapshot).values(rows)
+                await session.execute(stmt.on_conflict_do_update(
+                    index_elements=[LeaderboardSnapshot.timeframe, LeaderboardSnapshot.user_id],
+                    set_={"points": stmt.excluded.points, "as_of_id": stmt.excluded.as_of_id,
+                          "updated_at": stmt.excluded.updated_at},
+                    where=LeaderboardSnapshot.as_of_id <= stmt.excluded.as_of_id
+                ))
+            if gone:
+                await session.execute(delete(LeaderboardSnapshot).where(
+                    LeaderboardSnapshot.timeframe == "all_time",
+                    LeaderboardSnapshot.user_id.in_(gone),
+                    LeaderboardSnapshot.as_of_id <= as_of_id
+                ))
+            if purge_windows:
+                await session.execute(delete(LeaderboardSnapshot).where(
+                    LeaderboardSnapshot.timeframe != "all_time"
+                ))
+
+        try:
+            await run_write(db, _write)
+        except Exception:
+            self._dirty |= dirty
+            self._purge_windows |= purge_windows
+            raise
+
+        self.last_snapshot = now
+        return len(dirty)
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self._loaded,
+            "users": {timeframe: len(board) for timeframe, board in self.boards.items()},
+            "watermark": self._watermark,
+            "days_buffered": len(self._daily),
+            "dirty": len(self._dirty),
+            "last_sync": self.last_sync.isoformat() if self.last_sync else None,
+            "last_snapshot": self.last_snapshot.isoformat() if self.last_snapshot else None
+        }
+
+class LeaderboardJob:
+    """Task periódico: avance de día, sync entre workers y snapshot"""
+
+    def __init__(self, leaderboards: ContributorLeaderboards, interval_seconds: float):
+        self.leaderboards = leaderboards
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.tick()
+        except Exception:
+            logger.exception("Final leaderboard snapshot failed")
+
+    async def tick(self):
+        async with AsyncSessionLocal() as db:
+            await self.leaderboards.sync(db)
+            await self.leaderboards.snapshot(db)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Leaderboard sync failed")
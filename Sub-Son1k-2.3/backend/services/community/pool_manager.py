@@ -1,15 +1,471 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Dict
-from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, exists, func, insert, literal, select, tuple_, update
+from typing import List, Dict, Optional
+from datetime import datetime
+from collections import OrderedDict
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import os
+import random
+import time
 from ...database import (
-    get_db, User, UserPoolStats, PoolContribution, 
-    PoolClaim, Generation
+    AsyncSessionLocal, get_db, run_write, upsert, User, UserPoolStats, PoolContribution, 
+    PoolClaim, PoolFeedItem, PoolTrendingState, UserDailyClaims, Generation,
+    TRENDING_HALF_LIFE_HOURS, TRENDING_WEIGHTS, trending_factor
 )
+from ..analytics.analytics_events import track
+from .counters import PoolCounterBuffer
+from .leaderboard import ContributorLeaderboards, LeaderboardJob
 
 router = APIRouter(prefix="/api/community", tags=["community"])
 
+logger = logging.getLogger(__name__)
+
+# Columna de orden de cada modo del feed (desempate estable por id)
+FEED_SORT_COLUMNS = {
+    "recent": PoolFeedItem.contributed_at,
+    "popular": PoolFeedItem.plays,
+    "quality": PoolFeedItem.points,
+    "trending": PoolFeedItem.hot_score
+}
+
+MAX_FEED_LIMIT = 100
+
+# Puntos de leaderboard por calidad de la generación contribuida
+QUALITY_POINTS = {
+    "standard": 1,
+    "high": 2,
+    "ultra": 3
+}
+
+FEED_INSERT_COLUMNS = [
+    "contribution_id", "generation_id", "user_id", "genre", "quality", "audio_url", "username",
+    "avatar_url", "contributed_at", "points", "plays", "likes", "is_available", "hot_score"
+]
+
+def selection_score(generation_id: str) -> float:
+    """Valor en [0, 1) derivado del hash del generation_id (reproducible)"""
+    digest = hashlib.blake2b(generation_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+def selected_tiers(generation_id: str, rates: Dict[str, float]) -> List[str]:
+    """Tiers para los que la generación entra al pool (vacío: no entra)"""
+    score = selection_score(generation_id)
+    return sorted(tier for tier, rate in rates.items() if score < rate)
+
+def contribution_insert(
+    generation_ids: List[str],
+    tiers: List[str],
+    user_id: Optional[str] = None,
+    quality: Optional[str] = None,
+    contributed_at: Optional[datetime] = None
+):
+    """
+    INSERT ... SELECT de contribuciones: el chequeo de tier, la existencia de la
+    generación y del usuario y el "todavía no está en el pool" van en el mismo
+    statement, sin leer nada antes.
+
+    Sin user_id / quality / contributed_at se usan el dueño, la calidad y la
+    fecha de cada generación (backfill).
+    """
+    quality_column = literal(quality) if quality else func.coalesce(Generation.quality, "standard")
+    contributor = literal(user_id) if user_id else Generation.user_id
+
+    rows = select(
+        User.id,
+        Generation.id,
+        quality_column,
+        literal(contributed_at) if contributed_at else Generation.created_at,
+        case(QUALITY_POINTS, value=quality_column, else_=1),
+        literal(0),
+        literal(0),
+        literal(True)
+    ).select_from(Generation).join(
+        User, User.id == contributor
+    ).where(
+        Generation.id.in_(generation_ids),
+        User.tier.in_(tiers),
+        ~exists().where(PoolContribution.generation_id == Generation.id)
+    )
+
+    return insert(PoolContribution).from_select(
+        ["user_id", "generation_id", "quality", "contributed_at", "points", "plays", "likes", "is_available"],
+        rows
+    ).returning(
+        PoolContribution.id, PoolContribution.user_id, PoolContribution.points, PoolContribution.contributed_at
+    )
+
+def feed_insert(contribution_ids: List[int], hot_score: float = 0.0):
+    """Filas de pool_feed de contribuciones recién insertadas (misma transacción)"""
+    rows = select(
+        PoolContribution.id,
+        Generation.id,
+        User.id,
+        Generation.genre,
+        PoolContribution.quality,
+        Generation.audio_url,
+        User.username,
+        User.avatar_url,
+        PoolContribution.contributed_at,
+        PoolContribution.points,
+        PoolContribution.plays,
+        PoolContribution.likes,
+        PoolContribution.is_available,
+        literal(hot_score)
+    ).join(
+        Generation, PoolContribution.generation_id == Generation.id
+    ).join(
+        User, PoolContribution.user_id == User.id
+    ).where(PoolContribution.id.in_(contribution_ids))
+
+    return insert(PoolFeedItem).from_select(FEED_INSERT_COLUMNS, rows).returning(
+        PoolFeedItem.contribution_id, PoolFeedItem.genre
+    )
+
+def pool_stats_upsert(db: AsyncSession, contributions: List[tuple]):
+    """Sumar contribuciones (id, user_id, points, contributed_at) a user_pool_stats"""
+    totals: Dict[str, list] = {}
+    for _, user_id, points, contributed_at in contributions:
+        total = totals.setdefault(user_id, [0, 0, contributed_at])
+        total[0] += 1
+        total[1] += points
+        total[2] = max(total[2], contributed_at)
+
+    stmt = upsert(db, UserPoolStats).values([
+        {"user_id": user_id, "total_contributions": count, "total_points": points, "last_contribution": last}
+        for user_id, (count, points, last) in totals.items()
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=[UserPoolStats.user_id],
+        set_={
+            "total_contributions": UserPoolStats.total_contributions + stmt.excluded.total_contributions,
+            "total_points": UserPoolStats.total_points + stmt.excluded.total_points,
+            "last_contribution": case(
+                (UserPoolStats.last_contribution >= stmt.excluded.last_contribution, UserPoolStats.last_contribution),
+                else_=stmt.excluded.last_contribution
+            )
+        }
+    )
+
+def encode_cursor(sort_by: str, value, contribution_id: int) -> str:
+    """Cursor opaco con la última posición (valor de orden, id) de la página"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort_by, "v": value, "id": contribution_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_by: str) -> tuple:
+    """Decodificar y validar un cursor; HTTP 400 si no corresponde a sort_by"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, contribution_id = payload["v"], int(payload["id"])
+        if payload["s"] != sort_by:
+            raise ValueError("cursor sort mismatch")
+        if sort_by == "recent":
+            value = datetime.fromisoformat(value)
+        elif sort_by == "trending":
+            value = float(value)
+        else:
+            value = int(value)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(400, "Invalid cursor")
+    return value, contribution_id
+
+async def trending_epoch(db: AsyncSession, for_update: bool = False) -> datetime:
+    """
+    Epoch vigente de hot_score. Los incrementos lo leen con lock compartido y la
+    renormalización con lock exclusivo (Postgres), así un incremento nunca usa un
+    epoch que cambió a mitad de su transacción.
+    """
+    query = select(PoolTrendingState.epoch).where(PoolTrendingState.id == 1)
+    query = query.with_for_update(read=not for_update)
+    
+    epoch = await db.scalar(query)
+    if epoch is None:
+        await db.execute(upsert(db, PoolTrendingState).values(
+            id=1, epoch=datetime.now()
+        ).on_conflict_do_nothing(index_elements=[PoolTrendingState.id]))
+        epoch = await db.scalar(query)
+    return epoch
+
+async def renormalize_trending(db: AsyncSession, now: Optional[datetime] = None) -> float:
+    """
+    Mover el epoch a `now` y reescalar todos los scores por el mismo factor.
+    No cambia el orden; evita que los pesos crezcan sin límite (2^(t/vida media)).
+    Devuelve el factor aplicado.
+    """
+    now = now or datetime.now()
+    
+    async def _write(session: AsyncSession) -> float:
+        epoch = await trending_epoch(session, for_update=True)
+        if now <= epoch:
+            return 1.0
+        # 2^(-horas / vida media): con un epoch muy viejo tiende a 0 en vez de
+        # desbordar como 1 / trending_factor
+        factor = 2 ** (-(now - epoch).total_seconds() / 3600 / TRENDING_HALF_LIFE_HOURS)
+        await session.execute(update(PoolFeedItem).values(hot_score=PoolFeedItem.hot_score * factor))
+        await session.execute(update(PoolTrendingState).where(
+            PoolTrendingState.id == 1
+        ).values(epoch=now))
+        return factor
+    
+    return await run_write(db, _write)
+
+class TrendingRenormalizeJob:
+    """Task periódico que aplica renormalize_trending"""
+    
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[datetime] = None
+        self.last_factor: Optional[float] = None
+    
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def run_once(self) -> float:
+        """
+        Renormalizar si el epoch tiene interval_seconds o más (también al
+        arrancar: un reinicio no posterga la renormalización).
+        Devuelve los segundos hasta la próxima.
+        """
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            epoch = await db.scalar(select(PoolTrendingState.epoch).where(PoolTrendingState.id == 1))
+            age = (now - epoch).total_seconds() if epoch else 0.0
+            if age < self.interval_seconds:
+                return self.interval_seconds - age
+            self.last_factor = await renormalize_trending(db, now)
+        self.last_run = now
+        # El orden no cambia, pero los valores sí (cursores de trending)
+        CommunityPoolManager.feed_cache.clear()
+        return self.interval_seconds
+    
+    async def _run(self):
+        while True:
+            delay = self.interval_seconds
+            try:
+                delay = await self.run_once()
+            except Exception:
+                logger.exception("Trending renormalization failed")
+            await asyncio.sleep(delay)
+
+trending_job = TrendingRenormalizeJob(float(os.getenv("POOL_TRENDING_RENORMALIZE_INTERVAL", "86400")))
+
+class PoolSampler:
+    """
+    Conjunto en memoria de ids de contribuciones disponibles con muestreo O(1).
+
+    Array de ids + índice id -> posición: add agrega al final y discard hace
+    swap-remove (mueve el último a la posición liberada), así que muestrear,
+    agregar y quitar son O(1) sin importar el tamaño del pool.
+
+    Se carga completo de la base la primera vez; cada refresh_seconds solo se
+    leen los ids mayores al último conocido (contribuciones nuevas de otros
+    workers). Un id que otro worker marcó como no disponible se detecta al
+    leerlo en el claim y se descarta.
+    """
+
+    def __init__(self, refresh_seconds: float = 300):
+        self.refresh_seconds = refresh_seconds
+        self._ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._max_id = 0
+        self._loaded_at: Optional[float] = None
+        self._full_reload = True
+        self._load_lock: Optional[asyncio.Lock] = None
+        self.samples = 0
+        self.stale_hits = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, contribution_id: int):
+        if contribution_id in self._positions:
+            return
+        self._positions[contribution_id] = len(self._ids)
+        self._ids.append(contribution_id)
+
+    def discard(self, contribution_id: int):
+        position = self._positions.pop(contribution_id, None)
+        if position is None:
+            return
+        last = self._ids.pop()
+        if last != contribution_id:
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def sample(self) -> Optional[int]:
+        if not self._ids:
+            return None
+        self.samples += 1
+        return self._ids[random.randrange(len(self._ids))]
+
+    def needs_reload(self) -> bool:
+        return (
+            self._full_reload
+            or self._loaded_at is None
+            or time.monotonic() - self._loaded_at > self.refresh_seconds
+        )
+
+    async def ensure_loaded(self, db: AsyncSession):
+        """Carga completa la primera vez; después, incremental por id"""
+        if not self.needs_reload():
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+
+        async with self._load_lock:
+            if not self.needs_reload():
+                return
+
+            query = select(PoolContribution.id).where(PoolContribution.is_available == True)
+            if self._full_reload:
+                self._ids, self._positions, self._max_id = [], {}, 0
+            else:
+                query = query.where(PoolContribution.id > self._max_id)
+
+            for contribution_id in (await db.scalars(query)).all():
+                self.add(contribution_id)
+                self._max_id = max(self._max_id, contribution_id)
+
+            self._loaded_at = time.monotonic()
+            self._full_reload = False
+            self.reloads += 1
+
+    def invalidate(self):
+        """Forzar recarga completa en el próximo uso"""
+        self._full_reload = True
+
+    def stats(self) -> Dict:
+        return {
+            "available": len(self._ids),
+            "samples": self.samples,
+            "stale_hits": self.stale_hits,
+            "reloads": self.reloads,
+            "refresh_seconds": self.refresh_seconds
+        }
+
+class PoolFeedCache:
+    """
+    Cache LRU + TTL en proceso de las páginas del feed del pool.
+
+    Clave: (genre, sort_by, limit, cursor). Cada género tiene un contador de
+    generación y hay uno global para el feed sin filtro; una escritura
+    (contribución, like, claim, cambio de disponibilidad) incrementa el de su
+    género y el global. Una entrada solo es válida si el contador del que
+    depende no cambió desde que se guardó, así que una escritura en "rock"
+    no invalida las páginas de "jazz".
+
+    El TTL acota la desactualización frente a escrituras de otros workers.
+    """
+
+    ALL_GENRES = "*"
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bumps = 0
+        # Edad de las respuestas servidas desde cache (staleness)
+        self.total_hit_age = 0.0
+        self.max_hit_age = 0.0
+
+    def _scope(self, genre: Optional[str]) -> str:
+        return genre if genre else self.ALL_GENRES
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, scope, generation, stored_at = entry
+        age = time.monotonic() - stored_at
+        if generation != self._generations.get(scope, 0):
+            del self._entries[key]
+            self.invalidated += 1
+            self.misses += 1
+            return None
+        if age > self.ttl_seconds:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.total_hit_age += age
+        self.max_hit_age = max(self.max_hit_age, age)
+        return value
+
+    def generation(self, genre: Optional[str]) -> int:
+        """Contador actual del scope; leerlo ANTES de consultar la base y pasarlo a put()"""
+        return self._generations.get(self._scope(genre), 0)
+
+    def put(self, key: tuple, genre: Optional[str], value: Dict, generation: int):
+        """
+        Guardar una página bajo el contador leído antes de la consulta: si una
+        escritura lo incrementó mientras tanto, la entrada ya nace invalidada.
+        """
+        self._entries[key] = (value, self._scope(genre), generation, time.monotonic())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def bump(self, genre: Optional[str]):
+        """Invalidar las páginas del género afectado y las del feed sin filtro"""
+        self.bumps += 1
+        for scope in {self._scope(genre), self.ALL_GENRES}:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidated": self.invalidated,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "bumps": self.bumps,
+            "staleness_seconds": {
+                "avg": round(self.total_hit_age / self.hits, 3) if self.hits else 0.0,
+                "max": round(self.max_hit_age, 3)
+            }
+        }
+
 class CommunityPoolManager:
     """
     Gestor del pool comunitario.
@@ -23,17 +479,29 @@ class CommunityPoolManager:
         "STUDIO": 0.05    # 5% de 1000 = 50 → pool
     }
     
-    def __init__(self, db: Session):
+    # Compartido entre instancias (se crea un CommunityPoolManager por request)
+    sampler = PoolSampler(refresh_seconds=float(os.getenv("POOL_SAMPLER_REFRESH", "300")))
+    
+    feed_cache = PoolFeedCache(
+        max_entries=int(os.getenv("POOL_CACHE_SIZE", "1000")),
+        ttl_seconds=float(os.getenv("POOL_CACHE_TTL", "30"))
+    )
+    
+    # Rankings all-time / semana / mes en memoria
+    leaderboards = ContributorLeaderboards()
+    
+    # Límite diario de claims de usuarios FREE (igual que generaciones)
+    DAILY_CLAIM_LIMIT = 3
+    
+    # Intentos de muestreo antes de recargar el sampler desde la base
+    CLAIM_SAMPLE_ATTEMPTS = 5
+    
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     def _calculate_points(self, quality: str) -> int:
         """Calcular puntos según calidad"""
-        points_map = {
-            "standard": 1,
-            "high": 2,
-            "ultra": 3
-        }
-        return points_map.get(quality, 1)
+        return QUALITY_POINTS.get(quality, 1)
     
     async def contribute_to_pool(
         self,
@@ -44,62 +512,39 @@ class CommunityPoolManager:
         """
         Registrar contribución al pool.
         Automático al generar música (5% de usuarios pagados).
+
+        La selección es un hash del generation_id, así que la decisión es
+        reproducible y el 95% no seleccionado no toca la base. El resto es una
+        sola transacción: insert condicionado a tier/existencia, fila del feed
+        y upsert de stats.
         """
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return  # Usuario no existe
-        
-        contribution_rate = self.CONTRIBUTION_RATES.get(user.tier, 0.0)
-        
-        if contribution_rate == 0:
-            return  # FREE users no contribuyen
-        
-        # Verificar si la generación existe
-        generation = self.db.query(Generation).filter(
-            Generation.id == generation_id
-        ).first()
-        
-        if not generation:
-            return  # Generación no existe
-        
-        # Determinar si esta generación va al pool (5% de probabilidad)
-        import random
-        if random.random() > contribution_rate:
+        tiers = selected_tiers(generation_id, self.CONTRIBUTION_RATES)
+        if not tiers:
             return  # No seleccionada para el pool
         
-        # Registrar contribución
-        contribution = PoolContribution(
-            user_id=user_id,
-            generation_id=generation_id,
-            quality=quality,
-            contributed_at=datetime.now(),
-            points=self._calculate_points(quality),
-            plays=0,
-            likes=0,
-            is_available=True
-        )
-        
-        self.db.add(contribution)
-        
-        # Actualizar stats del usuario
-        stats = self.db.query(UserPoolStats).filter(
-            UserPoolStats.user_id == user_id
-        ).first()
-        
-        if not stats:
-            stats = UserPoolStats(
-                user_id=user_id,
-                total_contributions=1,
-                total_points=contribution.points,
-                last_contribution=datetime.now()
-            )
-            self.db.add(stats)
-        else:
-            stats.total_contributions += 1
-            stats.total_points += contribution.points
-            stats.last_contribution = datetime.now()
-        
-        self.db.commit()
+        now = datetime.now()
+        
+        async def _write(db: AsyncSession):
+            contributions = (await db.execute(contribution_insert(
+                [generation_id], tiers, user_id=user_id, quality=quality, contributed_at=now
+            ))).all()
+            if not contributions:
+                return None  # Usuario/generación no existe, tier FREE o ya contribuida
+            
+            epoch = await trending_epoch(db)
+            hot_score = TRENDING_WEIGHTS["contribution"] * trending_factor(now, epoch)
+            feed_rows = (await db.execute(feed_insert([contributions[0].id], hot_score))).all()
+            await db.execute(pool_stats_upsert(db, contributions))
+            return contributions[0], feed_rows[0].genre
+        
+        result = await run_write(self.db, _write)
+        if result is None:
+            return
+        
+        contribution, genre = result
+        self.sampler.add(contribution.id)
+        self.feed_cache.bump(genre)
+        self.leaderboards.record(contribution.id, user_id, contribution.points, contribution.contributed_at)
         
         return {
             "contributed": True,
@@ -111,69 +556,103 @@ class CommunityPoolManager:
         self,
         limit: int = 50,
         genre: str = None,
-        sort_by: str = "recent"
-    ) -> List[Dict]:
+        sort_by: str = "recent",
+        cursor: Optional[str] = None
+    ) -> Dict:
         """
         Obtener contenido del pool comunitario.
         FREE users acceden aquí.
+
+        Lee del read model pool_feed (sin joins). Paginación por keyset: el
+        cursor guarda (valor de orden, id) del último item y la página
+        siguiente hace seek en el índice (genre?, is_available, columna, id),
+        así que cualquier página cuesta lo mismo que la primera.
         """
-        query = self.db.query(PoolContribution, Generation, User).join(
-            Generation, PoolContribution.generation_id == Generation.id
-        ).join(
-            User, PoolContribution.user_id == User.id
-        ).filter(
-            PoolContribution.is_available == True
-        )
+        if sort_by not in FEED_SORT_COLUMNS:
+            raise HTTPException(400, f"Invalid sort_by. Use one of {list(FEED_SORT_COLUMNS)}")
+
+        limit = max(1, min(limit, MAX_FEED_LIMIT))
+        sort_column = FEED_SORT_COLUMNS[sort_by]
+        
+        cache_key = (genre, sort_by, limit, cursor)
+        cached = self.feed_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        snapshot = self.feed_cache.generation(genre)
+
+        query = select(PoolFeedItem).where(PoolFeedItem.is_available == True)
         
         # Filtrar por género si se especifica
         if genre:
-            query = query.filter(Generation.genre == genre)
+            query = query.where(PoolFeedItem.genre == genre)
         
-        # Ordenar según criterio
-        if sort_by == "recent":
-            query = query.order_by(PoolContribution.contributed_at.desc())
-        elif sort_by == "popular":
-            query = query.order_by(PoolContribution.plays.desc())
-        elif sort_by == "quality":
-            query = query.order_by(PoolContribution.points.desc())
+        # Continuar después del último item de la página anterior
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort_by)
+            query = query.where(tuple_(sort_column, PoolFeedItem.contribution_id) < tuple_(value, last_id))
         
-        results = query.limit(limit).all()
+        # Un item extra indica si hay página siguiente
+        query = query.order_by(sort_column.desc(), PoolFeedItem.contribution_id.desc()).limit(limit + 1)
+        results = (await self.db.scalars(query)).all()
+
+        page = results[:limit]
+        next_cursor = None
+        if len(results) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(sort_by, getattr(last, sort_column.key), last.contribution_id)
         
-        return [
+        items = [
             {
-                "id": contrib.id,
-                "generation_id": contrib.generation_id,
-                "quality": contrib.quality,
-                "genre": gen.genre,
-                "plays": contrib.plays,
-                "likes": contrib.likes,
-                "audio_url": gen.audio_url,
-                "contributed_at": contrib.contributed_at.isoformat(),
+                "id": item.contribution_id,
+                "generation_id": item.generation_id,
+                "quality": item.quality,
+                "genre": item.genre,
+                "plays": item.plays,
+                "likes": item.likes,
+                "audio_url": item.audio_url,
+                "contributed_at": item.contributed_at.isoformat(),
                 "contributor": {
-                    "user_id": user.id,
-                    "username": user.username,
-                    "avatar": user.avatar_url or f"https://api.dicebear.com/7.x/avataaars/svg?seed={user.id}"
+                    "user_id": item.user_id,
+                    "username": item.username,
+                    "avatar": item.avatar_url or f"https://api.dicebear.com/7.x/avataaars/svg?seed={item.user_id}"
                 }
             }
-            for contrib, gen, user in results
+            for item in page
         ]
+
+        page = {"items": items, "next_cursor": next_cursor}
+        self.feed_cache.put(cache_key, genre, page, snapshot)
+        return page
     
-    def _get_today_claims(self, user_id: str) -> int:
-        """Obtener número de claims del día actual"""
-        today = datetime.now().date()
+    async def _reserve_claim(self, db: AsyncSession, user_id: str) -> Optional[int]:
+        """
+        Reservar un claim del día en un solo statement:
+        INSERT ... ON CONFLICT (user_id, day) DO UPDATE SET count = count + 1
+        WHERE count < límite RETURNING count.
         
-        count = self.db.query(func.count(PoolClaim.id)).filter(
-            PoolClaim.user_id == user_id,
-            func.date(PoolClaim.claimed_at) == today
-        ).scalar()
+        Devuelve el nuevo conteo, o None si el usuario ya alcanzó el límite
+        (el WHERE no deja actualizar y no vuelve ninguna fila).
+        """
+        now = datetime.now()
+        stmt = upsert(db, UserDailyClaims).values(
+            user_id=user_id,
+            day=now.date(),
+            count=1,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserDailyClaims.user_id, UserDailyClaims.day],
+            set_={"count": UserDailyClaims.count + 1, "updated_at": now},
+            where=UserDailyClaims.count < self.DAILY_CLAIM_LIMIT
+        ).returning(UserDailyClaims.count)
         
-        return count or 0
+        return await db.scalar(stmt)
     
     async def claim_from_pool(self, user_id: str) -> Dict:
         """
         Usuario FREE reclama generación del pool.
         """
-        user = self.db.query(User).filter(User.id == user_id).first()
+        user = await self.db.scalar(select(User).where(User.id == user_id))
         
         if not user:
             raise HTTPException(404, "User not found")
@@ -181,36 +660,43 @@ class CommunityPoolManager:
         if user.tier != "FREE":
             raise HTTPException(400, "Only FREE users can claim from pool")
         
-        # Verificar límite diario de reclamos (3 por día, igual que generaciones)
-        today_claims = self._get_today_claims(user_id)
-        if today_claims >= 3:
-            raise HTTPException(429, "Daily claim limit reached (3/day)")
-        
-        # Obtener contenido aleatorio del pool
-        pool_item = self.db.query(PoolContribution, Generation).join(
-            Generation, PoolContribution.generation_id == Generation.id
-        ).filter(
-            PoolContribution.is_available == True
-        ).order_by(func.random()).first()
-        
-        if not pool_item:
-            raise HTTPException(404, "Pool is empty")
-        
-        contribution, generation = pool_item
-        
-        # Registrar claim
-        claim = PoolClaim(
-            user_id=user_id,
-            contribution_id=contribution.id,
-            claimed_at=datetime.now()
-        )
-        
-        self.db.add(claim)
-        
-        # Incrementar stats de plays
-        contribution.plays += 1
+        await self.sampler.ensure_loaded(self.db)
+        
+        async def _write(db: AsyncSession):
+            # Verificar y consumir el límite diario atómicamente; si el pool está
+            # vacío, la excepción revierte también el incremento
+            claims_today = await self._reserve_claim(db, user_id)
+            if claims_today is None:
+                raise HTTPException(429, f"Daily claim limit reached ({self.DAILY_CLAIM_LIMIT}/day)")
+            
+            # Obtener contenido aleatorio del pool: muestreo O(1) + lectura por PK
+            pool_item = await self._sample_available(db)
+            if not pool_item:
+                # Puede estar desactualizado respecto a otros workers: recargar una vez
+                self.sampler.invalidate()
+                await self.sampler.ensure_loaded(db)
+                pool_item = await self._sample_available(db)
+            
+            if not pool_item:
+                raise HTTPException(404, "Pool is empty")
+            
+            contribution, generation = pool_item
+            
+            # Registrar claim
+            claim = PoolClaim(
+                user_id=user_id,
+                contribution_id=contribution.id,
+                claimed_at=datetime.now()
+            )
+            
+            db.add(claim)
+            
+            return contribution, generation, claim, claims_today
         
-        self.db.commit()
+        contribution, generation, claim, claims_today = await run_write(self.db, _write)
+        # Incrementar stats de plays (coalescido; el feed se invalida al aplicarlo)
+        pool_counters.add_play(contribution.id, generation.genre)
+        track("claim", user_id, {"contribution_id": contribution.id, "generation_id": generation.id})
         
         return {
             "generation_id": generation.id,
@@ -218,76 +704,192 @@ class CommunityPoolManager:
             "audio_url": generation.audio_url,
             "genre": generation.genre,
             "claimed_at": claim.claimed_at.isoformat(),
-            "claims_remaining": 3 - (today_claims + 1)
+            "claims_remaining": self.DAILY_CLAIM_LIMIT - claims_today
         }
     
-    async def get_ranking(self, timeframe: str = "all_time") -> List[Dict]:
+    async def _sample_available(self, db: AsyncSession):
+        """Muestrear una contribución disponible; descarta ids que ya no lo son"""
+        for _ in range(self.CLAIM_SAMPLE_ATTEMPTS):
+            contribution_id = self.sampler.sample()
+            if contribution_id is None:
+                return None
+            
+            pool_item = (await db.execute(select(PoolContribution, Generation).join(
+                Generation, PoolContribution.generation_id == Generation.id
+            ).where(
+                PoolContribution.id == contribution_id,
+                PoolContribution.is_available == True
+            ))).first()
+            
+            if pool_item:
+                return pool_item
+            
+            self.sampler.stale_hits += 1
+            self.sampler.discard(contribution_id)
+        
+        return None
+    
+    async def set_availability(self, contribution_id: int, available: bool) -> Dict:
         """
-        Obtener ranking de contribuidores.
+        Publicar o retirar una contribución del pool (uso interno del flujo de
+        claims/retiro; no se expone por HTTP)
         """
-        if timeframe == "week":
-            since = datetime.now() - timedelta(days=7)
-        elif timeframe == "month":
-            since = datetime.now() - timedelta(days=30)
+        async def _write(db: AsyncSession):
+            contrib = await db.scalar(select(PoolContribution).where(
+                PoolContribution.id == contribution_id
+            ))
+            
+            if not contrib:
+                raise HTTPException(404, "Contribution not found")
+            
+            contrib.is_available = available
+            await db.execute(update(PoolFeedItem).where(
+                PoolFeedItem.contribution_id == contribution_id
+            ).values(is_available=available))
+            return await db.scalar(select(Generation.genre).where(
+                Generation.id == contrib.generation_id
+            ))
+        
+        genre = await run_write(self.db, _write)
+        self.feed_cache.bump(genre)
+        
+        if available:
+            self.sampler.add(contribution_id)
         else:
-            since = None
-        
-        query = self.db.query(
-            UserPoolStats,
-            User
-        ).join(User, UserPoolStats.user_id == User.id)
-        
-        if since:
-            query = query.filter(UserPoolStats.last_contribution >= since)
+            self.sampler.discard(contribution_id)
         
-        ranking = query.order_by(
-            UserPoolStats.total_points.desc()
-        ).limit(100).all()
+        return {"id": contribution_id, "is_available": available}
+    
+    async def get_ranking(self, timeframe: str = "all_time", limit: int = 100) -> List[Dict]:
+        """
+        Obtener ranking de contribuidores.
+        El orden sale del leaderboard en memoria; la base solo aporta los
+        datos de perfil de los usuarios de la página.
+        """
+        board = await self._leaderboard(timeframe)
+        top = board.top(limit)
+        return await self._ranking_entries(top)
+    
+    async def get_user_rank(self, user_id: str, timeframe: str = "all_time", neighbours: int = 2) -> Dict:
+        """Posición de un usuario y los contribuidores inmediatamente arriba y abajo"""
+        board = await self._leaderboard(timeframe)
+        rank = board.rank(user_id)
         
-        return [
-            {
-                "rank": idx + 1,
-                "user_id": stats.user_id,
-                "username": user.username,
-                "avatar": user.avatar_url or f"https://api.dicebear.com/7.x/avataaars/svg?seed={user.id}",
-                "tier": user.tier,
-                "contributions": stats.total_contributions,
-                "points": stats.total_points,
-                "last_contribution": stats.last_contribution.isoformat() if stats.last_contribution else None
-            }
-            for idx, (stats, user) in enumerate(ranking)
-        ]
+        return {
+            "user_id": user_id,
+            "timeframe": timeframe,
+            "rank": rank,
+            "points": board.points(user_id),
+            "total_ranked": len(board),
+            "neighbours": await self._ranking_entries(board.around(user_id, neighbours)) if rank else []
+        }
+    
+    async def _leaderboard(self, timeframe: str):
+        if timeframe not in self.leaderboards.TIMEFRAMES:
+            raise HTTPException(400, f"Invalid timeframe. Use one of {list(self.leaderboards.TIMEFRAMES)}")
+        await self.leaderboards.ensure_loaded(self.db)
+        self.leaderboards.advance_day()
+        return self.leaderboards.boards[timeframe]
+    
+    async def _ranking_entries(self, ranked: List[tuple]) -> List[Dict]:
+        """Completar (rank, user_id, points) con perfil y stats del usuario"""
+        user_ids = [user_id for _, user_id, _ in ranked]
+        if not user_ids:
+            return []
+        
+        rows = (await self.db.execute(select(User, UserPoolStats).outerjoin(
+            UserPoolStats, UserPoolStats.user_id == User.id
+        ).where(User.id.in_(user_ids)))).all()
+        profiles = {user.id: (user, stats) for user, stats in rows}
+        
+        entries = []
+        for rank, user_id, points in ranked:
+            user, stats = profiles.get(user_id, (None, None))
+            entries.append({
+                "rank": rank,
+                "user_id": user_id,
+                "username": user.username if user else None,
+                "avatar": (user.avatar_url if user else None) or f"https://api.dicebear.com/7.x/avataaars/svg?seed={user_id}",
+                "tier": user.tier if user else None,
+                "contributions": stats.total_contributions if stats else 0,
+                "points": points,
+                "last_contribution": stats.last_contribution.isoformat() if stats and stats.last_contribution else None
+            })
+        return entries
     
     async def like_contribution(self, contribution_id: int, user_id: str):
-        """Dar like a una contribución del pool"""
-        contrib = self.db.query(PoolContribution).filter(
+        """
+        Dar like a una contribución del pool (uno por usuario).
+        El incremento se acumula en memoria y se aplica en el próximo flush.
+        """
+        row = (await self.db.execute(select(PoolContribution.likes, Generation.genre).outerjoin(
+            Generation, PoolContribution.generation_id == Generation.id
+        ).where(
             PoolContribution.id == contribution_id
-        ).first()
+        ))).first()
         
-        if not contrib:
+        if not row:
             raise HTTPException(404, "Contribution not found")
         
-        contrib.likes += 1
-        self.db.commit()
+        # pool_likes.user_id es FK: un like de un usuario inexistente haría
+        # fallar el flush de todo el lote
+        if not await self.db.scalar(select(User.id).where(User.id == user_id)):
+            raise HTTPException(404, "User not found")
+        
+        persisted_likes, genre = row
+        liked = await pool_counters.add_like(self.db, contribution_id, user_id, genre)
+        if liked:
+            track("like", user_id, {"contribution_id": contribution_id})
         
-        return {"likes": contrib.likes}
+        return {
+            "liked": liked,
+            "already_liked": not liked,
+            "likes": (persisted_likes or 0) + pool_counters.pending_likes(contribution_id)
+        }
+
+def _invalidate_feed(genres):
+    for genre in genres:
+        CommunityPoolManager.feed_cache.bump(genre)
+
+pool_counters = PoolCounterBuffer(
+    flush_interval=float(os.getenv("POOL_COUNTER_FLUSH_INTERVAL", "1")),
+    max_attempts=int(os.getenv("POOL_COUNTER_MAX_ATTEMPTS", "5")),
+    bloom_capacity=int(os.getenv("POOL_LIKE_BLOOM_CAPACITY", "1000000")),
+    on_flush=_invalidate_feed
+)
+
+leaderboard_job = LeaderboardJob(
+    CommunityPoolManager.leaderboards,
+    float(os.getenv("LEADERBOARD_SYNC_INTERVAL", "30"))
+)
+
+# ==================== ENDPOINTS ====================
 
 @router.get("/pool")
 async def get_pool_content(
     limit: int = 50,
     genre: str = None,
     sort_by: str = "recent",
-    db: Session = Depends(get_db)
+    cursor: str = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Obtener contenido del pool"""
+    """
+    Obtener contenido del pool.
+    Para la página siguiente, pasar el next_cursor de la respuesta anterior.
+    """
     manager = CommunityPoolManager(db)
-    content = await manager.get_pool_content(limit, genre, sort_by)
-    return {"items": content, "total": len(content)}
+    page = await manager.get_pool_content(limit, genre, sort_by, cursor)
+    return {
+        "items": page["items"],
+        "total": len(page["items"]),
+        "next_cursor": page["next_cursor"],
+        "has_more": page["next_cursor"] is not None
+    }
 
 @router.post("/pool/claim")
 async def claim_from_pool(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """FREE user reclama del pool"""
     data = await request.json()
@@ -300,20 +902,51 @@ async def claim_from_pool(
     generation = await manager.claim_from_pool(user_id)
     return generation
 
+@router.get("/pool/sampler/stats")
+async def get_sampler_stats():
+    """Estado del sampler de claims (tamaño, recargas, ids obsoletos)"""
+    return CommunityPoolManager.sampler.stats()
+
+@router.get("/pool/cache/stats")
+async def get_feed_cache_stats():
+    """Métricas del cache del feed (hit ratio, invalidaciones, staleness)"""
+    return CommunityPoolManager.feed_cache.stats()
+
+@router.get("/pool/counters/stats")
+async def get_counter_stats():
+    """Estado del buffer de likes/plays (pendientes, flushes, dedupe)"""
+    return pool_counters.stats()
+
 @router.get("/ranking")
 async def get_ranking(
     timeframe: str = "all_time",
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Obtener ranking de contribuidores"""
     manager = CommunityPoolManager(db)
     ranking = await manager.get_ranking(timeframe)
     return {"ranking": ranking, "timeframe": timeframe}
 
+@router.get("/ranking/user/{user_id}")
+async def get_user_rank(
+    user_id: str,
+    timeframe: str = "all_time",
+    neighbours: int = 2,
+    db: AsyncSession = Depends(get_db)
+):
+    """Posición de un usuario en el ranking y sus vecinos"""
+    manager = CommunityPoolManager(db)
+    return await manager.get_user_rank(user_id, timeframe, max(0, min(neighbours, 25)))
+
+@router.get("/ranking/stats")
+async def get_leaderboard_stats():
+    """Estado del leaderboard en memoria (usuarios, watermark, snapshot)"""
+    return CommunityPoolManager.leaderboards.stats()
+
 @router.post("/contribute")
 async def contribute_to_pool(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Contribuir generación al pool (automático tras generación exitosa).
@@ -339,7 +972,7 @@ async def contribute_to_pool(
 async def like_contribution(
     contribution_id: int,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Dar like a una contribución del pool"""
     data = await request.json()
@@ -0,0 +1,180 @@
+"""
+Genre Index - Co-ocurrencia y transiciones entre géneros para sugerencias de fusión
+"""
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import math
+import os
+import time
+from ...database import upsert, Generation, GenrePair
+
+# Peso de cada señal en el score de fusión (ambas normalizadas a [0, 1])
+FUSION_WEIGHTS = {
+    "cooccurrence": 0.5,  # similitud coseno entre conjuntos de usuarios
+    "transition": 0.5     # P(siguiente género = b | género actual = a)
+}
+
+# {(genre_a, genre_b): [cooccurrence, transitions]}
+PairDeltas = Dict[Tuple[str, str], List[int]]
+
+def add_pair(deltas: PairDeltas, genre_a: str, genre_b: str, cooccurrence: int = 0, transitions: int = 0):
+    delta = deltas.setdefault((genre_a, genre_b), [0, 0])
+    delta[0] += cooccurrence
+    delta[1] += transitions
+
+async def apply_pair_deltas(db: AsyncSession, deltas: PairDeltas):
+    """Sumar deltas a genre_pairs (misma transacción que los perfiles)"""
+    if not deltas:
+        return
+    stmt = upsert(db, GenrePair).values([
+        {"genre_a": genre_a, "genre_b": genre_b, "cooccurrence": cooccurrence, "transitions": transitions}
+        for (genre_a, genre_b), (cooccurrence, transitions) in sorted(deltas.items())
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[GenrePair.genre_a, GenrePair.genre_b],
+        set_={
+            "cooccurrence": GenrePair.cooccurrence + stmt.excluded.cooccurrence,
+            "transitions": GenrePair.transitions + stmt.excluded.transitions
+        }
+    ))
+
+def rebuild_genre_pairs(conn) -> int:
+    """
+    Recalcular genre_pairs desde todo el historial de generations con SQL
+    (self-join de (usuario, género) distintos y LAG por usuario).
+    Reemplaza la tabla en la transacción de `conn`. Devuelve los pares.
+    """
+    has_genre = (Generation.genre.is_not(None), Generation.genre != "", Generation.user_id.is_not(None))
+
+    user_genres = select(Generation.user_id, Generation.genre).where(*has_genre).distinct().subquery()
+    a, b = user_genres.alias("a"), user_genres.alias("b")
+    cooccurrence = conn.execute(
+        select(a.c.genre, b.c.genre, func.count())
+        .select_from(a.join(b, a.c.user_id == b.c.user_id))
+        .group_by(a.c.genre, b.c.genre)
+    )
+
+    sequence = select(
+        Generation.genre.label("genre"),
+        func.lag(Generation.genre).over(
+            partition_by=Generation.user_id, order_by=Generation.created_at
+        ).label("previous")
+    ).where(*has_genre).subquery()
+    transitions = conn.execute(
+        select(sequence.c.previous, sequence.c.genre, func.count())
+        .where(sequence.c.previous.is_not(None), sequence.c.previous != sequence.c.genre)
+        .group_by(sequence.c.previous, sequence.c.genre)
+    )
+
+    pairs: PairDeltas = {}
+    for genre_a, genre_b, count in cooccurrence:
+        add_pair(pairs, genre_a, genre_b, cooccurrence=count)
+    for genre_a, genre_b, count in transitions:
+        add_pair(pairs, genre_a, genre_b, transitions=count)
+
+    conn.execute(delete(GenrePair))
+    if pairs:
+        conn.execute(insert(GenrePair), [
+            {"genre_a": genre_a, "genre_b": genre_b, "cooccurrence": cooccurrence, "transitions": transitions}
+            for (genre_a, genre_b), (cooccurrence, transitions) in pairs.items()
+        ])
+    return len(pairs)
+
+class GenreFusionIndex:
+    """
+    Partners de fusión por género, precalculados en memoria.
+
+    Al cargar genre_pairs se calcula el score de cada par y se guarda, por
+    género, la lista de partners ya ordenada; una consulta es un lookup en un
+    dict y recorrer unos pocos elementos, sin agregar nada por request.
+
+    La tabla es chica (pares de géneros con conteo > 0) y se recarga completa
+    cada refresh_seconds, así que refleja las generaciones de otros workers.
+    """
+
+    def __init__(self, refresh_seconds: float = 300, max_partners: int = 20):
+        self.refresh_seconds = refresh_seconds
+        self.max_partners = max_partners
+        self._partners: Dict[str, List[Tuple[str, float, int, int]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._load_lock: Optional[asyncio.Lock] = None
+        self.pairs = 0
+        self.reloads = 0
+        self.lookups = 0
+
+    def needs_reload(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if not self.needs_reload():
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+
+        async with self._load_lock:
+            if not self.needs_reload():
+                return
+            rows = (await db.execute(select(
+                GenrePair.genre_a, GenrePair.genre_b, GenrePair.cooccurrence, GenrePair.transitions
+            ))).all()
+            self.build(rows)
+
+    def build(self, rows: Iterable[Tuple[str, str, int, int]]):
+        """Calcular scores y ordenar partners de cada género"""
+        rows = list(rows)
+        users = {genre_a: cooccurrence for genre_a, genre_b, cooccurrence, _ in rows if genre_a == genre_b}
+        outgoing: Dict[str, int] = {}
+        for genre_a, genre_b, _, transitions in rows:
+            if genre_a != genre_b:
+                outgoing[genre_a] = outgoing.get(genre_a, 0) + transitions
+
+        partners: Dict[str, List[Tuple[str, float, int, int]]] = {}
+        for genre_a, genre_b, cooccurrence, transitions in rows:
+            if genre_a == genre_b:
+                continue
+            cosine = cooccurrence / math.sqrt(users.get(genre_a, 0) * users.get(genre_b, 0) or 1)
+            transition = transitions / outgoing[genre_a] if outgoing.get(genre_a) else 0.0
+            score = FUSION_WEIGHTS["cooccurrence"] * min(cosine, 1.0) + FUSION_WEIGHTS["transition"] * transition
+            if score > 0:
+                partners.setdefault(genre_a, []).append((genre_b, round(score, 4), cooccurrence, transitions))
+
+        for genre, candidates in partners.items():
+            candidates.sort(key=lambda candidate: (-candidate[1], candidate[0]))
+            del candidates[self.max_partners:]
+
+        self._partners = partners
+        self.pairs = len(rows)
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    def partners(self, genre: str, limit: int = 3, exclude: Iterable[str] = ()) -> List[Dict]:
+        """Mejores géneros para fusionar con `genre` (sin los de `exclude`)"""
+        self.lookups += 1
+        excluded = set(exclude)
+        ranked = []
+        for partner, score, cooccurrence, transitions in self._partners.get(genre, ()):
+            if partner in excluded:
+                continue
+            ranked.append({
+                "genre": partner,
+                "score": score,
+                "shared_users": cooccurrence,
+                "transitions": transitions
+            })
+            if len(ranked) >= limit:
+                break
+        return ranked
+
+    def stats(self) -> Dict:
+        return {
+            "genres": len(self._partners),
+            "pairs": self.pairs,
+            "reloads": self.reloads,
+            "lookups": self.lookups,
+            "refresh_seconds": self.refresh_seconds
+        }
+
+fusion_index = GenreFusionIndex(refresh_seconds=float(os.getenv("PIXEL_GENRE_INDEX_REFRESH", "300")))
@@ -3,15 +3,126 @@ Pixel Companion - Asistente IA que aprende del usuario
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Optional
 from datetime import datetime
+import bisect
+import hashlib
 import json
 import os
-from ...database import get_db, User, Generation
+from ...database import get_db, upsert, User, PixelProfile
+from .genre_index import PairDeltas, add_pair, apply_pair_deltas, fusion_index
+from .prompt_index import NEAR_DUPLICATE_THRESHOLD, SignedPrompts, index_prompts, similar_prompts, user_clusters
 
 router = APIRouter(prefix="/api/pixel", tags=["pixel"])
 
+# Tamaño del sketch KMV de prompts distintos (exacto hasta este número)
+PROMPT_SKETCH_SIZE = 128
+HASH_SPACE = 2 ** 64
+
+def prompt_hash(prompt: str) -> int:
+    """Hash de los primeros 50 caracteres (prompts que solo difieren al final cuentan igual)"""
+    return int.from_bytes(hashlib.blake2b(prompt[:50].encode(), digest_size=8).digest(), "big")
+
+def distinct_prompts(sketch: List[int]) -> int:
+    """
+    Estimación de prompts distintos a partir del sketch KMV (k minimum values):
+    exacta mientras haya menos de PROMPT_SKETCH_SIZE; después (k - 1) / k-ésimo
+    menor hash normalizado.
+    """
+    if len(sketch) < PROMPT_SKETCH_SIZE:
+        return len(sketch)
+    return int((PROMPT_SKETCH_SIZE - 1) * HASH_SPACE / sketch[-1])
+
+def apply_generations(profile, generations: List[Dict]) -> PairDeltas:
+    """
+    Sumar generaciones ({genre, quality, prompt, created_at}) a un perfil.
+    Las columnas JSON se reasignan (no se mutan) para que el ORM detecte el cambio.
+
+    Devuelve los incrementos de genre_pairs que producen: co-ocurrencia cuando
+    el usuario usa un género por primera vez y transición cuando cambia de
+    género respecto de su generación anterior.
+    """
+    pairs: PairDeltas = {}
+    last_genre = getattr(profile, "last_genre", None)
+    genre_counts = dict(profile.genre_counts or {})
+    hours = list(profile.hour_histogram or [0] * 24)
+    sketch = list(profile.prompt_sketch or [])
+    qualities = list(profile.recent_qualities or [])
+    prompts = list(profile.recent_prompts or [])
+
+    for generation in sorted(generations, key=lambda g: g["created_at"]):
+        created_at = generation["created_at"]
+        genre = generation.get("genre")
+        if genre:
+            if genre not in genre_counts:
+                add_pair(pairs, genre, genre, cooccurrence=1)
+                for other in genre_counts:
+                    add_pair(pairs, genre, other, cooccurrence=1)
+                    add_pair(pairs, other, genre, cooccurrence=1)
+            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+            if last_genre and last_genre != genre:
+                add_pair(pairs, last_genre, genre, transitions=1)
+            last_genre = genre
+        hours[created_at.hour] += 1
+
+        prompt = generation.get("prompt")
+        if prompt:
+            value = prompt_hash(prompt)
+            position = bisect.bisect_left(sketch, value)
+            if (position == len(sketch) or sketch[position] != value) and position < PROMPT_SKETCH_SIZE:
+                sketch.insert(position, value)
+                del sketch[PROMPT_SKETCH_SIZE:]
+            prompts = [prompt[:100]] + prompts[:2]
+
+        qualities = [generation.get("quality") or "standard"] + qualities[:4]
+
+        if profile.first_generation_at is None or created_at < profile.first_generation_at:
+            profile.first_generation_at = created_at
+        if profile.last_generation_at is None or created_at > profile.last_generation_at:
+            profile.last_generation_at = created_at
+
+    profile.total_generations = (profile.total_generations or 0) + len(generations)
+    profile.genre_counts = genre_counts
+    profile.hour_histogram = hours
+    profile.prompt_sketch = sketch
+    profile.recent_qualities = qualities
+    profile.recent_prompts = prompts
+    profile.last_genre = last_genre
+    profile.updated_at = datetime.utcnow()
+    return pairs
+
+async def update_profiles(db: AsyncSession, generations: List[Dict], signed: Optional[SignedPrompts] = None):
+    """
+    Actualizar pixel_profiles con generaciones recién registradas
+    ({user_id, genre, quality, prompt, created_at}). Se llama dentro de la
+    transacción que inserta las generaciones; `signed` son las firmas de
+    sign_prompts, calculadas antes de la transacción.
+    """
+    by_user: Dict[str, List[Dict]] = {}
+    for generation in generations:
+        by_user.setdefault(generation["user_id"], []).append(generation)
+    if not by_user:
+        return
+
+    await db.execute(upsert(db, PixelProfile).values([
+        {"user_id": user_id, "total_generations": 0} for user_id in by_user
+    ]).on_conflict_do_nothing(index_elements=[PixelProfile.user_id]))
+
+    # FOR UPDATE: dos workers no pueden pisarse los contadores JSON (Postgres)
+    profiles = (await db.scalars(
+        select(PixelProfile).where(PixelProfile.user_id.in_(by_user))
+        .with_for_update().execution_options(populate_existing=True)
+    )).all()
+    new_clusters = await index_prompts(db, generations, signed)
+    pairs: PairDeltas = {}
+    for profile in profiles:
+        profile.prompt_clusters = (profile.prompt_clusters or 0) + new_clusters.get(profile.user_id, 0)
+        for pair, (cooccurrence, transitions) in apply_generations(profile, by_user[profile.user_id]).items():
+            add_pair(pairs, *pair, cooccurrence=cooccurrence, transitions=transitions)
+    await apply_pair_deltas(db, pairs)
+
 # Mock Groq API - replace with actual key
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "mock_key")
 
@@ -34,24 +145,23 @@ class PixelCompanion:
         "emoji": "🤖"
     }
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     async def get_user_profile(self, user_id: str) -> Dict:
-        """Obtener perfil de aprendizaje del usuario"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        
-        if not user:
-            return self._get_default_profile()
-        
-        # Analizar generaciones del usuario
-        generations = self.db.query(Generation).filter(
-            Generation.user_id == user_id
-        ).order_by(Generation.created_at.desc()).limit(50).all()
-        
-        profile = self._analyze_user_behavior(user, generations)
+        """Obtener perfil de aprendizaje del usuario (lectura por PK de pixel_profiles)"""
+        profile = await self.db.get(PixelProfile, user_id)
+        return self._analyze_user_behavior(profile)
+    
+    async def get_greeting_context(self, user_id: str) -> tuple:
+        """Username y perfil en una sola consulta (ambos por PK)"""
+        row = (await self.db.execute(select(User.username, PixelProfile).outerjoin(
+            PixelProfile, PixelProfile.user_id == User.id
+        ).where(User.id == user_id))).first()
         
-        return profile
+        if not row:
+            return None, self._get_default_profile()
+        return row.username, self._analyze_user_behavior(row.PixelProfile)
     
     def _get_default_profile(self) -> Dict:
         """Perfil por defecto para nuevos usuarios"""
@@ -74,57 +184,51 @@ class PixelCompanion:
             }
         }
     
-    def _analyze_user_behavior(self, user: User, generations: List) -> Dict:
-        """Analizar comportamiento del usuario"""
-        if not generations:
+    def _analyze_user_behavior(self, profile: Optional[PixelProfile]) -> Dict:
+        """Analizar comportamiento del usuario (historial completo, ya agregado)"""
+        if not profile or not profile.total_generations:
             return self._get_default_profile()
         
-        # Extraer géneros más usados
-        genres = {}
-        for gen in generations:
-            if gen.genre:
-                genres[gen.genre] = genres.get(gen.genre, 0) + 1
+        total = profile.total_generations
         
-        top_genres = sorted(genres.items(), key=lambda x: x[1], reverse=True)[:3]
+        # Extraer géneros más usados
+        top_genres = sorted((profile.genre_counts or {}).items(), key=lambda x: x[1], reverse=True)[:3]
         
-        # Determinar skill level basado en variedad de prompts
-        unique_prompts = len(set(gen.prompt[:50] for gen in generations if gen.prompt))
+        # Determinar skill level basado en variedad de prompts: grupos de prompts
+        # casi iguales del índice LSH; perfiles sin indexar usan el sketch
+        unique_prompts = profile.prompt_clusters or distinct_prompts(profile.prompt_sketch or [])
         skill_level = "advanced" if unique_prompts > 20 else "intermediate" if unique_prompts > 5 else "beginner"
         
         return {
             "preferences": {
                 "genres": [g[0] for g in top_genres],
-                "qualities": [gen.quality for gen in generations[:5]],
-                "typical_prompts": [gen.prompt[:100] for gen in generations[:3] if gen.prompt]
+                "qualities": list(profile.recent_qualities or []),
+                "typical_prompts": list(profile.recent_prompts or [])
             },
             "patterns": {
-                "most_active_hours": self._detect_active_hours(generations),
-                "generation_frequency": "daily" if len(generations) > 10 else "occasional",
-                "avg_per_day": len(generations) / max((datetime.now() - generations[-1].created_at).days, 1)
+                "most_active_hours": self._detect_active_hours(profile.hour_histogram or []),
+                "generation_frequency": "daily" if total > 10 else "occasional",
+                "avg_per_day": total / max((datetime.now() - profile.first_generation_at).days, 1)
             },
             "skill_level": skill_level,
-            "goals": self._infer_goals(generations),
+            "goals": self._infer_goals(total),
             "context": {
                 "mood": "creative",
-                "energy": "high" if len(generations) > 20 else "medium"
+                "energy": "high" if total > 20 else "medium"
             }
         }
     
-    def _detect_active_hours(self, generations: List) -> List[int]:
+    def _detect_active_hours(self, hour_histogram: List[int]) -> List[int]:
         """Detectar horas más activas del día"""
-        hours = {}
-        for gen in generations:
-            hour = gen.created_at.hour
-            hours[hour] = hours.get(hour, 0) + 1
-        
-        top_hours = sorted(hours.items(), key=lambda x: x[1], reverse=True)[:3]
+        hours = [(hour, count) for hour, count in enumerate(hour_histogram) if count]
+        top_hours = sorted(hours, key=lambda x: x[1], reverse=True)[:3]
         return [h[0] for h in top_hours]
     
-    def _infer_goals(self, generations: List) -> str:
+    def _infer_goals(self, total_generations: int) -> str:
         """Inferir objetivos del usuario basado en su actividad"""
-        if len(generations) > 30:
+        if total_generations > 30:
             return "professional"
-        elif len(generations) > 10:
+        elif total_generations > 10:
             return "learning"
         else:
             return "explore"
@@ -132,15 +236,19 @@ class PixelCompanion:
     async def get_suggestion(self, user_id: str, context: Optional[str] = None) -> Dict:
         """Generar sugerencia contextual para el usuario"""
         profile = await self.get_user_profile(user_id)
+        await fusion_index.ensure_loaded(self.db)
         
         suggestions = self._generate_suggestions(profile, context)
         
-        return {
+        suggestion = {
             "message": suggestions["message"],
             "action": suggestions["action"],
             "type": suggestions["type"],
             "emoji": suggestions["emoji"]
         }
+        if suggestions.get("fusion_partners"):
+            suggestion["fusion_partners"] = suggestions["fusion_partners"]
+        return suggestion
     
     def _generate_suggestions(self, profile: Dict, context: Optional[str]) -> Dict:
         """Generar sugerencias basadas en perfil y contexto"""
@@ -184,11 +292,18 @@ class PixelCompanion:
         
         # Genre-based suggestions
         if genres:
+            # Partners precalculados (co-ocurrencia + transiciones de todos los usuarios)
+            partners = fusion_index.partners(genres[0], limit=3, exclude=genres)
             return {
-                "message": f"Noto que te gusta {genres[0]}. ¿Probamos fusionarlo con otro género?",
+                "message": (
+                    f"Noto que te gusta {genres[0]}. ¿Probamos fusionarlo con {partners[0]['genre']}?"
+                    if partners else
+                    f"Noto que te gusta {genres[0]}. ¿Probamos fusionarlo con otro género?"
+                ),
                 "action": "suggest_fusion",
                 "type": "creative",
-                "emoji": "🎨"
+                "emoji": "🎨",
+                "fusion_partners": partners
             }
         
         # Default
@@ -228,7 +343,7 @@ class PixelCompanion:
 # ==================== ENDPOINTS ====================
 
 @router.get("/profile/{user_id}")
-async def get_pixel_profile(user_id: str, db: Session = Depends(get_db)):
+async def get_pixel_profile(user_id: str, db: AsyncSession = Depends(get_db)):
     """Obtener perfil de aprendizaje del usuario"""
     pixel = PixelCompanion(db)
     profile = await pixel.get_user_profile(user_id)
@@ -242,7 +357,7 @@ async def get_pixel_profile(user_id: str, db: Session = Depends(get_db)):
 @router.post("/suggest")
 async def get_suggestion(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Obtener sugerencia contextual"""
     data = await request.json()
@@ -260,7 +375,7 @@ async def get_suggestion(
 @router.post("/celebrate")
 async def celebrate(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Celebrar milestone del usuario"""
     data = await request.json()
@@ -275,11 +390,61 @@ async def celebrate(
     
     return celebration
 
+@router.get("/fusion/{genre}")
+async def get_fusion_partners(genre: str, limit: int = 5, db: AsyncSession = Depends(get_db)):
+    """Géneros que mejor combinan con `genre` según el historial de todos los usuarios"""
+    await fusion_index.ensure_loaded(db)
+    return {
+        "genre": genre,
+        "partners": fusion_index.partners(genre, limit=max(1, min(limit, fusion_index.max_partners)))
+    }
+
+@router.get("/fusion-index/stats")
+async def get_fusion_index_stats():
+    """Estado del índice de géneros en memoria (pares, recargas, consultas)"""
+    return fusion_index.stats()
+
+@router.post("/prompts/similar")
+async def get_similar_prompts(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Prompts casi iguales a uno dado (de todos los usuarios, o solo de user_id).
+    Devuelve hash y conteos, nunca el texto de los prompts.
+    """
+    data = await request.json()
+    prompt = data.get("prompt")
+    
+    if not prompt:
+        raise HTTPException(400, "prompt required")
+    try:
+        limit = int(data.get("limit", 10))
+        threshold = float(data.get("threshold", NEAR_DUPLICATE_THRESHOLD))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "limit must be an integer and threshold a number")
+    if not 0 <= threshold <= 1:
+        raise HTTPException(400, "threshold must be between 0 and 1")
+    
+    similar = await similar_prompts(
+        db,
+        prompt,
+        limit=max(1, min(limit, 100)),
+        threshold=threshold,
+        user_id=data.get("user_id")
+    )
+    return {"prompt": prompt, "similar": similar}
+
+@router.get("/prompts/clusters/{user_id}")
+async def get_prompt_clusters(user_id: str, limit: int = 20, db: AsyncSession = Depends(get_db)):
+    """Grupos de prompts casi iguales de un usuario (hash y conteos, sin texto)"""
+    return await user_clusters(db, user_id, limit=max(1, min(limit, 100)))
+
 @router.get("/greeting/{user_id}")
-async def get_greeting(user_id: str, db: Session = Depends(get_db)):
+async def get_greeting(user_id: str, db: AsyncSession = Depends(get_db)):
     """Obtener saludo personalizado basado en hora y perfil"""
     pixel = PixelCompanion(db)
-    profile = await pixel.get_user_profile(user_id)
+    username, profile = await pixel.get_greeting_context(user_id)
     
     hour = datetime.now().hour
     
@@ -290,8 +455,7 @@ async def get_greeting(user_id: str, db: Session = Depends(get_db)):
     else:
         time_greeting = "Buenas noches"
     
-    user = db.query(User).filter(User.id == user_id).first()
-    name = user.username if user else "Creator"
+    name = username or "Creator"
     
     return {
         "greeting": f"{time_greeting}, {name}! 🤖",
@@ -0,0 +1,323 @@
+"""
+Prompt Index - Índice MinHash/LSH de prompts casi duplicados
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import random
+import re
+import unicodedata
+from ...database import upsert, PromptBucket, PromptSignature, UserPrompt
+
+# Firma de NUM_PERM mínimos partida en LSH_BANDS bandas de LSH_ROWS filas.
+# Dos prompts comparten algún bucket con probabilidad 1 - (1 - s^4)^16:
+# ~99% con similitud 0.7, ~64% con 0.5 y ~12% con 0.3.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 4  # n-gramas de caracteres (los prompts son cortos)
+MAX_PROMPT_CHARS = 500
+
+# Similitud de Jaccard estimada a partir de la cual dos prompts son "casi iguales"
+NEAR_DUPLICATE_THRESHOLD = 0.6
+MAX_CANDIDATES = 1000  # candidatos LSH que se verifican por consulta
+MAX_USER_PROMPTS = 5000  # prompts de un usuario que se agrupan por consulta
+IN_CHUNK = 2000  # parámetros por IN / filas por INSERT
+
+# Hash universal (a * x + b) mod p; p < 2^32 para que los mínimos quepan en 32 bits.
+# Semilla fija: las firmas guardadas tienen que ser comparables entre procesos.
+PRIME = 4294967291
+_rng = random.Random(20240601)
+PERMUTATIONS = [(_rng.randrange(1, PRIME), _rng.randrange(0, PRIME)) for _ in range(NUM_PERM)]
+
+def _hash63(data: bytes) -> int:
+    """Hash estable que entra en un BIGINT con signo"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big") >> 1
+
+def normalize_prompt(prompt: Optional[str]) -> str:
+    """Minúsculas, sin acentos ni puntuación y con espacios colapsados"""
+    if not prompt:
+        return ""
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"\W+", " ", text).split())[:MAX_PROMPT_CHARS]
+
+def prompt_key(normalized: str) -> int:
+    return _hash63(normalized.encode())
+
+def minhash(normalized: str) -> List[int]:
+    """Firma MinHash de los n-gramas de caracteres del prompt normalizado"""
+    shingles = {normalized[i:i + SHINGLE_SIZE] for i in range(max(len(normalized) - SHINGLE_SIZE + 1, 1))}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "big")
+        for shingle in shingles
+    ]
+    return [min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+def lsh_buckets(signature: List[int]) -> List[int]:
+    """Un bucket por banda (incluye el número de banda: no colisionan entre bandas)"""
+    return [
+        _hash63(bytes([band]) + b"".join(
+            value.to_bytes(4, "big") for value in signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        ))
+        for band in range(LSH_BANDS)
+    ]
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Jaccard estimada: fracción de mínimos iguales"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+def _chunks(values: Iterable, size: int = IN_CHUNK):
+    values = list(values)
+    for offset in range(0, len(values), size):
+        yield values[offset:offset + size]
+
+async def _signatures(db: AsyncSession, keys: Iterable[int]) -> Dict[int, PromptSignature]:
+    found: Dict[int, PromptSignature] = {}
+    for chunk in _chunks(keys):
+        for row in (await db.execute(select(
+            PromptSignature.prompt_hash, PromptSignature.prompt, PromptSignature.signature, PromptSignature.uses
+        ).where(PromptSignature.prompt_hash.in_(chunk)))).all():
+            found[row.prompt_hash] = row
+    return found
+
+# Prompt crudo -> (prompt normalizado, clave, firma MinHash)
+SignedPrompts = Dict[str, Tuple[str, int, List[int]]]
+
+def sign_prompts(generations: List[Dict]) -> SignedPrompts:
+    """
+    Normalizar y firmar los prompts de un lote (solo CPU, ~1 ms por prompt).
+    Se calcula antes de entrar a la transacción de escritura para no retener
+    el lock mientras tanto.
+    """
+    signed: SignedPrompts = {}
+    for generation in generations:
+        prompt = generation.get("prompt")
+        if not prompt or prompt in signed:
+            continue
+        text = normalize_prompt(prompt)
+        if text:
+            signed[prompt] = (text, prompt_key(text), minhash(text))
+    return signed
+
+async def index_prompts(
+    db: AsyncSession,
+    generations: List[Dict],
+    signed: Optional[SignedPrompts] = None
+) -> Dict[str, int]:
+    """
+    Agregar al índice los prompts de generaciones recién registradas
+    ({user_id, prompt, created_at}). Se llama dentro de la transacción que
+    inserta las generaciones, con los perfiles de esos usuarios bloqueados;
+    `signed` (sign_prompts) trae las firmas ya calculadas.
+
+    Devuelve, por usuario, cuántos grupos nuevos abrió: prompts distintos sin
+    ningún prompt casi igual (LSH + verificación de la firma) entre los que ya
+    había usado.
+    """
+    if signed is None:
+        signed = sign_prompts(generations)
+    entries: Dict[int, Dict] = {}
+    usage: Dict[Tuple[str, int], List] = {}
+    for generation in sorted(generations, key=lambda g: g["created_at"]):
+        if generation.get("prompt") not in signed or not generation.get("user_id"):
+            continue
+        text, key, signature = signed[generation["prompt"]]
+        created_at = generation["created_at"]
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = {
+                "prompt": text, "signature": signature, "buckets": lsh_buckets(signature),
+                "uses": 0, "first_seen_at": created_at
+            }
+        entry["uses"] += 1
+        entry["last_seen_at"] = created_at
+        use = usage.setdefault((generation["user_id"], key), [0, created_at])
+        use[0] += 1
+        use[1] = created_at
+    if not entries:
+        return {}
+
+    users = {user_id for user_id, _ in usage}
+    known: Set[Tuple[str, int]] = set()
+    for chunk in _chunks(entries):
+        known.update((await db.execute(select(UserPrompt.user_id, UserPrompt.prompt_hash).where(
+            UserPrompt.user_id.in_(users), UserPrompt.prompt_hash.in_(chunk)
+        ))).all())
+
+    new_clusters: Dict[str, int] = {}
+    new_pairs = [pair for pair in usage if pair not in known]
+    if new_pairs:
+        # Prompts anteriores de esos usuarios que caen en algún bucket de los nuevos
+        new_users = {user_id for user_id, _ in new_pairs}
+        candidates: Dict[Tuple[str, int], Set[int]] = {}
+        for chunk in _chunks({bucket for _, key in new_pairs for bucket in entries[key]["buckets"]}):
+            for user_id, bucket, key in (await db.execute(
+                select(UserPrompt.user_id, PromptBucket.bucket, PromptBucket.prompt_hash)
+                .join(UserPrompt, UserPrompt.prompt_hash == PromptBucket.prompt_hash)
+                .where(PromptBucket.bucket.in_(chunk), UserPrompt.user_id.in_(new_users))
+            )).all():
+                candidates.setdefault((user_id, bucket), set()).add(key)
+        signatures = {
+            key: row.signature for key, row in (await _signatures(
+                db, {key for keys in candidates.values() for key in keys}
+            )).items()
+        }
+
+        for user_id, key in new_pairs:
+            entry = entries[key]
+            near = set().union(*(candidates.get((user_id, bucket), ()) for bucket in entry["buckets"]))
+            if not any(similarity(entry["signature"], signatures[other]) >= NEAR_DUPLICATE_THRESHOLD
+                       for other in near if other in signatures):
+                new_clusters[user_id] = new_clusters.get(user_id, 0) + 1
+            # Los prompts siguientes del lote también se comparan con este
+            for bucket in entry["buckets"]:
+                candidates.setdefault((user_id, bucket), set()).add(key)
+            signatures[key] = entry["signature"]
+
+    # Orden estable de claves: dos transacciones no se bloquean en orden cruzado (Postgres)
+    for chunk in _chunks(sorted(entries.items()), IN_CHUNK // 4):
+        stmt = upsert(db, PromptSignature).values([
+            {
+                "prompt_hash": key, "prompt": entry["prompt"], "signature": entry["signature"],
+                "uses": entry["uses"], "first_seen_at": entry["first_seen_at"], "last_seen_at": entry["last_seen_at"]
+            }
+            for key, entry in chunk
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[PromptSignature.prompt_hash],
+            set_={"uses": PromptSignature.uses + stmt.excluded.uses, "last_seen_at": stmt.excluded.last_seen_at}
+        ))
+
+    buckets = sorted({(bucket, key) for key, entry in entries.items() for bucket in entry["buckets"]})
+    for chunk in _chunks(buckets, IN_CHUNK // 2):
+        await db.execute(upsert(db, PromptBucket).values([
+            {"bucket": bucket, "prompt_hash": key} for bucket, key in chunk
+        ]).on_conflict_do_nothing(index_elements=[PromptBucket.bucket, PromptBucket.prompt_hash]))
+
+    for chunk in _chunks(sorted(usage.items()), IN_CHUNK // 4):
+        stmt = upsert(db, UserPrompt).values([
+            {"user_id": user_id, "prompt_hash": key, "uses": uses, "last_used_at": last_used_at}
+            for (user_id, key), (uses, last_used_at) in chunk
+        ])
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserPrompt.user_id, UserPrompt.prompt_hash],
+            set_={"uses": UserPrompt.uses + stmt.excluded.uses, "last_used_at": stmt.excluded.last_used_at}
+        ))
+
+    return new_clusters
+
+async def similar_prompts(
+    db: AsyncSession,
+    prompt: str,
+    limit: int = 10,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    user_id: Optional[str] = None
+) -> List[Dict]:
+    """
+    Prompts indexados casi iguales a `prompt`. Solo se leen los prompts que
+    comparten algún bucket LSH; con `user_id`, solo los de ese usuario.
+
+    Se devuelven hash y conteos, nunca el texto: el endpoint no autentica a
+    quien consulta y los prompts son de otros usuarios.
+    """
+    text = normalize_prompt(prompt)
+    if not text:
+        return []
+    signature = minhash(text)
+
+    query = select(PromptBucket.prompt_hash).where(PromptBucket.bucket.in_(lsh_buckets(signature)))
+    if user_id:
+        query = query.join(UserPrompt, UserPrompt.prompt_hash == PromptBucket.prompt_hash).where(
+            UserPrompt.user_id == user_id
+        )
+    keys = (await db.scalars(query.distinct().limit(MAX_CANDIDATES))).all()
+
+    scored = []
+    for key, row in (await _signatures(db, keys)).items():
+        score = similarity(signature, row.signature)
+        if score >= threshold:
+            scored.append((score, row))
+    scored.sort(key=lambda item: (-item[0], -item[1].uses, item[1].prompt))
+    scored = scored[:limit]
+    if not scored:
+        return []
+
+    users = dict((await db.execute(
+        select(UserPrompt.prompt_hash, func.count())
+        .where(UserPrompt.prompt_hash.in_([row.prompt_hash for _, row in scored]))
+        .group_by(UserPrompt.prompt_hash)
+    )).all())
+    return [
+        {
+            "prompt_hash": f"{row.prompt_hash:016x}",
+            "similarity": round(score, 3),
+            "uses": row.uses,
+            "users": users.get(row.prompt_hash, 0)
+        }
+        for score, row in scored
+    ]
+
+async def user_clusters(
+    db: AsyncSession,
+    user_id: str,
+    limit: int = 20,
+    threshold: float = NEAR_DUPLICATE_THRESHOLD
+) -> Dict:
+    """
+    Agrupar los prompts distintos de un usuario en componentes de prompts casi
+    iguales. Solo se comparan los pares que comparten bucket LSH.
+    Cada grupo se identifica por el hash de su prompt más usado (sin texto).
+    """
+    rows = (await db.execute(
+        select(
+            PromptSignature.prompt_hash, PromptSignature.signature, UserPrompt.uses, UserPrompt.last_used_at
+        )
+        .join(UserPrompt, UserPrompt.prompt_hash == PromptSignature.prompt_hash)
+        .where(UserPrompt.user_id == user_id)
+        .order_by(UserPrompt.uses.desc(), UserPrompt.last_used_at.desc())
+        .limit(MAX_USER_PROMPTS)
+    )).all()
+
+    parent = list(range(len(rows)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    members: Dict[int, List[int]] = {}
+    for i, row in enumerate(rows):
+        for bucket in lsh_buckets(row.signature):
+            for j in members.setdefault(bucket, []):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j and similarity(row.signature, rows[j].signature) >= threshold:
+                    # La raíz es el prompt más usado (menor índice)
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+            members[bucket].append(i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(rows)):
+        groups.setdefault(find(i), []).append(i)
+
+    clusters = sorted(
+        (
+            {
+                "prompt_hash": f"{rows[root].prompt_hash:016x}",
+                "prompts": len(indexes),
+                "uses": sum(rows[i].uses for i in indexes),
+                "last_used_at": max(rows[i].last_used_at for i in indexes)
+            }
+            for root, indexes in groups.items()
+        ),
+        key=lambda cluster: (-cluster["uses"], cluster["prompt_hash"])
+    )
+    return {
+        "user_id": user_id,
+        "distinct_prompts": len(rows),
+        "clusters": len(clusters),
+        "top": clusters[:limit]
+    }
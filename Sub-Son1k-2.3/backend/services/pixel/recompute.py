@@ -0,0 +1,286 @@
+"""
+Pixel Recompute - Recálculo vectorizado (NumPy) de pixel_profiles para todos los usuarios
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import time
+from ...database import engine, Generation, PixelProfile
+from .genre_index import rebuild_genre_pairs
+from .pixel_companion import PROMPT_SKETCH_SIZE, distinct_prompts, prompt_hash
+
+# numpy es opcional: solo hace falta para el recálculo masivo
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PROFILE_COLUMNS = [
+    "total_generations", "genre_counts", "hour_histogram", "prompt_sketch", "recent_qualities",
+    "recent_prompts", "first_generation_at", "last_generation_at", "last_genre", "updated_at"
+]
+
+RECENT_QUALITIES = 5
+RECENT_PROMPTS = 3
+UPSERT_BATCH = 1000
+
+# Rango de usuarios contiguos (por user_id) que se procesa de una vez
+UserRange = Tuple[str, str, int]
+
+def plan_ranges(conn, chunk_size: int) -> List[UserRange]:
+    """
+    Partir los usuarios (ordenados por user_id) en rangos de ~chunk_size
+    generaciones. Un rango siempre contiene usuarios completos.
+    """
+    counts = conn.execute(select(Generation.user_id, func.count()).where(
+        Generation.user_id.is_not(None),
+        Generation.created_at.is_not(None)
+    ).group_by(Generation.user_id).order_by(Generation.user_id))
+
+    ranges: List[UserRange] = []
+    first, last, rows = None, None, 0
+    for user_id, count in counts:
+        if first is None:
+            first = user_id
+        last, rows = user_id, rows + count
+        if rows >= chunk_size:
+            ranges.append((first, last, rows))
+            first, rows = None, 0
+    if first is not None:
+        ranges.append((first, last, rows))
+    return ranges
+
+def load_range(conn, first: str, last: str) -> Dict[str, "np.ndarray"]:
+    """Generaciones del rango como columnas NumPy, ordenadas por (user_id, created_at)"""
+    rows = conn.execute(select(
+        Generation.user_id,
+        func.coalesce(Generation.genre, ""),
+        func.coalesce(Generation.quality, "standard"),
+        func.coalesce(func.substr(Generation.prompt, 1, 100), ""),
+        Generation.created_at
+    ).where(
+        Generation.user_id.between(first, last),
+        Generation.created_at.is_not(None)
+    ).order_by(Generation.user_id, Generation.created_at)).all()
+
+    users, genres, qualities, prompts, created_at = zip(*rows) if rows else ((),) * 5
+    return {
+        "users": np.array(users, dtype=object),
+        "genres": np.array(genres, dtype=object),
+        "qualities": np.array(qualities, dtype=object),
+        "prompts": np.array(prompts, dtype=object),
+        "created_at": np.array(created_at, dtype="datetime64[us]")
+    }
+
+def load_clusters(conn, first: str, last: str) -> Dict[str, int]:
+    """
+    prompt_clusters actuales del rango. El recálculo no los reconstruye (los
+    mantiene el índice LSH: migrations/build_prompt_index.py) ni los pisa.
+    """
+    return dict(conn.execute(select(PixelProfile.user_id, PixelProfile.prompt_clusters).where(
+        PixelProfile.user_id.between(first, last)
+    )).all())
+
+def _rank_from_end(codes: "np.ndarray") -> "np.ndarray":
+    """Posición de cada fila contando desde la última de su grupo (codes ordenados)"""
+    return np.searchsorted(codes, codes, side="right") - 1 - np.arange(len(codes))
+
+def _group(codes: "np.ndarray", values: list, groups: int) -> List[list]:
+    """Partir `values` (alineado con codes ordenados) en una lista por grupo"""
+    bounds = np.searchsorted(codes, np.arange(groups + 1)).tolist()
+    return [values[bounds[i]:bounds[i + 1]] for i in range(groups)]
+
+def aggregate(columns: Dict[str, "np.ndarray"], updated_at: datetime) -> List[Dict]:
+    """
+    Perfiles de todos los usuarios del rango con operaciones agrupadas.
+    Produce lo mismo que apply_generations aplicado a todo el historial.
+    """
+    users, created_at = columns["users"], columns["created_at"]
+    n = len(users)
+    if not n:
+        return []
+
+    # Códigos de usuario 0..U-1 (las filas vienen agrupadas por usuario)
+    change = np.empty(n, dtype=bool)
+    change[0] = True
+    change[1:] = users[1:] != users[:-1]
+    codes = np.cumsum(change) - 1
+    starts = np.flatnonzero(change)
+    ends = np.append(starts[1:], n)
+    user_count = len(starts)
+
+    # Totales, histograma por hora y primera/última generación
+    totals = ends - starts
+    hours = (created_at - created_at.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    histograms = np.bincount(codes * 24 + hours, minlength=user_count * 24).reshape(user_count, 24)
+    first_at = created_at[starts].tolist()
+    last_at = created_at[ends - 1].tolist()
+
+    # Conteo por género: pares (usuario, género) únicos con su frecuencia
+    genre_counts: List[Dict[str, int]] = [{} for _ in range(user_count)]
+    has_genre = columns["genres"] != ""
+    if has_genre.any():
+        names, genre_codes = np.unique(columns["genres"][has_genre].astype(str), return_inverse=True)
+        keys, counts = np.unique(codes[has_genre] * len(names) + genre_codes, return_counts=True)
+        for user, genre, count in zip(
+            (keys // len(names)).tolist(), names[keys % len(names)].tolist(), counts.tolist()
+        ):
+            genre_counts[user][genre] = count
+
+    # Último género usado (punto de partida de la próxima transición)
+    last_genre: List = [None] * user_count
+    genre_rows = np.flatnonzero(has_genre)
+    genre_codes = codes[genre_rows]
+    last_rows = genre_rows[_rank_from_end(genre_codes) == 0]
+    for user, genre in zip(codes[last_rows].tolist(), columns["genres"][last_rows].tolist()):
+        last_genre[user] = genre
+
+    # Últimas calidades (la más reciente primero)
+    recent = np.flatnonzero(_rank_from_end(codes) < RECENT_QUALITIES)
+    recent_qualities = _group(codes[recent], columns["qualities"][recent].tolist(), user_count)
+    recent_qualities = [items[::-1] for items in recent_qualities]
+
+    # Últimos prompts y sketch KMV de prompts distintos
+    with_prompt = np.flatnonzero(columns["prompts"] != "")
+    prompt_codes = codes[with_prompt]
+    prompts = columns["prompts"][with_prompt]
+
+    last_prompts = np.flatnonzero(_rank_from_end(prompt_codes) < RECENT_PROMPTS)
+    recent_prompts = _group(prompt_codes[last_prompts], prompts[last_prompts].tolist(), user_count)
+    recent_prompts = [items[::-1] for items in recent_prompts]
+
+    hashes = np.fromiter((prompt_hash(prompt) for prompt in prompts), dtype=np.uint64, count=len(prompts))
+    order = np.lexsort((hashes, prompt_codes))
+    sketch_codes, sketch_hashes = prompt_codes[order], hashes[order]
+    distinct = np.ones(len(order), dtype=bool)
+    distinct[1:] = (sketch_codes[1:] != sketch_codes[:-1]) | (sketch_hashes[1:] != sketch_hashes[:-1])
+    sketch_codes, sketch_hashes = sketch_codes[distinct], sketch_hashes[distinct]
+    smallest = np.arange(len(sketch_codes)) - np.searchsorted(sketch_codes, sketch_codes) < PROMPT_SKETCH_SIZE
+    sketches = _group(sketch_codes[smallest], sketch_hashes[smallest].tolist(), user_count)
+
+    histograms = histograms.tolist()
+    return [
+        {
+            "user_id": users[starts[user]],
+            "total_generations": int(totals[user]),
+            "genre_counts": genre_counts[user],
+            "hour_histogram": histograms[user],
+            "prompt_sketch": sketches[user],
+            "recent_qualities": recent_qualities[user],
+            "recent_prompts": recent_prompts[user],
+            "first_generation_at": first_at[user],
+            "last_generation_at": last_at[user],
+            "last_genre": last_genre[user],
+            "updated_at": updated_at
+        }
+        for user in range(user_count)
+    ]
+
+def summarize(profiles: List[Dict], clusters: Dict[str, int]) -> Dict[str, Dict[str, int]]:
+    """
+    Distribución de skill level y goals con la misma variedad de prompts que
+    PixelCompanion._analyze_user_behavior: prompt_clusters del índice LSH y,
+    para perfiles sin indexar, la estimación del sketch.
+    """
+    totals = np.array([profile["total_generations"] for profile in profiles], dtype=np.int64)
+    distinct = np.array([
+        clusters.get(profile["user_id"]) or distinct_prompts(profile["prompt_sketch"])
+        for profile in profiles
+    ], dtype=np.int64)
+    skill = np.select([distinct > 20, distinct > 5], ["advanced", "intermediate"], "beginner")
+    goals = np.select([totals > 30, totals > 10], ["professional", "learning"], "explore")
+    return {
+        "skill_level": dict(zip(*[values.tolist() for values in np.unique(skill, return_counts=True)])),
+        "goals": dict(zip(*[values.tolist() for values in np.unique(goals, return_counts=True)]))
+    }
+
+def write_profiles(conn, profiles: List[Dict], started: datetime):
+    """
+    Upsert por lotes. No pisa perfiles que record_generation actualizó
+    después de empezar el recálculo (ya incluyen generaciones que este no leyó).
+    """
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(PixelProfile)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PixelProfile.user_id],
+        set_={column: stmt.excluded[column] for column in PROFILE_COLUMNS},
+        where=PixelProfile.updated_at < started
+    )
+    # executemany: el statement se compila una vez para todo el lote
+    for offset in range(0, len(profiles), UPSERT_BATCH):
+        conn.execute(stmt, profiles[offset:offset + UPSERT_BATCH])
+
+def _merge(total: Dict, partial: Dict):
+    for key, value in partial.items():
+        if isinstance(value, dict):
+            _merge(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+def recompute_ranges(ranges: List[UserRange], started: datetime, forked: bool = False) -> Dict:
+    """Recalcular y escribir una lista de rangos (un shard del process pool)"""
+    if forked:
+        # Las conexiones heredadas del padre no se pueden usar en otro proceso
+        engine.dispose(close=False)
+
+    stats: Dict = {"users": 0, "generations": 0}
+    for first, last, _ in ranges:
+        with engine.connect() as conn:
+            columns = load_range(conn, first, last)
+            clusters = load_clusters(conn, first, last)
+        profiles = aggregate(columns, started)
+        with engine.begin() as conn:
+            write_profiles(conn, profiles, started)
+
+        _merge(stats, {
+            "users": len(profiles), "generations": len(columns["users"]), **summarize(profiles, clusters)
+        })
+    return stats
+
+def recompute_profiles(chunk_size: int = 200_000, workers: int = 1) -> Dict:
+    """
+    Recalcular pixel_profiles de todos los usuarios desde generations.
+
+    Con workers > 1 los rangos se reparten en shards contiguos entre procesos
+    (cada uno lee, agrega y escribe los suyos). Al final reconstruye genre_pairs.
+    """
+    if np is None:
+        raise RuntimeError("numpy is not installed (pip install numpy)")
+
+    started = datetime.utcnow()
+    timer = time.perf_counter()
+    with engine.connect() as conn:
+        ranges = plan_ranges(conn, chunk_size)
+
+    if workers <= 1 or len(ranges) <= 1:
+        stats = recompute_ranges(ranges, started)
+    else:
+        # Shards balanceados por cantidad de generaciones
+        shards: List[List[UserRange]] = [[] for _ in range(workers)]
+        load = [0] * workers
+        for user_range in sorted(ranges, key=lambda r: r[2], reverse=True):
+            target = load.index(min(load))
+            shards[target].append(user_range)
+            load[target] += user_range[2]
+
+        engine.dispose()
+        stats = {"users": 0, "generations": 0}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for partial in pool.map(recompute_ranges, [s for s in shards if s], [started] * workers, [True] * workers):
+                _merge(stats, partial)
+
+    # Matriz de géneros desde cero con el mismo historial
+    with engine.begin() as conn:
+        stats["genre_pairs"] = rebuild_genre_pairs(conn)
+
+    elapsed = time.perf_counter() - timer
+    stats.update(
+        ranges=len(ranges),
+        workers=workers,
+        elapsed_seconds=round(elapsed, 3),
+        generations_per_second=round(stats["generations"] / elapsed) if elapsed else 0
+    )
+    return stats
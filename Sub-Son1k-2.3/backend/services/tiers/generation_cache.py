@@ -0,0 +1,112 @@
+"""
+Generation Cache - Resultados reutilizables por prompt normalizado, género y calidad
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+import os
+import time
+from ..pixel.prompt_index import normalize_prompt
+
+# Tiers a los que se ofrece un resultado cacheado (opt-in, separados por coma)
+GENERATION_CACHE_TIERS = {
+    tier.strip().upper()
+    for tier in os.getenv("GENERATION_CACHE_TIERS", "FREE,CREATOR").split(",")
+    if tier.strip()
+}
+# Antigüedad máxima de una generación reutilizable (0 = sin límite)
+GENERATION_CACHE_MAX_AGE_DAYS = int(os.getenv("GENERATION_CACHE_MAX_AGE_DAYS", "30"))
+# false (default): solo se reutilizan las generaciones propias del usuario;
+# true: también las de otros usuarios (opt-in explícito: comparte su audio)
+GENERATION_CACHE_SHARED = os.getenv("GENERATION_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+
+def generation_cache_key(prompt: Optional[str], genre: Optional[str], quality: Optional[str]) -> Optional[str]:
+    """
+    Clave de contenido de una generación: prompts que solo difieren en
+    mayúsculas, acentos, puntuación o espacios comparten clave.
+    """
+    text = normalize_prompt(prompt)
+    if not text:
+        return None
+    material = "\x1f".join([quality or "standard", (genre or "").strip().lower(), text])
+    return hashlib.blake2b(material.encode(), digest_size=16).hexdigest()
+
+@dataclass
+class CachedGeneration:
+    """Generación completada que se puede ofrecer como resultado instantáneo"""
+    generation_id: str
+    user_id: str
+    audio_url: str
+    created_at: datetime
+    expires_at: float
+
+class GenerationCache:
+    """
+    Cache LRU + TTL en proceso: clave de contenido -> generación reutilizable.
+
+    Solo guarda aciertos (un miss siempre consulta la base de datos, así una
+    generación cuyo audio se completa después se encuentra enseguida). El TTL
+    acota cuánto se sigue ofreciendo un resultado que cambió en otro worker.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, CachedGeneration]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, not_before: Optional[datetime] = None) -> Optional[CachedGeneration]:
+        entry = self._entries.get(key)
+
+        if entry is None or entry.expires_at < time.monotonic() or (
+            not_before is not None and entry.created_at < not_before
+        ):
+            # Expirada o demasiado vieja para reutilizarse
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, generation_id: str, user_id: str, audio_url: str, created_at: datetime) -> CachedGeneration:
+        entry = CachedGeneration(
+            generation_id=generation_id,
+            user_id=user_id,
+            audio_url=audio_url,
+            created_at=created_at,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return entry
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "tiers": sorted(GENERATION_CACHE_TIERS),
+            "max_age_days": GENERATION_CACHE_MAX_AGE_DAYS,
+            "shared": GENERATION_CACHE_SHARED
+        }
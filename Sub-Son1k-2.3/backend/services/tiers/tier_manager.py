@@ -1,22 +1,181 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
-from typing import Optional, Dict
-from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Dict, List
+from datetime import date, datetime, timedelta
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
 import stripe
 import os
-from sqlalchemy import func
-from ...database import get_db, User, UserGenerationStats, Generation
+import time
+from sqlalchemy import func, insert, select
+from ...database import (
+    get_db, run_write, upsert, User, UserGenerationStats, UserMonthUsage, Generation
+)
+from ..analytics.analytics_events import track
+from ..pixel.pixel_companion import update_profiles
+from ..pixel.prompt_index import SignedPrompts, sign_prompts
+from .generation_cache import (
+    GenerationCache, generation_cache_key, GENERATION_CACHE_MAX_AGE_DAYS, GENERATION_CACHE_SHARED, GENERATION_CACHE_TIERS
+)
 
 router = APIRouter(prefix="/api/tiers", tags=["tiers"])
 
+# Máximo de items por llamada a /record-generations
+BULK_RECORD_MAX = int(os.getenv("BULK_RECORD_MAX", "1000"))
+
 # Configurar Stripe
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "sk_test_placeholder")
 
+@dataclass
+class QuotaEntry:
+    """Estado de cuota cacheado de un usuario"""
+    tier: str
+    day: date
+    day_count: int
+    month_year: str
+    month_count: int
+    expires_at: float
+
+class QuotaCache:
+    """
+    Cache LRU + TTL en proceso del estado de cuota (tier, conteo diario y mensual).
+    
+    record_generation actualiza las entradas write-through con los valores que
+    devuelve la base de datos; los webhooks de Stripe invalidan al cambiar de tier.
+    El TTL acota lo desactualizado que puede estar una entrada si otro worker
+    registra generaciones del mismo usuario.
+    
+    Cada escritura (record/invalidate) avanza un contador de versión: un miss
+    que leyó la base antes de una escritura del mismo usuario no la pisa al
+    guardar su resultado.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, QuotaEntry]" = OrderedDict()
+        # user_id -> versión de su última escritura (acotado a max_entries);
+        # _floor = versión más nueva que se descartó al acotar
+        self._writes: "OrderedDict[str, int]" = OrderedDict()
+        self._version = 0
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_puts = 0
+    
+    def version(self) -> int:
+        """Versión actual: tomarla antes de leer la base y pasarla a put()"""
+        return self._version
+    
+    def _written(self, user_id: str):
+        self._version += 1
+        self._writes[user_id] = self._version
+        self._writes.move_to_end(user_id)
+        while len(self._writes) > self.max_entries:
+            _, version = self._writes.popitem(last=False)
+            self._floor = version
+    
+    def _written_since(self, user_id: str, version: int) -> bool:
+        # Si la escritura del usuario ya se descartó, no se puede descartar que sea posterior
+        return self._writes.get(user_id, self._floor) > version
+    
+    def get(self, user_id: str) -> Optional[QuotaEntry]:
+        entry = self._entries.get(user_id)
+        today = date.today()
+        
+        if entry is None or entry.expires_at < time.monotonic() or entry.day != today:
+            # Expirada o de otro día/mes: los contadores ya no aplican
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+    
+    def put(
+        self,
+        user_id: str,
+        tier: str,
+        day_count: int,
+        month_count: int,
+        version: Optional[int] = None
+    ) -> QuotaEntry:
+        """
+        Guardar el estado leído de la base. Con `version` (de version() antes
+        de la lectura) no se guarda si el usuario tuvo una escritura después:
+        se devuelve la entrada cacheada más nueva, o la leída sin cachear.
+        """
+        today = date.today()
+        entry = QuotaEntry(
+            tier=tier,
+            day=today,
+            day_count=day_count,
+            month_year=today.strftime("%Y-%m"),
+            month_count=month_count,
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        if version is not None and self._written_since(user_id, version):
+            self.stale_puts += 1
+            return self._entries.get(user_id) or entry
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        
+        return entry
+    
+    def record(self, user_id: str, day: date, day_count: int, month_count: int):
+        """Write-through tras record_generation (solo si el usuario ya está cacheado)"""
+        self._written(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        if entry.day != day:
+            del self._entries[user_id]
+            return
+        entry.day_count = day_count
+        entry.month_count = month_count
+    
+    def invalidate(self, user_id: str):
+        self._written(user_id)
+        self._entries.pop(user_id, None)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stale_puts": self.stale_puts,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
 class TierManager:
     """
     Gestor de tiers y límites de usuario.
     """
     
+    # Compartida entre instancias (se crea un TierManager por request)
+    quota_cache = QuotaCache(
+        max_entries=int(os.getenv("QUOTA_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("QUOTA_CACHE_TTL", "60"))
+    )
+    
+    # Resultados reutilizables por clave de contenido (compartida entre instancias)
+    result_cache = GenerationCache(
+        max_entries=int(os.getenv("GENERATION_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("GENERATION_CACHE_TTL", "300"))
+    )
+    
     TIER_CONFIGS = {
         "FREE": {
             "generations_per_day": 3,
@@ -71,37 +230,41 @@ class TierManager:
         }
     }
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     async def get_user_tier(self, user_id: str) -> str:
         """Obtener tier actual del usuario"""
-        user = self.db.query(User).filter(User.id == user_id).first()
+        entry = self.quota_cache.get(user_id)
+        if entry:
+            return entry.tier
+        
+        user = await self.db.scalar(select(User).where(User.id == user_id))
         if not user:
             raise HTTPException(404, "User not found")
         return user.tier
     
-    def _get_today_generations(self, user_id: str) -> int:
+    async def _get_today_generations(self, user_id: str) -> int:
         """Obtener número de generaciones del día actual"""
         today = datetime.now().date()
         
-        # Buscar stats del día actual
-        stats = self.db.query(UserGenerationStats).filter(
+        # Seek directo sobre el índice único (user_id, day)
+        count = await self.db.scalar(select(UserGenerationStats.count).where(
             UserGenerationStats.user_id == user_id,
-            func.date(UserGenerationStats.date) == today
-        ).first()
+            UserGenerationStats.day == today
+        ))
         
-        return stats.count if stats else 0
+        return count or 0
 
-    def _get_month_generations(self, user_id: str) -> int:
+    async def _get_month_generations(self, user_id: str) -> int:
         """Obtener número de generaciones del mes actual"""
         current_month_year = datetime.now().strftime("%Y-%m")
         
-        # Sumar todas las generaciones del mes
-        result = self.db.query(func.sum(UserGenerationStats.count)).filter(
-            UserGenerationStats.user_id == user_id,
-            UserGenerationStats.month_year == current_month_year
-        ).scalar()
+        # Lookup por PK en el rollup mensual (sin SUM sobre filas diarias)
+        result = await self.db.scalar(select(UserMonthUsage.count).where(
+            UserMonthUsage.user_id == user_id,
+            UserMonthUsage.month_year == current_month_year
+        ))
         
         return result if result else 0
         
@@ -122,44 +285,326 @@ class TierManager:
             return self._get_next_day_reset()
         return self._get_next_month_reset()
     
-    async def record_generation(self, user_id: str, generation_id: str, quality: str = "standard"):
+    def _increment_day_stmt(self, db: AsyncSession, now: datetime, amounts: Dict[str, int]):
+        """
+        INSERT ... ON CONFLICT (user_id, day) DO UPDATE SET count = count + n
+        para varios usuarios en un solo statement. Devuelve (user_id, count).
+        """
+        stmt = upsert(db, UserGenerationStats).values([
+            {
+                "user_id": user_id,
+                "date": now,
+                "day": now.date(),
+                "count": amount,
+                "month_year": now.strftime("%Y-%m")
+            }
+            for user_id, amount in amounts.items()
+        ])
+        return stmt.on_conflict_do_update(
+            index_elements=[UserGenerationStats.user_id, UserGenerationStats.day],
+            set_={"count": UserGenerationStats.count + stmt.excluded.count}
+        ).returning(UserGenerationStats.user_id, UserGenerationStats.count)
+    
+    def _increment_month_stmt(self, db: AsyncSession, now: datetime, amounts: Dict[str, int]):
+        """
+        INSERT ... ON CONFLICT (user_id, month_year) DO UPDATE SET count = count + n
+        para varios usuarios en un solo statement. Devuelve (user_id, count).
+        """
+        stmt = upsert(db, UserMonthUsage).values([
+            {
+                "user_id": user_id,
+                "month_year": now.strftime("%Y-%m"),
+                "count": amount,
+                "updated_at": now
+            }
+            for user_id, amount in amounts.items()
+        ])
+        return stmt.on_conflict_do_update(
+            index_elements=[UserMonthUsage.user_id, UserMonthUsage.month_year],
+            set_={"count": UserMonthUsage.count + stmt.excluded.count, "updated_at": now}
+        ).returning(UserMonthUsage.user_id, UserMonthUsage.count)
+    
+    async def _increment_counters(
+        self,
+        db: AsyncSession,
+        now: datetime,
+        amounts: Dict[str, int]
+    ) -> Dict[str, tuple]:
+        """Aplicar incrementos diarios y mensuales; devuelve {user_id: (día, mes)}"""
+        month_counts = dict((await db.execute(self._increment_month_stmt(db, now, amounts))).all())
+        day_counts = dict((await db.execute(self._increment_day_stmt(db, now, amounts))).all())
+        return {user_id: (day_counts[user_id], month_counts[user_id]) for user_id in amounts}
+    
+    async def _write_generation(
+        self,
+        db: AsyncSession,
+        generation: Dict,
+        signed: SignedPrompts
+    ) -> tuple:
+        """
+        Unidad de trabajo de record_generation, dentro de la transacción de `db`.
+        Devuelve (generaciones del día, generaciones del mes) del usuario.
+        """
+        # Registrar la generación
+        await db.execute(insert(Generation).values(**generation))
+        
+        # Contadores en un solo statement cada uno: sin read-modify-write,
+        # dos generaciones simultáneas no pueden perder un incremento
+        user_id = generation["user_id"]
+        counts = await self._increment_counters(db, generation["created_at"], {user_id: 1})
+        # Perfil de Pixel en la misma transacción
+        await update_profiles(db, [generation], signed)
+        return counts[user_id]
+    
+    async def record_generation(
+        self,
+        user_id: str,
+        generation_id: str,
+        quality: str = "standard",
+        prompt: Optional[str] = None,
+        genre: Optional[str] = None,
+        audio_url: Optional[str] = None
+    ):
         """
         Registrar una nueva generación y actualizar stats.
         DEBE ser llamado después de cada generación exitosa.
+        Con audio_url la generación queda disponible para la cache de resultados.
         """
-        today = datetime.now().date()
-        current_month_year = datetime.now().strftime("%Y-%m")
-        
-        # Buscar o crear stats del día
-        stats = self.db.query(UserGenerationStats).filter(
-            UserGenerationStats.user_id == user_id,
-            func.date(UserGenerationStats.date) == today
-        ).first()
-        
-        if not stats:
-            stats = UserGenerationStats(
-                user_id=user_id,
-                date=datetime.now(),
-                count=1,
-                month_year=current_month_year
-            )
-            self.db.add(stats)
-        else:
-            stats.count += 1
+        now = datetime.now()
+        generation = {
+            "id": generation_id,
+            "user_id": user_id,
+            "prompt": prompt,
+            "genre": genre,
+            "quality": quality,
+            "audio_url": audio_url,
+            "created_at": now,
+            "status": "completed",
+            "cache_key": generation_cache_key(prompt, genre, quality)
+        }
+        # MinHash fuera de la transacción: no retener el lock de escritura
+        signed = sign_prompts([generation])
         
-        # Registrar la generación
-        generation = Generation(
-            id=generation_id,
-            user_id=user_id,
-            quality=quality,
-            created_at=datetime.now(),
-            status="completed"
+        total_today, total_month = await run_write(
+            self.db, lambda db: self._write_generation(db, generation, signed)
         )
-        self.db.add(generation)
+        self.quota_cache.record(user_id, now.date(), total_today, total_month)
+        track("generation", user_id, {"generation_id": generation_id, "quality": quality})
+        return {"recorded": True, "total_today": total_today}
+    
+    async def record_generations_bulk(self, records: List[Dict]) -> List[Dict]:
+        """
+        Registrar un lote de generaciones completadas con un solo COMMIT.
+        
+        Inserta todas las Generation en un statement (los ids ya existentes o
+        repetidos en el lote se reportan como duplicados) y agrega los
+        incrementos por usuario antes de aplicar los contadores.
+        
+        Returns:
+            Un resultado por item, en el mismo orden que `records`
+        """
+        now = datetime.now()
+        results: List[Dict] = []
+        rows: Dict[str, Dict] = {}
+        
+        for record in records:
+            user_id = record.get("user_id")
+            generation_id = record.get("generation_id")
+            
+            if not user_id or not generation_id:
+                results.append({"generation_id": generation_id, "status": "invalid"})
+            elif generation_id in rows:
+                results.append({"generation_id": generation_id, "status": "duplicate"})
+            else:
+                rows[generation_id] = {
+                    "id": generation_id,
+                    "user_id": user_id,
+                    "prompt": record.get("prompt"),
+                    "genre": record.get("genre"),
+                    "quality": record.get("quality", "standard"),
+                    "audio_url": record.get("audio_url"),
+                    "created_at": now,
+                    "status": "completed",
+                    "cache_key": generation_cache_key(
+                        record.get("prompt"), record.get("genre"), record.get("quality", "standard")
+                    )
+                }
+                results.append({"generation_id": generation_id, "status": "pending"})
+        
+        # Firmas del lote en un thread (~1 ms por prompt) y fuera del lock de escritura
+        signed = await asyncio.to_thread(sign_prompts, list(rows.values()))
+        
+        async def _write(db: AsyncSession) -> tuple:
+            if not rows:
+                return set(), {}
+            
+            # ON CONFLICT DO NOTHING: los ids ya registrados no se insertan
+            inserted = set((await db.scalars(
+                upsert(db, Generation).values(list(rows.values()))
+                .on_conflict_do_nothing(index_elements=[Generation.id])
+                .returning(Generation.id)
+            )).all())
+            
+            amounts: Dict[str, int] = {}
+            for generation_id in inserted:
+                user_id = rows[generation_id]["user_id"]
+                amounts[user_id] = amounts.get(user_id, 0) + 1
+            
+            counts = await self._increment_counters(db, now, amounts) if amounts else {}
+            await update_profiles(db, [rows[generation_id] for generation_id in inserted], signed)
+            return inserted, counts
+        
+        inserted, counts = await run_write(self.db, _write)
+        
+        for user_id, (total_today, total_month) in counts.items():
+            self.quota_cache.record(user_id, now.date(), total_today, total_month)
         
-        self.db.commit()
-        return {"recorded": True, "total_today": stats.count}
+        for result in results:
+            if result["status"] != "pending":
+                continue
+            generation_id = result["generation_id"]
+            if generation_id in inserted:
+                row = rows[generation_id]
+                result["status"] = "recorded"
+                result["total_today"] = counts[row["user_id"]][0]
+                track("generation", row["user_id"], {"generation_id": generation_id, "quality": row["quality"]})
+            else:
+                result["status"] = "duplicate"
+        
+        return results
 
+    def _cache_denial(self, tier: str, quality: str) -> Optional[str]:
+        """Motivo por el que no se ofrece un resultado cacheado (None si se puede)"""
+        if tier not in GENERATION_CACHE_TIERS:
+            return "tier_not_opted_in"
+        if quality not in self.TIER_CONFIGS.get(tier, self.TIER_CONFIGS["FREE"])["quality"]:
+            return f"quality_{quality}_not_available_in_{tier}"
+        return None
+    
+    def _cache_cutoff(self) -> Optional[datetime]:
+        if GENERATION_CACHE_MAX_AGE_DAYS <= 0:
+            return None
+        return datetime.now() - timedelta(days=GENERATION_CACHE_MAX_AGE_DAYS)
+    
+    async def find_cached_generation(
+        self,
+        user_id: str,
+        prompt: Optional[str],
+        genre: Optional[str] = None,
+        quality: str = "standard"
+    ) -> Dict:
+        """
+        Buscar una generación completada con el mismo prompt normalizado, género
+        y calidad cuyo audio se pueda ofrecer en lugar de generar de nuevo.
+        Consultar ANTES de generar; no consume cuota.
+        """
+        quota = await self._get_quota(user_id)
+        if not quota:
+            return {"hit": False, "reason": "user_not_found"}
+        
+        reason = self._cache_denial(quota.tier, quality)
+        key = generation_cache_key(prompt, genre, quality)
+        if reason or not key:
+            return {"hit": False, "reason": reason or "empty_prompt"}
+        
+        # Sin cache compartida cada usuario tiene su propio espacio de claves
+        scope = key if GENERATION_CACHE_SHARED else f"{user_id}:{key}"
+        cutoff = self._cache_cutoff()
+        cached = self.result_cache.get(scope, not_before=cutoff)
+        
+        if cached is None:
+            query = select(
+                Generation.id, Generation.user_id, Generation.audio_url, Generation.created_at
+            ).where(
+                Generation.cache_key == key,
+                Generation.status == "completed",
+                Generation.audio_url.is_not(None),
+                Generation.audio_url != ""
+            )
+            if cutoff:
+                query = query.where(Generation.created_at >= cutoff)
+            if not GENERATION_CACHE_SHARED:
+                query = query.where(Generation.user_id == user_id)
+            
+            row = (await self.db.execute(query.order_by(Generation.created_at.desc()).limit(1))).first()
+            if row is None:
+                return {"hit": False, "reason": "miss"}
+            cached = self.result_cache.put(scope, row.id, row.user_id, row.audio_url, row.created_at)
+        
+        return {
+            "hit": True,
+            "generation_id": cached.generation_id,
+            "audio_url": cached.audio_url,
+            "created_at": cached.created_at,
+            "own": cached.user_id == user_id
+        }
+    
+    async def accept_cached_generation(
+        self,
+        user_id: str,
+        source_generation_id: str,
+        generation_id: str
+    ) -> Dict:
+        """
+        Registrar para el usuario el resultado cacheado que aceptó: una nueva
+        Generation con el audio de la original. NO incrementa los contadores
+        de cuota (ese es el punto de la cache), pero sí actualiza el perfil de Pixel.
+        """
+        quota = await self._get_quota(user_id)
+        if not quota:
+            raise HTTPException(404, "User not found")
+        
+        source = await self.db.scalar(select(Generation).where(Generation.id == source_generation_id))
+        cutoff = self._cache_cutoff()
+        if (
+            source is None
+            or source.status != "completed"
+            or not source.audio_url
+            or not source.cache_key
+            or (cutoff and source.created_at < cutoff)
+            or (not GENERATION_CACHE_SHARED and source.user_id != user_id)
+        ):
+            raise HTTPException(404, "Cached generation not available")
+        
+        reason = self._cache_denial(quota.tier, source.quality or "standard")
+        if reason:
+            raise HTTPException(403, reason)
+        
+        now = datetime.now()
+        generation = {
+            "id": generation_id,
+            "user_id": user_id,
+            "prompt": source.prompt,
+            "genre": source.genre,
+            "quality": source.quality or "standard",
+            "audio_url": source.audio_url,
+            "created_at": now,
+            "status": "completed",
+            "cache_key": source.cache_key,
+            "meta": {"cached_from": source.id}
+        }
+        signed = sign_prompts([generation])
+        
+        async def _write(db: AsyncSession) -> bool:
+            inserted = await db.scalar(
+                upsert(db, Generation).values(**generation)
+                .on_conflict_do_nothing(index_elements=[Generation.id])
+                .returning(Generation.id)
+            )
+            if inserted:
+                await update_profiles(db, [generation], signed)
+            return inserted is not None
+        
+        if not await run_write(self.db, _write):
+            return {"recorded": False, "status": "duplicate"}
+        
+        track("generation_cache_hit", user_id, {
+            "generation_id": generation_id,
+            "source_generation_id": source.id,
+            "quality": generation["quality"]
+        })
+        return {"recorded": True, "status": "recorded", "audio_url": source.audio_url}
+    
     async def check_generation_limit(
         self,
         user_id: str,
@@ -171,16 +616,16 @@ class TierManager:
         Returns:
             Dict con can_generate, remaining, reset_at
         """
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
+        quota = await self._get_quota(user_id)
+        if not quota:
              # Fallback for dev/test without auth
              return {"can_generate": True, "remaining": 100, "reset_at": datetime.now()}
 
-        tier_config = self.TIER_CONFIGS.get(user.tier, self.TIER_CONFIGS["FREE"])
+        tier_config = self.TIER_CONFIGS.get(quota.tier, self.TIER_CONFIGS["FREE"])
         
         # Verificar límite diario
         if tier_config["generations_per_day"]:
-            today_count = self._get_today_generations(user_id)
+            today_count = quota.day_count
             if today_count >= tier_config["generations_per_day"]:
                 return {
                     "can_generate": False,
@@ -192,7 +637,7 @@ class TierManager:
         
         # Verificar límite mensual
         elif tier_config["generations_per_month"]:
-            month_count = self._get_month_generations(user_id)
+            month_count = quota.month_count
             if month_count >= tier_config["generations_per_month"]:
                 return {
                     "can_generate": False,
@@ -210,15 +655,35 @@ class TierManager:
             return {
                 "can_generate": False,
                 "remaining": remaining,
-                "reason": f"quality_{quality}_not_available_in_{user.tier}"
+                "reason": f"quality_{quality}_not_available_in_{quota.tier}"
             }
         
         return {
             "can_generate": True,
             "remaining": remaining,
-            "reset_at": self._get_next_reset(user.tier)
+            "reset_at": self._get_next_reset(quota.tier)
         }
     
+    async def _get_quota(self, user_id: str) -> Optional[QuotaEntry]:
+        """Estado de cuota desde la cache; en un miss se carga de la base de datos"""
+        entry = self.quota_cache.get(user_id)
+        if entry:
+            return entry
+        
+        # Antes de leer: una escritura durante las lecturas invalida el resultado
+        version = self.quota_cache.version()
+        user = await self.db.scalar(select(User).where(User.id == user_id))
+        if not user:
+            return None
+        
+        return self.quota_cache.put(
+            user_id,
+            user.tier,
+            await self._get_today_generations(user_id),
+            await self._get_month_generations(user_id),
+            version=version
+        )
+    
     async def create_checkout_session(
         self,
         user_id: str,
@@ -235,7 +700,7 @@ class TierManager:
         if tier not in ["CREATOR", "PRO", "STUDIO"]:
             raise HTTPException(400, "Invalid tier for checkout")
         
-        user = self.db.query(User).filter(User.id == user_id).first()
+        user = await self.db.scalar(select(User).where(User.id == user_id))
         if not user:
              raise HTTPException(404, "User not found")
 
@@ -284,13 +749,19 @@ class TierManager:
         user_id = session['metadata'].get('user_id')
         tier = session['metadata'].get('tier')
         
-        if user_id:
-            user = self.db.query(User).filter(User.id == user_id).first()
+        if not user_id:
+            return
+        
+        async def _write(db: AsyncSession):
+            user = await db.scalar(select(User).where(User.id == user_id))
             if user:
                 user.tier = tier
                 user.subscription_id = session.get('subscription')
                 user.subscription_status = 'active'
-                self.db.commit()
+        
+        await run_write(self.db, _write)
+        self.quota_cache.invalidate(user_id)
+        track("upgrade", user_id, {"tier": tier, "subscription_id": session.get('subscription')})
 
     async def _handle_subscription_updated(self, subscription):
         pass
@@ -304,7 +775,7 @@ class TierManager:
 @router.post("/checkout")
 async def create_checkout(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Crear sesión de checkout"""
     data = await request.json()
@@ -323,7 +794,7 @@ async def create_checkout(
     return {"checkout_url": checkout_url}
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     """Endpoint para webhooks de Stripe"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
@@ -350,7 +821,7 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     return {"status": "success"}
 
 @router.get("/limits/{user_id}")
-async def get_user_limits(user_id: str, db: Session = Depends(get_db)):
+async def get_user_limits(user_id: str, db: AsyncSession = Depends(get_db)):
     """Obtener límites actuales del usuario"""
     manager = TierManager(db)
     try:
@@ -372,7 +843,7 @@ async def get_user_limits(user_id: str, db: Session = Depends(get_db)):
 @router.post("/record-generation")
 async def record_generation(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Registrar una generación completada.
@@ -387,7 +858,9 @@ async def record_generation(
         raise HTTPException(400, "user_id and generation_id required")
     
     manager = TierManager(db)
-    result = await manager.record_generation(user_id, generation_id, quality)
+    result = await manager.record_generation(
+        user_id, generation_id, quality, data.get("prompt"), data.get("genre"), data.get("audio_url")
+    )
     
     return {
         "status": "recorded",
@@ -395,3 +868,82 @@ async def record_generation(
         "total_today": result["total_today"]
     }
 
+@router.post("/record-generations")
+async def record_generations_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Registrar un lote de generaciones completadas (workers del generador).
+    Body: {"generations": [{"user_id", "generation_id", "quality", "prompt"?, "genre"?, "audio_url"?}, ...]}
+    """
+    data = await request.json()
+    records = data.get("generations")
+    
+    if not isinstance(records, list) or not records:
+        raise HTTPException(400, "generations list required")
+    if len(records) > BULK_RECORD_MAX:
+        raise HTTPException(413, f"Max {BULK_RECORD_MAX} generations per batch")
+    
+    manager = TierManager(db)
+    results = await manager.record_generations_bulk(records)
+    
+    return {
+        "results": results,
+        "recorded": sum(1 for r in results if r["status"] == "recorded"),
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid")
+    }
+
+@router.post("/generation-cache/lookup")
+async def lookup_cached_generation(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Consultar, antes de generar, si hay un resultado reutilizable para el
+    mismo prompt (normalizado), género y calidad.
+    Body: {"user_id", "prompt", "genre"?, "quality"?}
+    """
+    data = await request.json()
+    user_id = data.get("user_id")
+    
+    if not user_id or not data.get("prompt"):
+        raise HTTPException(400, "user_id and prompt required")
+    
+    manager = TierManager(db)
+    return await manager.find_cached_generation(
+        user_id, data.get("prompt"), data.get("genre"), data.get("quality", "standard")
+    )
+
+@router.post("/generation-cache/accept")
+async def accept_cached_generation(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Aceptar el resultado ofrecido por /generation-cache/lookup (no consume cuota).
+    Body: {"user_id", "source_generation_id", "generation_id"}
+    """
+    data = await request.json()
+    user_id = data.get("user_id")
+    source_generation_id = data.get("source_generation_id")
+    generation_id = data.get("generation_id")
+    
+    if not user_id or not source_generation_id or not generation_id:
+        raise HTTPException(400, "user_id, source_generation_id and generation_id required")
+    
+    manager = TierManager(db)
+    result = await manager.accept_cached_generation(user_id, source_generation_id, generation_id)
+    
+    return {"generation_id": generation_id, **result}
+
+@router.get("/generation-cache/stats")
+async def get_generation_cache_stats():
+    """Métricas de la cache de resultados (hits, misses, evictions, reglas)"""
+    return TierManager.result_cache.stats()
+
+@router.get("/quota-cache/stats")
+async def get_quota_cache_stats():
+    """Métricas de la cache de cuotas (hits, misses, evictions)"""
+    return TierManager.quota_cache.stats()
@@ -0,0 +1,116 @@
+"""
+Fixtures de tests del backend.
+
+Cada test corre contra una base SQLite nueva (esquema recreado) y con las
+caches en memoria compartidas entre requests (cuotas, feed, rankings, buffer
+de likes/plays) recreadas, así ningún estado se filtra entre tests.
+
+Uso (desde backend/):
+    python -m pytest -q tests
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+# Importar como paquete `backend` (los servicios usan imports relativos)
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import text
+from fastapi.testclient import TestClient
+
+from backend import database
+from backend.database import Base, User
+from backend.services.community import pool_manager
+from backend.services.community.counters import PoolCounterBuffer
+from backend.services.community.leaderboard import ContributorLeaderboards
+from backend.services.pixel import genre_index, pixel_companion
+from backend.services.tiers import tier_manager
+from backend.services.tiers.generation_cache import GenerationCache
+
+USERS = {"free_user": "FREE", "creator_user": "CREATOR", "pro_user": "PRO"}
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """Esquema vacío y caches en memoria nuevas para cada test"""
+    Base.metadata.drop_all(bind=database.engine)
+    Base.metadata.create_all(bind=database.engine)
+
+    manager = pool_manager.CommunityPoolManager
+    monkeypatch.setattr(tier_manager.TierManager, "quota_cache", tier_manager.QuotaCache())
+    monkeypatch.setattr(tier_manager.TierManager, "result_cache", GenerationCache())
+    monkeypatch.setattr(manager, "sampler", pool_manager.PoolSampler(refresh_seconds=300))
+    monkeypatch.setattr(manager, "feed_cache", pool_manager.PoolFeedCache(max_entries=1000, ttl_seconds=30))
+    monkeypatch.setattr(manager, "leaderboards", ContributorLeaderboards())
+    # Sin task de fondo: los tests llaman a flush() explícitamente
+    monkeypatch.setattr(pool_manager, "pool_counters", PoolCounterBuffer(
+        flush_interval=3600, bloom_capacity=1000, on_flush=pool_manager._invalidate_feed
+    ))
+    monkeypatch.setattr(genre_index, "fusion_index", genre_index.GenreFusionIndex())
+    monkeypatch.setattr(pixel_companion, "fusion_index", genre_index.fusion_index)
+    yield
+
+@pytest.fixture
+def users():
+    """Un usuario por tier: free_user, creator_user, pro_user"""
+    db = database.SessionLocal()
+    for user_id, tier in USERS.items():
+        db.add(User(id=user_id, email=f"{user_id}@son1k.test", username=user_id, tier=tier))
+    db.commit()
+    db.close()
+    return USERS
+
+async def _start_writes():
+    # El primer connect de un pool recién descartado corre el evento first_connect
+    # bajo un lock de thread: varios connects concurrentes en ese momento se bloquean
+    async with database.async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    if database.write_queue is not None:
+        await database.write_queue.start()
+
+async def _stop_writes():
+    if database.write_queue is not None:
+        await database.write_queue.stop()
+    # Las conexiones aiosqlite quedan atadas al event loop que las abrió
+    await database.async_engine.dispose()
+    if database.writer_engine is not None:
+        await database.writer_engine.dispose()
+
+@pytest.fixture
+def run():
+    """Ejecutar `await work()` con la cola de escritura activa, como dentro de la app"""
+    def _run(work):
+        async def main():
+            await _start_writes()
+            try:
+                return await work()
+            finally:
+                await _stop_writes()
+        return asyncio.run(main())
+    return _run
+
+@pytest.fixture
+def app():
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await _start_writes()
+        yield
+        await _stop_writes()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(tier_manager.router)
+    app.include_router(pool_manager.router)
+    app.include_router(pixel_companion.router)
+    return app
+
+@pytest.fixture
+def client(app, users):
+    with TestClient(app) as client:
+        yield client
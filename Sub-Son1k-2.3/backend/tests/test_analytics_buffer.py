@@ -0,0 +1,55 @@
+"""Buffer de ingesta de analytics: spill a disco y lotes envenenados (user-009)"""
+
+import asyncio
+import json
+from datetime import datetime
+
+from backend.services.analytics.analytics_events import AnalyticsBuffer
+
+def spill_lines(path):
+    with open(path, encoding="utf-8") as spill:
+        return [json.loads(line) for line in spill]
+
+def test_backpressure_spills_in_the_background_and_replays_what_fits(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = AnalyticsBuffer(max_pending=2, spill_path=spill_path)
+
+    async def main():
+        accepted = [buffer.track("like", f"user_{i}") for i in range(5)]
+        assert accepted == [True, True, False, False, False]
+        await buffer._spill_task
+        assert [event["user_id"] for event in spill_lines(spill_path)] == ["user_2", "user_3", "user_4"]
+
+        buffer._events.popleft()
+        await buffer._replay_spill()
+        # Solo entra uno; el resto queda en disco sin reordenarse
+        assert [event["user_id"] for event in buffer._events] == ["user_1", "user_2"]
+        assert isinstance(buffer._events[-1]["timestamp"], datetime)
+        assert [event["user_id"] for event in spill_lines(spill_path)] == ["user_3", "user_4"]
+
+    asyncio.run(main())
+    assert buffer.spilled == 3 and buffer.dropped == 0
+
+def test_batch_failing_max_attempts_times_is_quarantined(tmp_path):
+    spill_path = str(tmp_path / "spill.jsonl")
+    buffer = AnalyticsBuffer(batch_size=2, spill_path=spill_path, max_attempts=3)
+    written = []
+
+    async def write_batch(batch):
+        if any(event["event_type"] == "poison" for event in batch):
+            raise ValueError("bad row")
+        written.extend(event["user_id"] for event in batch)
+
+    buffer._write_batch = write_batch
+
+    async def main():
+        for event_type, user_id in [("poison", "a"), ("like", "b"), ("like", "c"), ("like", "d")]:
+            buffer.track(event_type, user_id)
+        results = [await buffer.flush() for _ in range(4)]
+        assert results == [False, False, False, True]
+
+    asyncio.run(main())
+    assert written == ["c", "d"]
+    assert buffer.quarantined == 2 and buffer.errors == 3
+    assert [event["user_id"] for event in spill_lines(spill_path + ".failed")] == ["a", "b"]
+    assert not (tmp_path / "spill.jsonl").exists()
@@ -0,0 +1,54 @@
+"""Series de rollups de analytics (user-010)"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.services.analytics import rollups
+
+@pytest.fixture
+def analytics_client(app, users):
+    from fastapi.testclient import TestClient
+    app.include_router(rollups.router)
+    with TestClient(app) as client:
+        yield client
+
+def test_to_naive_utc_converts_aware_timestamps():
+    aware = datetime(2026, 1, 1, 3, 0, tzinfo=timezone(timedelta(hours=3)))
+    assert rollups.to_naive_utc(aware) == datetime(2026, 1, 1, 0, 0)
+    assert rollups.to_naive_utc(datetime(2026, 1, 1)) == datetime(2026, 1, 1)
+
+def test_series_with_aware_start_and_default_end(analytics_client):
+    start = (datetime.now(timezone.utc) - timedelta(hours=2)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    response = analytics_client.get("/api/analytics/series", params={"resolution": "hour", "start": start})
+    assert response.status_code == 200, response.text
+
+@pytest.mark.parametrize("start, end, expected_start", [
+    ("2026-01-01T00:00:00+02:00", "2026-01-01T06:00:00Z", "2025-12-31T22:00:00"),
+    ("2026-01-01T00:00:00", "2026-01-01T06:00:00-03:00", "2026-01-01T00:00:00"),
+])
+def test_series_converts_bounds_to_utc(analytics_client, start, end, expected_start):
+    response = analytics_client.get("/api/analytics/series", params={
+        "resolution": "hour", "start": start, "end": end
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["start"] == expected_start
+
+def test_raw_events_are_only_purged_up_to_the_export_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollups, "EXPORT_DIR", str(tmp_path))
+    now = datetime(2026, 3, 1)
+    # Nunca exportado: no se borra nada
+    assert rollups.raw_events_cutoff(now) is None
+
+    state_dir = tmp_path / "analytics_events"
+    state_dir.mkdir()
+    state = state_dir / "_export_state.json"
+    state.write_text('{"last_timestamp": "2026-01-10T12:00:00", "last_id": 7}')
+    assert rollups.raw_events_cutoff(now) == datetime(2026, 1, 10, 12, 0)
+
+    state.write_text('{"last_timestamp": "2026-02-28T00:00:00", "last_id": 9}')
+    assert rollups.raw_events_cutoff(now) == now - rollups.RETENTION["raw_events"]
+
+    monkeypatch.setattr(rollups, "PURGE_REQUIRES_EXPORT", False)
+    state.unlink()
+    assert rollups.raw_events_cutoff(now) == now - rollups.RETENTION["raw_events"]
@@ -0,0 +1,68 @@
+"""Exportación columnar incremental (user-011)"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import database
+from backend.database import Generation
+from backend.services.analytics import export
+
+pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds
+
+def add_generations(users, days=2, per_day=3):
+    db = database.SessionLocal()
+    start = datetime.now() - timedelta(days=days)
+    for day in range(days):
+        for i in range(per_day):
+            db.add(Generation(id=f"gen_{day}_{i}", user_id="pro_user", prompt="x",
+                              created_at=start + timedelta(days=day, minutes=i)))
+    db.commit()
+    db.close()
+
+def exported_ids(out_dir):
+    return sorted(ds.dataset(os.path.join(out_dir, "generations"), format="parquet",
+                             partitioning="hive").to_table(columns=["id"]).column("id").to_pylist())
+
+def test_failed_run_leaves_no_rows_behind(run, users, tmp_path, monkeypatch):
+    add_generations(users)
+    exporter = export.ColumnarExporter("generations", out_dir=str(tmp_path), chunk_size=2, lag_seconds=0)
+    to_batch, calls = exporter._to_batch, []
+
+    def failing_to_batch(rows):
+        calls.append(rows)
+        if len(calls) == 3:
+            raise RuntimeError("disk full")
+        return to_batch(rows)
+
+    monkeypatch.setattr(exporter, "_to_batch", failing_to_batch)
+    with pytest.raises(RuntimeError):
+        run(exporter.run)
+    assert exporter.load_state() == {}
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]
+
+    monkeypatch.setattr(exporter, "_to_batch", to_batch)
+    result = run(exporter.run)
+    assert result["rows"] == 6
+    assert exported_ids(str(tmp_path)) == sorted(f"gen_{d}_{i}" for d in range(2) for i in range(3))
+    assert all(not os.path.basename(path).startswith(".") for path in result["files"])
+
+def test_leftover_temporary_parts_are_published_or_discarded(run, users, tmp_path):
+    add_generations(users, days=1)
+    exporter = export.ColumnarExporter("generations", out_dir=str(tmp_path), lag_seconds=0)
+    run(exporter.run)
+    state = exporter.load_state()
+    [published] = [os.path.join(root, name) for root, _, names in os.walk(tmp_path)
+                   for name in names if name.startswith("part-")]
+
+    # Corte entre guardar el watermark y renombrar, y restos de una ejecución fallida
+    day_dir, name = os.path.split(published)
+    os.replace(published, os.path.join(day_dir, "." + name))
+    orphan = os.path.join(day_dir, ".part-19990101T000000000000.parquet")
+    open(orphan, "wb").close()
+
+    assert run(exporter.run)["rows"] == 0
+    assert os.path.exists(published) and not os.path.exists(orphan)
+    assert exporter.load_state() == state
@@ -0,0 +1,77 @@
+"""Cache de resultados de generación (user-025)"""
+
+from backend.services.tiers import tier_manager
+
+AUDIO = "https://cdn.son1k.test/rock.mp3"
+
+def record(client, user_id, generation_id, prompt, audio_url=AUDIO, genre="rock", quality="standard"):
+    response = client.post("/api/tiers/record-generation", json={
+        "user_id": user_id, "generation_id": generation_id, "prompt": prompt,
+        "genre": genre, "quality": quality, "audio_url": audio_url
+    })
+    assert response.status_code == 200, response.text
+
+def lookup(client, user_id, prompt, genre="rock", quality="standard"):
+    response = client.post("/api/tiers/generation-cache/lookup", json={
+        "user_id": user_id, "prompt": prompt, "genre": genre, "quality": quality
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_recorded_generation_is_a_hit_for_a_trivially_different_prompt(client):
+    record(client, "creator_user", "gen_1", "Rock  energético, con guitarras!")
+
+    result = lookup(client, "creator_user", "rock energetico con GUITARRAS", genre="Rock")
+    assert result["hit"] is True
+    assert result["generation_id"] == "gen_1"
+    assert result["audio_url"] == AUDIO
+    assert result["own"] is True
+
+    # Segunda consulta desde la cache en memoria
+    assert lookup(client, "creator_user", "rock energetico con guitarras")["hit"] is True
+    assert tier_manager.TierManager.result_cache.hits == 1
+
+def test_generation_without_audio_is_not_offered(client):
+    record(client, "creator_user", "gen_1", "lofi con lluvia", audio_url=None)
+    assert lookup(client, "creator_user", "lofi con lluvia") == {"hit": False, "reason": "miss"}
+
+def test_genre_and_quality_are_part_of_the_key(client):
+    record(client, "creator_user", "gen_1", "lofi con lluvia", quality="high")
+    assert lookup(client, "creator_user", "lofi con lluvia", quality="high")["hit"] is True
+    assert lookup(client, "creator_user", "lofi con lluvia", quality="standard")["hit"] is False
+    assert lookup(client, "creator_user", "lofi con lluvia", genre="jazz", quality="high")["hit"] is False
+
+def test_other_users_results_are_only_shared_when_opted_in(client, monkeypatch):
+    record(client, "creator_user", "gen_1", "jazz suave")
+    assert lookup(client, "free_user", "jazz suave") == {"hit": False, "reason": "miss"}
+
+    monkeypatch.setattr(tier_manager, "GENERATION_CACHE_SHARED", True)
+    result = lookup(client, "free_user", "jazz suave")
+    assert result["hit"] is True
+    assert result["own"] is False
+
+def test_tier_and_quality_rules(client):
+    record(client, "pro_user", "gen_1", "ambient espacial", quality="ultra")
+    assert lookup(client, "pro_user", "ambient espacial", quality="ultra")["reason"] == "tier_not_opted_in"
+    assert lookup(client, "free_user", "ambient espacial", quality="high")["reason"] == \
+        "quality_high_not_available_in_FREE"
+
+def test_accepting_a_cached_result_does_not_consume_quota(client):
+    record(client, "free_user", "gen_1", "reggaeton con bajo")
+    remaining = client.get("/api/tiers/limits/free_user").json()["limits"]["remaining"]
+
+    accept = {"user_id": "free_user", "source_generation_id": "gen_1", "generation_id": "gen_2"}
+    response = client.post("/api/tiers/generation-cache/accept", json=accept)
+    assert response.json() == {
+        "generation_id": "gen_2", "recorded": True, "status": "recorded", "audio_url": AUDIO
+    }
+    assert client.post("/api/tiers/generation-cache/accept", json=accept).json()["status"] == "duplicate"
+    assert client.get("/api/tiers/limits/free_user").json()["limits"]["remaining"] == remaining
+
+def test_accept_rejects_unknown_or_foreign_sources(client):
+    record(client, "creator_user", "gen_1", "rock")
+    for source in ("missing", "gen_1"):
+        response = client.post("/api/tiers/generation-cache/accept", json={
+            "user_id": "free_user", "source_generation_id": source, "generation_id": "gen_2"
+        })
+        assert response.status_code == 404
@@ -0,0 +1,56 @@
+"""Contadores de generaciones por upsert (user-005)"""
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import select
+
+from backend import database
+from backend.database import UserGenerationStats, UserMonthUsage
+from backend.services.tiers.tier_manager import TierManager
+
+def counters(user_id):
+    db = database.SessionLocal()
+    now = datetime.now()
+    day = db.scalar(select(UserGenerationStats.count).where(
+        UserGenerationStats.user_id == user_id, UserGenerationStats.day == now.date()
+    ))
+    month = db.scalar(select(UserMonthUsage.count).where(
+        UserMonthUsage.user_id == user_id, UserMonthUsage.month_year == now.strftime("%Y-%m")
+    ))
+    db.close()
+    return day, month
+
+WRITERS = 300
+
+def test_concurrent_records_do_not_lose_increments(run, users):
+    async def record(i):
+        async with database.AsyncSessionLocal() as db:
+            return await TierManager(db).record_generation("pro_user", f"gen_{i}")
+
+    async def record_all():
+        return await asyncio.gather(*(record(i) for i in range(WRITERS)))
+
+    results = run(record_all)
+    assert sorted(result["total_today"] for result in results) == list(range(1, WRITERS + 1))
+    assert counters("pro_user") == (WRITERS, WRITERS)
+
+def test_bulk_records_add_per_user_and_skip_duplicates(client):
+    client.post("/api/tiers/record-generation", json={"user_id": "pro_user", "generation_id": "gen_0"})
+    response = client.post("/api/tiers/record-generations", json={"generations": [
+        {"user_id": "pro_user", "generation_id": "gen_0"},
+        {"user_id": "pro_user", "generation_id": "gen_1"},
+        {"user_id": "pro_user", "generation_id": "gen_1"},
+        {"user_id": "creator_user", "generation_id": "gen_2"},
+        {"user_id": "pro_user"}
+    ]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["recorded"], body["duplicates"], body["invalid"]) == (2, 2, 1)
+    assert [result["status"] for result in body["results"]] == [
+        "duplicate", "recorded", "duplicate", "recorded", "invalid"
+    ]
+    assert body["results"][1]["total_today"] == 2
+
+    assert counters("pro_user") == (2, 2)
+    assert counters("creator_user") == (1, 1)
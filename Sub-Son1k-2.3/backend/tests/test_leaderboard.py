@@ -0,0 +1,84 @@
+"""Rankings de contribuidores y su snapshot (user-019)"""
+
+from datetime import datetime
+
+from backend import database
+from backend.database import LeaderboardSnapshot, PoolContribution
+from backend.services.community.leaderboard import ContributorLeaderboards, RankedSet
+
+def contribute(user_id, points):
+    db = database.SessionLocal()
+    contribution = PoolContribution(user_id=user_id, points=points, contributed_at=datetime.now())
+    db.add(contribution)
+    db.commit()
+    contribution_id = contribution.id
+    db.close()
+    return contribution_id
+
+def snapshot_rows():
+    db = database.SessionLocal()
+    rows = {
+        row.user_id: (row.points, row.as_of_id)
+        for row in db.query(LeaderboardSnapshot).filter(LeaderboardSnapshot.timeframe == "all_time")
+    }
+    db.close()
+    return rows
+
+def test_ranked_set_rank_and_slice():
+    ranked = RankedSet()
+    for key in [(-5, "b"), (-9, "a"), (-1, "d"), (-5, "c")]:
+        ranked.insert(key)
+    ranked.remove((-1, "d"))
+
+    assert len(ranked) == 3
+    assert ranked.rank((-9, "a")) == 0
+    assert ranked.rank((-5, "c")) == 2
+    assert ranked.rank((-1, "d")) is None
+    assert ranked.slice(1, 5) == [(-5, "b"), (-5, "c")]
+
+def test_snapshot_does_not_count_contributions_above_its_watermark(run, users):
+    contribute("free_user", 3)
+    boards = ContributorLeaderboards()
+
+    async def load_then_snapshot():
+        async with database.AsyncSessionLocal() as db:
+            await boards.ensure_loaded(db)
+            # Escrita por este proceso después de la carga: el ranking la ve,
+            # pero el watermark todavía no la cubre
+            contribution_id = contribute("free_user", 10)
+            boards.record(contribution_id, "free_user", 10, datetime.now())
+            assert boards.boards["all_time"].points("free_user") == 13
+            await boards.snapshot(db)
+
+    run(load_then_snapshot)
+    assert snapshot_rows() == {"free_user": (3, 1)}
+
+    # Arranque en caliente: snapshot + delta, sin contar dos veces la de 10
+    reloaded = ContributorLeaderboards()
+
+    async def reload():
+        async with database.AsyncSessionLocal() as db:
+            await reloaded.ensure_loaded(db)
+
+    run(reload)
+    assert reloaded.boards["all_time"].points("free_user") == 13
+
+def test_snapshot_only_persists_all_time(run, users):
+    contribute("free_user", 4)
+    db = database.SessionLocal()
+    # Fila de ventana escrita por una versión anterior: nunca se lee al arrancar
+    db.add(LeaderboardSnapshot(timeframe="week", user_id="pro_user", points=7, as_of_id=1, updated_at=datetime.now()))
+    db.commit()
+    db.close()
+    boards = ContributorLeaderboards()
+
+    async def load_then_snapshot():
+        async with database.AsyncSessionLocal() as db:
+            await boards.ensure_loaded(db)
+            await boards.snapshot(db)
+
+    run(load_then_snapshot)
+    assert boards.boards["week"].points("free_user") == 4
+    db = database.SessionLocal()
+    assert [(row.timeframe, row.user_id) for row in db.query(LeaderboardSnapshot)] == [("all_time", "free_user")]
+    db.close()
@@ -0,0 +1,27 @@
+"""Resumen del recálculo de pixel_profiles (user-022)"""
+
+from datetime import datetime
+
+from backend.database import PixelProfile
+from backend.services.pixel import recompute
+from backend.services.pixel.pixel_companion import PixelCompanion
+
+def test_summarize_uses_the_same_prompt_variety_as_pixel_companion():
+    sketch = list(range(1, 31))
+    # 30 prompts distintos en el sketch, pero 3 grupos casi iguales en el índice LSH
+    indexed = PixelProfile(
+        user_id="u1", total_generations=40, prompt_sketch=sketch, prompt_clusters=3,
+        genre_counts={}, hour_histogram=[0] * 24, first_generation_at=datetime(2026, 1, 1)
+    )
+    assert PixelCompanion(None)._analyze_user_behavior(indexed)["skill_level"] == "beginner"
+
+    summary = recompute.summarize(
+        [
+            {"user_id": "u1", "total_generations": 40, "prompt_sketch": sketch},
+            # Sin indexar: se usa la estimación del sketch
+            {"user_id": "u2", "total_generations": 12, "prompt_sketch": sketch[:8]}
+        ],
+        {"u1": 3, "u2": 0}
+    )
+    assert summary["skill_level"] == {"beginner": 1, "intermediate": 1}
+    assert summary["goals"] == {"professional": 1, "learning": 1}
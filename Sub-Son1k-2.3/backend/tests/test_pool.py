@@ -0,0 +1,70 @@
+"""Feed paginado y claims del pool comunitario (user-005)"""
+
+import pytest
+
+from backend.services.community.pool_manager import CommunityPoolManager
+
+@pytest.fixture
+def pool(client, monkeypatch):
+    """Siete contribuciones de creator_user (todas seleccionadas para el pool)"""
+    monkeypatch.setattr(CommunityPoolManager, "CONTRIBUTION_RATES", {"FREE": 0.0, "CREATOR": 1.0})
+    ids = []
+    for i in range(7):
+        generation_id = f"gen_{i}"
+        client.post("/api/tiers/record-generation", json={
+            "user_id": "creator_user", "generation_id": generation_id, "genre": "rock" if i % 2 else "jazz",
+            "audio_url": f"https://cdn.son1k.test/{generation_id}.mp3"
+        })
+        response = client.post("/api/community/contribute", json={
+            "user_id": "creator_user", "generation_id": generation_id
+        })
+        assert response.json()["contributed"] is True, response.text
+        ids.append(generation_id)
+    return ids
+
+def pages(client, **params):
+    seen, cursor = [], None
+    while True:
+        response = client.get("/api/community/pool", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        seen.append([item["generation_id"] for item in body["items"]])
+        cursor = body["next_cursor"]
+        assert body["has_more"] is (cursor is not None)
+        if cursor is None:
+            return seen
+
+def test_cursor_pagination_walks_the_feed_once(client, pool):
+    assert pages(client, limit=3) == [
+        ["gen_6", "gen_5", "gen_4"], ["gen_3", "gen_2", "gen_1"], ["gen_0"]
+    ]
+    # Empates en plays: se desempata por id, sin repetir ni saltear items
+    assert sum(pages(client, limit=2, sort_by="popular"), []) == pool[::-1]
+    assert pages(client, limit=2, genre="rock") == [["gen_5", "gen_3"], ["gen_1"]]
+
+def test_cursor_must_match_the_sort(client, pool):
+    cursor = client.get("/api/community/pool", params={"limit": 2}).json()["next_cursor"]
+    for params in ({"cursor": cursor, "sort_by": "popular"}, {"cursor": "not-a-cursor"}):
+        assert client.get("/api/community/pool", params=params).status_code == 400
+
+def claim(client, user_id="free_user"):
+    return client.post("/api/community/pool/claim", json={"user_id": user_id})
+
+def test_daily_claim_limit(client, pool):
+    remaining = [claim(client).json()["claims_remaining"] for _ in range(CommunityPoolManager.DAILY_CLAIM_LIMIT)]
+    assert remaining == [2, 1, 0]
+
+    response = claim(client)
+    assert response.status_code == 429
+    assert claim(client, "creator_user").status_code == 400
+    assert claim(client, "nobody").status_code == 404
+
+def test_claim_from_an_empty_pool_does_not_use_the_limit(client, monkeypatch):
+    # Si el pool está vacío, el 404 revierte también la reserva del claim
+    for _ in range(CommunityPoolManager.DAILY_CLAIM_LIMIT + 1):
+        assert claim(client).status_code == 404
+
+    monkeypatch.setattr(CommunityPoolManager, "CONTRIBUTION_RATES", {"FREE": 0.0, "CREATOR": 1.0})
+    client.post("/api/tiers/record-generation", json={"user_id": "creator_user", "generation_id": "gen_0"})
+    client.post("/api/community/contribute", json={"user_id": "creator_user", "generation_id": "gen_0"})
+    assert claim(client).json()["claims_remaining"] == 2
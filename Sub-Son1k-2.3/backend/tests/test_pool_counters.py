@@ -0,0 +1,110 @@
+"""Likes y plays coalescidos del pool (user-018)"""
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from backend import database
+from backend.database import PoolContribution, PoolLike, User
+from backend.services.community import counters
+from backend.services.community.counters import PoolCounterBuffer
+
+def add_contribution():
+    db = database.SessionLocal()
+    contribution = PoolContribution(user_id="creator_user", points=1, contributed_at=datetime.now())
+    db.add(contribution)
+    db.commit()
+    contribution_id = contribution.id
+    db.close()
+    return contribution_id
+
+def add_fans(count):
+    db = database.SessionLocal()
+    for user_id in [f"fan_{i}" for i in range(count)] + ["fan_new"]:
+        db.add(User(id=user_id, email=f"{user_id}@son1k.test", username=user_id))
+    db.commit()
+    db.close()
+
+def stored(contribution_id):
+    db = database.SessionLocal()
+    likes = db.get(PoolContribution, contribution_id).likes
+    rows = db.scalar(select(func.count()).select_from(PoolLike).where(PoolLike.contribution_id == contribution_id))
+    db.close()
+    return likes, rows
+
+def test_likes_are_deduplicated_and_flushed_in_chunks(run, monkeypatch):
+    monkeypatch.setattr(counters, "LIKE_INSERT_CHUNK", 50)
+    contribution_id = add_contribution()
+    add_fans(120)
+    buffer = PoolCounterBuffer(flush_interval=3600, bloom_capacity=1000)
+
+    async def like_and_flush():
+        async with database.AsyncSessionLocal() as db:
+            accepted = [await buffer.add_like(db, contribution_id, f"fan_{i}", "rock") for i in range(120)]
+            # Repetido mientras sigue en el buffer
+            assert await buffer.add_like(db, contribution_id, "fan_0", "rock") is False
+        buffer.add_play(contribution_id, "rock")
+        assert await buffer.flush() is True
+        return accepted
+
+    assert all(run(like_and_flush))
+    assert stored(contribution_id) == (120, 120)
+    assert buffer.rows_written == 1
+
+    # Otro proceso (buffer nuevo): el like ya persistido se rechaza contra pool_likes
+    restarted = PoolCounterBuffer(flush_interval=3600, bloom_capacity=1000)
+
+    async def like_again():
+        async with database.AsyncSessionLocal() as db:
+            repeated = await restarted.add_like(db, contribution_id, "fan_7", "rock")
+            new = await restarted.add_like(db, contribution_id, "fan_new", "rock")
+        await restarted.flush()
+        return repeated, new
+
+    assert run(like_again) == (False, True)
+    assert stored(contribution_id) == (121, 121)
+
+def test_likes_from_unknown_users_do_not_block_the_flush(run):
+    contribution_id = add_contribution()
+    add_fans(1)
+    buffer = PoolCounterBuffer(flush_interval=3600, bloom_capacity=1000)
+
+    async def like_and_flush():
+        async with database.AsyncSessionLocal() as db:
+            await buffer.add_like(db, contribution_id, "fan_0", "rock")
+            await buffer.add_like(db, contribution_id, "ghost", "rock")
+            await buffer.add_like(db, contribution_id + 1, "fan_0", "rock")
+        return await buffer.flush()
+
+    assert run(like_and_flush) is True
+    assert stored(contribution_id) == (1, 1)
+    assert buffer.likes_orphaned == 2
+
+def test_like_api_rejects_unknown_users(client):
+    contribution_id = add_contribution()
+    response = client.post(f"/api/community/pool/like/{contribution_id}", json={"user_id": "ghost"})
+    assert response.status_code == 404
+
+def test_likes_that_keep_failing_are_dropped_after_max_attempts(run, monkeypatch):
+    buffer = PoolCounterBuffer(flush_interval=3600, bloom_capacity=1000, max_attempts=3)
+    failing = {(1, "fan_0")}
+
+    async def apply(db, plays, likes):
+        if likes & failing:
+            raise RuntimeError("constraint violation")
+        return len(likes), 0
+
+    monkeypatch.setattr(buffer, "_apply", apply)
+
+    async def flush_three_times():
+        async with database.AsyncSessionLocal() as db:
+            await buffer.add_like(db, 1, "fan_0", "rock")
+        results = [await buffer.flush() for _ in range(3)]
+        async with database.AsyncSessionLocal() as db:
+            await buffer.add_like(db, 2, "fan_0", "rock")
+        results.append(await buffer.flush())
+        return results
+
+    assert run(flush_three_times) == [False, False, False, True]
+    assert buffer.likes_quarantined == 1
+    assert buffer.stats()["pending_likes"] == 0
@@ -0,0 +1,26 @@
+"""Cache del feed del pool (user-015)"""
+
+from backend.services.community.pool_manager import PoolFeedCache
+
+def test_page_stored_under_pre_query_snapshot_is_stale_after_concurrent_write():
+    cache = PoolFeedCache()
+    key = ("rock", "recent", 10, None)
+
+    snapshot = cache.generation("rock")
+    cache.bump("rock")  # una escritura confirma mientras corre la consulta
+    cache.put(key, "rock", {"items": []}, snapshot)
+
+    assert cache.get(key) is None
+    assert cache.invalidated == 1
+
+def test_bump_only_invalidates_its_genre_and_the_unfiltered_feed():
+    cache = PoolFeedCache()
+    pages = {("rock",): "rock", ("jazz",): "jazz", ("all",): None}
+    for key, genre in pages.items():
+        cache.put(key, genre, {"genre": genre}, cache.generation(genre))
+
+    cache.bump("rock")
+
+    assert cache.get(("rock",)) is None
+    assert cache.get(("all",)) is None
+    assert cache.get(("jazz",)) == {"genre": "jazz"}
@@ -0,0 +1,14 @@
+"""Métricas del pool async (user-002)"""
+
+from backend import database
+
+def test_cache_hits_do_not_check_out_a_connection(client):
+    client.get("/api/tiers/limits/free_user")
+    checkouts = database.pool_metrics.checkouts
+
+    # Segunda consulta: responde la cache de cuotas, sin tocar el pool
+    assert client.get("/api/tiers/limits/free_user").status_code == 200
+    assert database.pool_metrics.checkouts == checkouts
+
+    client.get("/api/community/pool")
+    assert database.pool_metrics.checkouts > checkouts
@@ -0,0 +1,63 @@
+"""Índice MinHash/LSH de prompts (user-024)"""
+
+from backend.services.pixel import prompt_index
+
+def record(client, user_id, generation_id, prompt):
+    response = client.post("/api/tiers/record-generation", json={
+        "user_id": user_id, "generation_id": generation_id, "prompt": prompt
+    })
+    assert response.status_code == 200, response.text
+
+def test_minhash_estimates_similarity():
+    base = prompt_index.minhash(prompt_index.normalize_prompt("Rock energético con guitarras distorsionadas!!"))
+    variant = prompt_index.minhash(prompt_index.normalize_prompt("rock energetico con guitarras distorsionadas y bateria"))
+    unrelated = prompt_index.minhash(prompt_index.normalize_prompt("lofi con lluvia y piano"))
+    assert prompt_index.similarity(base, variant) >= prompt_index.NEAR_DUPLICATE_THRESHOLD
+    assert prompt_index.similarity(base, unrelated) < 0.2
+
+def test_similar_without_user_hides_other_users_prompts(client):
+    record(client, "creator_user", "gen_1", "rock energético con guitarras distorsionadas")
+    record(client, "pro_user", "gen_2", "rock energetico con guitarras distorsionadas")
+
+    response = client.post("/api/pixel/prompts/similar", json={"prompt": "Rock energetico con guitarras distorsionadas"})
+    assert response.status_code == 200
+    [match] = response.json()["similar"]
+    assert "prompt" not in match
+    assert match["uses"] == 2
+    assert match["users"] == 2
+    assert match["similarity"] == 1.0
+
+def test_similar_for_a_user_returns_only_hashes_of_its_prompts(client):
+    record(client, "creator_user", "gen_1", "jazz suave para estudiar")
+    record(client, "pro_user", "gen_2", "jazz suave para estudiar de noche")
+
+    response = client.post("/api/pixel/prompts/similar", json={
+        "prompt": "jazz suave para estudiar", "user_id": "pro_user"
+    })
+    own = prompt_index.prompt_key(prompt_index.normalize_prompt("jazz suave para estudiar de noche"))
+    [match] = response.json()["similar"]
+    assert match["prompt_hash"] == f"{own:016x}"
+    assert "prompt" not in match
+
+def test_similar_rejects_invalid_parameters(client):
+    for body in ({"prompt": "x", "limit": "diez"}, {"prompt": "x", "threshold": "alto"}, {"prompt": "x", "threshold": 2}):
+        assert client.post("/api/pixel/prompts/similar", json=body).status_code == 400
+
+def test_clusters_group_near_duplicates(client):
+    prompts = ["lofi con lluvia y piano", "lofi con lluvia y piano suave", "reggaeton con bajo fuerte"]
+    for i, prompt in enumerate(prompts):
+        record(client, "creator_user", f"gen_{i}", prompt)
+
+    clusters = client.get("/api/pixel/prompts/clusters/creator_user").json()
+    assert clusters["distinct_prompts"] == 3
+    assert clusters["clusters"] == 2
+    assert all(set(cluster) == {"prompt_hash", "prompts", "uses", "last_used_at"} for cluster in clusters["top"])
+
+def test_signatures_are_computed_once_per_distinct_prompt():
+    signed = prompt_index.sign_prompts([
+        {"prompt": "Lofi con lluvia"}, {"prompt": "Lofi con lluvia"}, {"prompt": None}, {"prompt": "!!"}
+    ])
+    text, key, signature = signed["Lofi con lluvia"]
+    assert list(signed) == ["Lofi con lluvia"]
+    assert (text, key) == ("lofi con lluvia", prompt_index.prompt_key("lofi con lluvia"))
+    assert signature == prompt_index.minhash("lofi con lluvia")
@@ -0,0 +1,56 @@
+"""Cache de cuotas write-through (user-007)"""
+
+from datetime import date
+
+from backend import database
+from backend.services.tiers.tier_manager import QuotaCache, TierManager
+
+def test_put_does_not_overwrite_a_newer_write():
+    cache = QuotaCache()
+    version = cache.version()
+    # Mientras el miss leía la base, record_generation registró otra generación
+    cache.put("u1", "FREE", 1, 1)
+    cache.record("u1", date.today(), 2, 2)
+
+    entry = cache.put("u1", "FREE", 1, 1, version=version)
+    assert (entry.day_count, cache.get("u1").day_count) == (2, 2)
+    assert cache.stale_puts == 1
+
+    # Sin entrada cacheada se devuelve lo leído, pero no se guarda
+    cache.invalidate("u2")
+    assert cache.put("u2", "PRO", 5, 5, version=version).day_count == 5
+    assert cache.get("u2") is None
+
+    assert cache.put("u3", "FREE", 1, 1, version=version).day_count == 1
+    assert cache.get("u3") is not None
+
+def test_bounded_write_log_rejects_puts_it_cannot_prove_fresh():
+    cache = QuotaCache(max_entries=2)
+    version = cache.version()
+    for user_id in ("a", "b", "c"):
+        cache.record(user_id, date.today(), 1, 1)
+    # La escritura de "a" ya no está en el log: se asume posterior a la lectura
+    cache.put("a", "FREE", 0, 0, version=version)
+    assert cache.get("a") is None
+    cache.put("a", "FREE", 1, 1, version=cache.version())
+    assert cache.get("a").day_count == 1
+
+def test_miss_racing_a_recorded_generation_keeps_the_fresher_counts(run, users, monkeypatch):
+    cache = TierManager.quota_cache
+    original = TierManager._get_today_generations
+
+    async def read_then_record(self, user_id):
+        count = await original(self, user_id)
+        # Otro request registra y deja el valor nuevo en la cache
+        cache.put(user_id, "FREE", count + 1, count + 1)
+        cache.record(user_id, date.today(), count + 1, count + 1)
+        return count
+
+    monkeypatch.setattr(TierManager, "_get_today_generations", read_then_record)
+
+    async def load():
+        async with database.AsyncSessionLocal() as db:
+            return await TierManager(db)._get_quota("free_user")
+
+    assert run(load).day_count == 1
+    assert cache.get("free_user").day_count == 1
@@ -0,0 +1,36 @@
+"""Renormalización de trending (user-017)"""
+
+from datetime import datetime, timedelta
+
+from backend import database
+from backend.database import PoolTrendingState
+from backend.services.community.pool_manager import TrendingRenormalizeJob
+
+def set_epoch(epoch):
+    db = database.SessionLocal()
+    db.merge(PoolTrendingState(id=1, epoch=epoch))
+    db.commit()
+    db.close()
+
+def get_epoch():
+    db = database.SessionLocal()
+    epoch = db.get(PoolTrendingState, 1).epoch
+    db.close()
+    return epoch
+
+def test_overdue_epoch_is_renormalized_immediately(run):
+    # Epoch de hace dos años: 1 / trending_factor desbordaría
+    set_epoch(datetime.now() - timedelta(days=730))
+    job = TrendingRenormalizeJob(interval_seconds=86400)
+
+    assert run(job.run_once) == 86400
+    assert job.last_factor == 0.0
+    assert datetime.now() - get_epoch() < timedelta(minutes=1)
+
+def test_recent_epoch_waits_for_the_remaining_interval(run):
+    set_epoch(datetime.now() - timedelta(hours=20))
+    job = TrendingRenormalizeJob(interval_seconds=86400)
+
+    delay = run(job.run_once)
+    assert 4 * 3600 - 60 < delay <= 4 * 3600
+    assert job.last_run is None